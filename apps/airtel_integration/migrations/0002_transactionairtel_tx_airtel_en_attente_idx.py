@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index construits sans verrouiller les tables en écriture
+    atomic = False
+
+    dependencies = [
+        ('airtel_integration', '0001_initial'),
+        ('pass_payments', '0002_alter_paiementpass_code_confirmation'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transactionairtel',
+            index=models.Index(condition=models.Q(('statut__in', ['initiated', 'pending'])), fields=['date_creation'], name='tx_airtel_en_attente_idx'),
+        ),
+    ]
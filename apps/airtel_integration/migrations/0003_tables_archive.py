@@ -0,0 +1,30 @@
+# Table d'archive partitionnée par mois (partitions créées à la demande
+# par apps.pass_payments.archivage)
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airtel_integration', '0002_transactionairtel_tx_airtel_en_attente_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE airtel_transactions_archive (
+                    LIKE airtel_transactions INCLUDING DEFAULTS,
+                    date_archivage timestamp with time zone NOT NULL DEFAULT now(),
+                    PRIMARY KEY (id, date_creation)
+                ) PARTITION BY RANGE (date_creation);
+                CREATE INDEX airtel_transactions_archive_external_id_idx
+                    ON airtel_transactions_archive (external_id);
+                CREATE INDEX airtel_transactions_archive_airtel_id_idx
+                    ON airtel_transactions_archive (airtel_transaction_id);
+                CREATE INDEX airtel_transactions_archive_paiement_idx
+                    ON airtel_transactions_archive (paiement_pass_id);
+            """,
+            reverse_sql="DROP TABLE IF EXISTS airtel_transactions_archive;",
+        ),
+    ]
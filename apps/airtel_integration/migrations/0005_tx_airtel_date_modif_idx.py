@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:24
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Table chaude : index construit sans verrouiller les écritures
+    atomic = False
+
+    dependencies = [
+        ('airtel_integration', '0004_payloads_operateurs'),
+        ('pass_payments', '0010_agregatpaiementjournalier'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transactionairtel',
+            index=models.Index(fields=['date_modification'], name='tx_airtel_date_modif_idx'),
+        ),
+    ]
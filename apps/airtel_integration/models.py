@@ -3,10 +3,11 @@
 from django.db import models
 from django.core.validators import RegexValidator
 from apps.pass_payments.models import PaiementPass
+from apps.pass_payments.payloads import PayloadsOperateurMixin, payload_differe, reference_payload
 import uuid
 from datetime import datetime
 
-class TransactionAirtel(models.Model):
+class TransactionAirtel(PayloadsOperateurMixin, models.Model):
     """Log des transactions Airtel Money"""
     
     TYPE_TRANSACTION_CHOICES = [
@@ -82,19 +83,13 @@ class TransactionAirtel(models.Model):
         help_text="Raison du statut (en cas d'échec)"
     )
     
-    # Réponses API Airtel (JSON)
-    request_payload = models.JSONField(
-        blank=True, null=True,
-        help_text="Données envoyées à l'API Airtel"
-    )
-    response_payload = models.JSONField(
-        blank=True, null=True,
-        help_text="Réponse de l'API Airtel"
-    )
-    callback_payload = models.JSONField(
-        blank=True, null=True,
-        help_text="Données reçues du callback Airtel"
-    )
+    # Réponses API Airtel (payloads compressés, chargés à la demande)
+    payload_requete = reference_payload("Données envoyées à l'API Airtel")
+    payload_reponse = reference_payload("Réponse de l'API Airtel")
+    payload_callback = reference_payload("Données reçues du callback Airtel")
+    request_payload = payload_differe('request_payload')
+    response_payload = payload_differe('response_payload')
+    callback_payload = payload_differe('callback_payload')
     
     # Métadonnées
     reference_client = models.CharField(
@@ -122,6 +117,14 @@ class TransactionAirtel(models.Model):
             models.Index(fields=['airtel_transaction_id']),
             models.Index(fields=['statut']),
             models.Index(fields=['date_creation']),
+            # Poller : uniquement les transactions en attente (index partiel)
+            models.Index(
+                fields=['date_creation'],
+                name='tx_airtel_en_attente_idx',
+                condition=models.Q(statut__in=['initiated', 'pending'])
+            ),
+            # Exports incrémentaux (BI)
+            models.Index(fields=['date_modification'], name='tx_airtel_date_modif_idx'),
         ]
     
     def __str__(self):
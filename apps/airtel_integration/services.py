@@ -2,8 +2,12 @@
 
 import requests
 import json
+import time
 from django.conf import settings
-from django.core.cache import cache
+from nsia_pass_api.cache import JETONS_OPERATEURS
+from apps.pass_payments.tracing import tracer_appel_operateur
+from apps.pass_payments.circuit_breaker import DisjoncteurOperateur, resultat_indisponible
+from apps.pass_payments.rate_limiter import LimiteurOperateur, PRIORITE_HAUTE, resultat_limite
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,11 +20,19 @@ class AirtelMoneyService:
         self.client_id = settings.AIRTEL_MONEY['CLIENT_ID']
         self.client_secret = settings.AIRTEL_MONEY['CLIENT_SECRET']
         
-    def _get_access_token(self):
+    def _get_access_token(self, priorite=PRIORITE_HAUTE):
         """Récupère un token d'accès Airtel"""
-        cached_token = cache.get('airtel_access_token')
+        cached_token = JETONS_OPERATEURS.get('airtel')
         if cached_token:
             return cached_token
+        
+        disjoncteur = DisjoncteurOperateur('airtel', 'token')
+        if not disjoncteur.autoriser():
+            return None
+        if not LimiteurOperateur('airtel', 'token').acquerir(priorite):
+            logger.warning("Limite de débit token Airtel atteinte")
+            disjoncteur.liberer()
+            return None
             
         try:
             url = f"{self.base_url}/auth/oauth2/token"
@@ -31,24 +43,46 @@ class AirtelMoneyService:
                 "grant_type": "client_credentials"
             }
             
-            response = requests.post(url, json=payload, timeout=30)
+            debut = time.monotonic()
+            try:
+                response = requests.post(url, json=payload, timeout=30)
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            tracer_appel_operateur(
+                'airtel', 'token',
+                methode='POST', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                requete=payload, reponse=response
+            )
             response.raise_for_status()
             
             token_data = response.json()
             access_token = token_data.get('access_token')
             expires_in = token_data.get('expires_in', 3600)
             
-            cache.set('airtel_access_token', access_token, expires_in - 600)
+            JETONS_OPERATEURS.set('airtel', access_token, max(expires_in - 600, 60))
             return access_token
             
         except Exception as e:
             logger.error(f"Erreur token Airtel: {e}")
             return None
+        finally:
+            disjoncteur.liberer()
     
-    def debit_request(self, amount, phone_number, external_id):
+    def debit_request(self, amount, phone_number, external_id, priorite=PRIORITE_HAUTE):
         """Initie un paiement Airtel Money"""
+        disjoncteur = DisjoncteurOperateur('airtel', 'debit_request')
+        if not disjoncteur.autoriser():
+            return resultat_indisponible('airtel')
+        if not LimiteurOperateur('airtel', 'debit_request').acquerir(priorite):
+            disjoncteur.liberer()
+            return resultat_limite('airtel')
+        
         try:
-            token = self._get_access_token()
+            token = self._get_access_token(priorite)
             if not token:
                 return {'success': False, 'error': 'Token Airtel non disponible'}
                 
@@ -78,61 +112,32 @@ class AirtelMoneyService:
                 }
             }
             
-            print("\n" + "="*50)
-            print("🚀 AIRTEL DEBUG - REQUÊTE")
-            print("="*50)
-            print(f"URL: {url}")
-            print(f"Headers: {headers}")
-            print(f"Payload: {payload}")
-            print(f"Clean Phone: {clean_phone}")
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
+            debut = time.monotonic()
+            try:
+                response = requests.post(url, headers=headers, json=payload, timeout=60)
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            if response.status_code == 401:
+                # Token révoqué ou expiré côté Airtel : forcer un renouvellement
+                JETONS_OPERATEURS.delete('airtel')
             
-            print("\n" + "="*50)
-            print("📊 AIRTEL DEBUG - RÉPONSE")
-            print("="*50)
-            print(f"Status Code: {response.status_code}")
-            print(f"Response Headers: {dict(response.headers)}")
-            print(f"Raw Response Text: '{response.text}'")
-            print(f"Response Length: {len(response.text)} caractères")
+            tracer_appel_operateur(
+                'airtel', 'debit_request',
+                methode='POST', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                headers=headers, requete=payload, reponse=response
+            )
             
             # Essayer de parser JSON
             try:
-                if response.text.strip():
-                    response_json = response.json()
-                    print(f"Response JSON: {response_json}")
-                    print(f"JSON Type: {type(response_json)}")
-                    
-                    # Explorer toutes les clés récursivement
-                    def explore_json(data, indent=0):
-                        spaces = "  " * indent
-                        if isinstance(data, dict):
-                            print(f"{spaces}📁 Dict avec {len(data)} clés:")
-                            for key, value in data.items():
-                                print(f"{spaces}  🔑 '{key}' = {repr(value)} (type: {type(value).__name__})")
-                                if isinstance(value, (dict, list)) and indent < 3:
-                                    explore_json(value, indent + 1)
-                        elif isinstance(data, list):
-                            print(f"{spaces}📋 List avec {len(data)} éléments:")
-                            for i, item in enumerate(data[:3]):  # Max 3 éléments
-                                print(f"{spaces}  [{i}] = {repr(item)}")
-                                if isinstance(item, (dict, list)) and indent < 3:
-                                    explore_json(item, indent + 1)
-                    
-                    print("\n🔍 EXPLORATION COMPLÈTE:")
-                    explore_json(response_json)
-                    
-                else:
-                    print("⚠️ Réponse vide!")
-                    response_json = {}
-            except Exception as json_error:
-                print(f"❌ Erreur parsing JSON: {json_error}")
+                response_json = response.json() if response.text.strip() else {}
+            except ValueError as json_error:
+                logger.warning(f"Réponse Airtel non JSON ({response.status_code}): {json_error}")
                 response_json = {}
             
-            print("="*50)
-            print("🏁 FIN DEBUG AIRTEL")
-            print("="*50 + "\n")
-            
             # Logique de retour
             if response.status_code in [200, 201, 202]:
                 return {
@@ -151,14 +156,27 @@ class AirtelMoneyService:
                 }
                 
         except Exception as e:
-            print(f"💥 EXCEPTION AIRTEL: {e}")
-            return {'success': False, 'error': str(e)}
+            logger.error(f"Exception Airtel debit_request {external_id}: {e}")
+            tracer_appel_operateur(
+                'airtel', 'debit_request', methode='POST',
+                url=f"{self.base_url}/merchant/v1/payments/", erreur=e
+            )
+            return {'success': False, 'error': str(e), 'erreur_reseau': isinstance(e, requests.RequestException)}
+        finally:
+            disjoncteur.liberer()
 
 
-    def check_payment_status(self, transaction_id):
+    def check_payment_status(self, transaction_id, priorite=PRIORITE_HAUTE):
         """Vérifie le statut d'un paiement Airtel Money"""
+        disjoncteur = DisjoncteurOperateur('airtel', 'payment_status')
+        if not disjoncteur.autoriser():
+            return resultat_indisponible('airtel')
+        if not LimiteurOperateur('airtel', 'payment_status').acquerir(priorite):
+            disjoncteur.liberer()
+            return resultat_limite('airtel')
+        
         try:
-            token = self._get_access_token()
+            token = self._get_access_token(priorite)
             if not token:
                 return {'success': False, 'error': 'Token Airtel non disponible'}
             
@@ -171,12 +189,24 @@ class AirtelMoneyService:
                 'X-Currency': 'XAF'
             }
             
-            print(f"🔍 Vérification statut Airtel: {transaction_id}")
-            
-            response = requests.get(url, headers=headers, timeout=30)
+            debut = time.monotonic()
+            try:
+                response = requests.get(url, headers=headers, timeout=30)
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            if response.status_code == 401:
+                # Token révoqué ou expiré côté Airtel : forcer un renouvellement
+                JETONS_OPERATEURS.delete('airtel')
             
-            print(f"Status Check Response: {response.status_code}")
-            print(f"Response Text: {response.text}")
+            tracer_appel_operateur(
+                'airtel', 'payment_status',
+                methode='GET', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                headers=headers, reponse=response
+            )
             
             if response.status_code == 200:
                 response_data = response.json()
@@ -186,9 +216,6 @@ class AirtelMoneyService:
                 airtel_status = transaction_data.get('status', '').upper()
                 message = transaction_data.get('message', '')
                 
-                print(f"🔍 Statut Airtel brut: '{airtel_status}'")
-                print(f"🔍 Message: '{message}'")
-                
                 # Mapping des statuts Airtel spécifiques
                 if airtel_status == 'TS':  # ← TS = Transaction Successful
                     return {
@@ -215,7 +242,7 @@ class AirtelMoneyService:
                     }
                 else:
                     # Statut inconnu - considérer comme pending
-                    print(f"⚠️ Statut Airtel inconnu: '{airtel_status}' - considéré comme PENDING")
+                    logger.warning(f"Statut Airtel inconnu: '{airtel_status}' - considéré comme PENDING")
                     return {
                         'success': True,
                         'status': 'PENDING',
@@ -227,11 +254,11 @@ class AirtelMoneyService:
                 return {
                     'success': True,
                     'status': 'PENDING',
-                    'message': 'Transaction en cours de traitement'
+                    'message': 'Transaction en cours de traitement',
+                    'introuvable': True
                 }
             
             else:
-                print(f"❌ Erreur Airtel Status {response.status_code}: {response.text}")
                 return {
                     'success': False,
                     'error': f'Erreur API Airtel: {response.status_code}',
@@ -239,5 +266,11 @@ class AirtelMoneyService:
                 }
                 
         except Exception as e:
-            print(f"💥 Exception vérification Airtel: {e}")
-            return {'success': False, 'error': str(e)}
\ No newline at end of file
+            logger.error(f"Exception vérification Airtel {transaction_id}: {e}")
+            tracer_appel_operateur(
+                'airtel', 'payment_status', methode='GET',
+                url=f"{self.base_url}/standard/v1/payments/{transaction_id}", erreur=e
+            )
+            return {'success': False, 'error': str(e)}
+        finally:
+            disjoncteur.liberer()
\ No newline at end of file
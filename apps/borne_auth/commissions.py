@@ -0,0 +1,215 @@
+# apps/borne_auth/commissions.py
+
+"""
+Grand livre des commissions agents
+
+1. comptabiliser() ajoute les acquisitions (paiements réussis des
+   souscriptions d'un agent) et les annulations (paiements remboursés) : les
+   paiements modifiés depuis LOOKBACK_HOURS sont relus, la contrainte unique
+   paiement/type rend l'opération rejouable quel que soit le chemin qui a
+   validé le paiement (callback, monitoring, confirmation manuelle) ;
+   reprendre_historique() passe une fois les paiements antérieurs
+   (commande reprendre_commissions)
+2. agreger() reporte les mouvements non agrégés dans SoldeCommission par
+   lots (une agrégation SQL, une mise à jour par agent) et recopie le
+   cumul réglé dans Agent.solde_commissions (commissions déjà versées,
+   sens d'origine de la colonne ; reprises par la migration 0004)
+3. regler() crée un lot de règlement : une écriture négative par agent à
+   hauteur de son solde, sous verrou des soldes (pas de double règlement)
+
+Les endpoints agents lisent SoldeCommission sans agréger les paiements.
+"""
+
+import logging
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+from datetime import timedelta
+
+from apps.pass_payments.models import PaiementPass
+
+from .models import Agent, MouvementCommission, ReglementCommission, SoldeCommission
+
+logger = logging.getLogger(__name__)
+
+CENTIME = Decimal('0.01')
+
+
+def commission(montant, taux):
+    return (Decimal(montant) * Decimal(taux) / 100).quantize(CENTIME, rounding=ROUND_HALF_UP)
+
+
+def _mouvements_manquants(paiements, statut, type_mouvement):
+    deja_passe = MouvementCommission.objects.filter(paiement=OuterRef('pk'), type_mouvement=type_mouvement)
+    return paiements.filter(statut=statut, souscription_pass__agent__isnull=False).exclude(Exists(deja_passe))
+
+
+def _comptabiliser(paiements):
+    """Ecritures manquantes des paiements donnés (queryset), retourne le nombre ajouté"""
+    config = settings.AGENT_COMMISSIONS
+    champs = ('id', 'montant', 'souscription_pass__agent_id', 'souscription_pass__agent__taux_commission')
+
+    lignes = []
+    for paiement_id, montant, agent_id, taux in _mouvements_manquants(paiements, 'succes', 'acquisition').values_list(*champs):
+        lignes.append(MouvementCommission(
+            agent_id=agent_id, type_mouvement='acquisition', paiement_id=paiement_id,
+            assiette=montant, taux=taux, montant=commission(montant, taux)
+        ))
+
+    # Remboursement : l'acquisition passée est contre-passée au même taux
+    acquisition = MouvementCommission.objects.filter(paiement=OuterRef('pk'), type_mouvement='acquisition')
+    remboursements = _mouvements_manquants(paiements, 'rembourse', 'annulation').filter(
+        Exists(acquisition)
+    ).annotate(
+        taux_acquisition=Subquery(acquisition.values('taux')[:1]),
+        commission_acquise=Subquery(acquisition.values('montant')[:1])
+    ).values_list('id', 'montant', 'souscription_pass__agent_id', 'taux_acquisition', 'commission_acquise')
+    for paiement_id, montant, agent_id, taux, commission_acquise in remboursements:
+        lignes.append(MouvementCommission(
+            agent_id=agent_id, type_mouvement='annulation', paiement_id=paiement_id,
+            assiette=-montant, taux=taux, montant=-commission_acquise
+        ))
+
+    creees = MouvementCommission.objects.bulk_create(
+        lignes, batch_size=config['BATCH_SIZE'], ignore_conflicts=True
+    )
+    return len(creees)
+
+
+def comptabiliser():
+    """Acquisitions et annulations des paiements modifiés depuis LOOKBACK_HOURS"""
+    depuis = timezone.now() - timedelta(hours=settings.AGENT_COMMISSIONS['LOOKBACK_HOURS'])
+    return _comptabiliser(PaiementPass.objects.filter(date_modification__gte=depuis))
+
+
+def reprendre_historique():
+    """
+    Ecritures de tous les paiements, par tranches d'identifiants (reprise
+    de l'historique antérieur au grand livre) ; rejouable
+    Retourne le nombre d'écritures ajoutées
+    """
+    taille = settings.AGENT_COMMISSIONS['BATCH_SIZE'] * 10
+    paiements = PaiementPass.objects.filter(
+        statut__in=['succes', 'rembourse'], souscription_pass__agent__isnull=False
+    ).order_by('id')
+    total, dernier = 0, 0
+    while True:
+        ids = list(paiements.filter(id__gt=dernier).values_list('id', flat=True)[:taille])
+        if not ids:
+            return total
+        total += _comptabiliser(PaiementPass.objects.filter(id__in=ids))
+        dernier = ids[-1]
+        logger.info(f"Reprise commissions: paiements jusqu'à {dernier}, {total} écritures")
+
+
+def _agreger_lot(mouvement_ids):
+    """Reporte des mouvements dans les soldes (dans la transaction de l'appelant)"""
+    deltas = MouvementCommission.objects.filter(id__in=mouvement_ids).values('agent_id').order_by().annotate(
+        chiffre_affaires=Sum('assiette'),
+        nombre_paiements=Sum(Case(
+            When(type_mouvement='acquisition', then=Value(1)),
+            When(type_mouvement='annulation', then=Value(-1)),
+            default=Value(0),
+            output_field=IntegerField()
+        )),
+        acquises=Sum('montant', filter=~Q(type_mouvement='reglement'), default=Decimal(0)),
+        reglees=Sum('montant', filter=Q(type_mouvement='reglement'), default=Decimal(0)),
+    )
+
+    agents = []
+    SoldeCommission.objects.bulk_create(
+        [SoldeCommission(agent_id=delta['agent_id']) for delta in deltas], ignore_conflicts=True
+    )
+    for delta in deltas:
+        agents.append(delta['agent_id'])
+        SoldeCommission.objects.filter(agent_id=delta['agent_id']).update(
+            chiffre_affaires=F('chiffre_affaires') + delta['chiffre_affaires'],
+            nombre_paiements=F('nombre_paiements') + delta['nombre_paiements'],
+            commissions_acquises=F('commissions_acquises') + delta['acquises'],
+            commissions_reglees=F('commissions_reglees') - delta['reglees'],
+            solde=F('solde') + delta['acquises'] + delta['reglees'],
+            date_calcul=timezone.now()
+        )
+
+    MouvementCommission.objects.filter(id__in=mouvement_ids).update(date_agregation=timezone.now())
+    # Sens d'origine : commissions déjà versées (dues = acquises - solde_commissions)
+    Agent.objects.filter(id__in=agents).update(
+        solde_commissions=Subquery(
+            SoldeCommission.objects.filter(agent=OuterRef('pk')).values('commissions_reglees')[:1]
+        )
+    )
+    return agents
+
+
+def agreger():
+    """Mouvements non agrégés reportés par lots, retourne le nombre traité"""
+    taille_lot = settings.AGENT_COMMISSIONS['BATCH_SIZE']
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Deux agrégations concurrentes se partagent les lignes
+            ids = list(
+                MouvementCommission.objects.filter(date_agregation__isnull=True)
+                .select_for_update(skip_locked=True).order_by('id')
+                .values_list('id', flat=True)[:taille_lot]
+            )
+            if not ids:
+                return total
+            _agreger_lot(ids)
+        total += len(ids)
+
+
+def regler(montant_minimum=None):
+    """
+    Lot de règlement des soldes >= montant_minimum
+    Retourne (règlement, lignes [agent, montant]) ; (None, []) si rien à régler
+    """
+    montant_minimum = Decimal(
+        montant_minimum if montant_minimum is not None else settings.AGENT_COMMISSIONS['SETTLEMENT_MINIMUM']
+    )
+    agreger()
+
+    with transaction.atomic():
+        soldes = list(
+            SoldeCommission.objects.select_for_update(of=('self',)).select_related('agent')
+            .filter(solde__gt=0, solde__gte=montant_minimum).order_by('agent__matricule')
+        )
+        if not soldes:
+            return None, []
+
+        maintenant = timezone.localtime()
+        reglement = ReglementCommission.objects.create(
+            reference=f"RC-{maintenant:%Y%m%d-%H%M%S}",
+            nombre_agents=len(soldes),
+            montant_total=sum(solde.solde for solde in soldes)
+        )
+        mouvements = MouvementCommission.objects.bulk_create([
+            MouvementCommission(
+                agent_id=solde.agent_id, type_mouvement='reglement', reglement=reglement, montant=-solde.solde
+            )
+            for solde in soldes
+        ])
+        # Soldes mis à jour avant de relâcher les verrous : un règlement concurrent voit zéro
+        _agreger_lot([mouvement.id for mouvement in mouvements])
+
+    logger.info(f"💰 Règlement {reglement.reference}: {reglement.montant_total} FCFA, {len(soldes)} agents")
+    return reglement, [(solde.agent, solde.solde) for solde in soldes]
+
+
+def lignes_reglement(reglement):
+    """Lignes (agent, montant) d'un règlement existant, pour ré-export"""
+    return [
+        (mouvement.agent, -mouvement.montant)
+        for mouvement in reglement.mouvements.select_related('agent').order_by('agent__matricule')
+    ]
+
+
+def solde_agent(agent):
+    """Solde précalculé de l'agent (zéros s'il n'a encore aucun mouvement agrégé)"""
+    try:
+        return agent.solde_commission
+    except SoldeCommission.DoesNotExist:
+        return SoldeCommission(agent=agent)
@@ -0,0 +1,77 @@
+import csv
+import sys
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from apps.borne_auth import commissions
+from apps.borne_auth.models import ReglementCommission, SoldeCommission
+
+COLONNES = ['reference', 'matricule', 'nom', 'agence', 'telephone', 'montant']
+
+
+class Command(BaseCommand):
+    help = 'Règle les soldes de commissions agents et exporte le lot en CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minimum',
+            type=Decimal,
+            help='Solde minimal réglé (défaut: settings SETTLEMENT_MINIMUM)'
+        )
+        parser.add_argument(
+            '--sortie',
+            help='Fichier CSV (défaut: sortie standard)'
+        )
+        parser.add_argument(
+            '--reglement',
+            help='Ré-exporter un règlement existant (référence RC-...)'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Afficher les soldes qui seraient réglés sans rien modifier'
+        )
+
+    def handle(self, *args, **options):
+        if options['reglement']:
+            try:
+                reglement = ReglementCommission.objects.get(reference=options['reglement'])
+            except ReglementCommission.DoesNotExist:
+                raise CommandError(f"Règlement {options['reglement']} introuvable")
+            self._exporter(reglement, commissions.lignes_reglement(reglement), options['sortie'])
+            return
+
+        if options['simulation']:
+            commissions.agreger()
+            minimum = options['minimum']
+            if minimum is None:
+                minimum = Decimal(settings.AGENT_COMMISSIONS['SETTLEMENT_MINIMUM'])
+            soldes = SoldeCommission.objects.filter(solde__gt=0, solde__gte=minimum)
+            total = soldes.aggregate(total=Sum('solde'))['total'] or 0
+            self.stdout.write(f"À régler: {soldes.count()} agents, {total} FCFA")
+            return
+
+        reglement, lignes = commissions.regler(options['minimum'])
+        if reglement is None:
+            self.stdout.write('Aucun solde à régler')
+            return
+        self._exporter(reglement, lignes, options['sortie'])
+        self.stderr.write(self.style.SUCCESS(
+            f"✅ {reglement.reference}: {reglement.montant_total} FCFA, {reglement.nombre_agents} agents"
+        ))
+
+    def _exporter(self, reglement, lignes, sortie):
+        fichier = open(sortie, 'w', newline='', encoding='utf-8') if sortie else sys.stdout
+        try:
+            writer = csv.writer(fichier, delimiter=';')
+            writer.writerow(COLONNES)
+            for agent, montant in lignes:
+                writer.writerow([
+                    reglement.reference, agent.matricule, agent.nom_complet, agent.agence, agent.telephone, montant
+                ])
+        finally:
+            if sortie:
+                fichier.close()
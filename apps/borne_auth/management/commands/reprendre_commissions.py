@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.borne_auth import commissions
+
+
+class Command(BaseCommand):
+    help = "Passe au grand livre des commissions les paiements antérieurs à sa mise en service (rejouable)"
+
+    def handle(self, *args, **options):
+        ajoutees = commissions.reprendre_historique()
+        agregees = commissions.agreger()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Reprise des commissions: {ajoutees} écritures ajoutées, {agregees} agrégées"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:41
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index construits sans verrouiller les tables en écriture
+    atomic = False
+
+    dependencies = [
+        ('borne_auth', '0001_initial'),
+        ('pass_clients', '0003_add_agent_to_souscription'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='numeropolice',
+            index=models.Index(fields=['numero_police'], name='police_numero_prefixe_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
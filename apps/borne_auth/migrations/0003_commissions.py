@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borne_auth', '0002_numeropolice_police_numero_prefixe_idx'),
+        ('pass_payments', '0009_renouvellementsouscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglementCommission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=30, unique=True)),
+                ('nombre_agents', models.PositiveIntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Règlement de commissions',
+                'verbose_name_plural': 'Règlements de commissions',
+                'db_table': 'reglements_commissions',
+                'ordering': ['-date_creation'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SoldeCommission',
+            fields=[
+                ('agent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde_commission', serialize=False, to='borne_auth.agent')),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('nombre_paiements', models.IntegerField(default=0)),
+                ('commissions_acquises', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('commissions_reglees', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('solde', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde de commissions',
+                'verbose_name_plural': 'Soldes de commissions',
+                'db_table': 'soldes_commissions',
+            },
+        ),
+        migrations.CreateModel(
+            name='MouvementCommission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_mouvement', models.CharField(choices=[('acquisition', 'Acquisition'), ('annulation', 'Annulation'), ('reglement', 'Règlement')], max_length=20)),
+                ('assiette', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('taux', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_agregation', models.DateTimeField(blank=True, null=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='mouvements_commission', to='borne_auth.agent')),
+                ('paiement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='mouvements_commission', to='pass_payments.paiementpass')),
+                ('reglement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='mouvements', to='borne_auth.reglementcommission')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de commission',
+                'verbose_name_plural': 'Mouvements de commission',
+                'db_table': 'mouvements_commissions',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['agent', '-date_creation'], name='mouvement_commission_agent_idx'), models.Index(condition=models.Q(('date_agregation__isnull', True)), fields=['id'], name='mouvement_commission_agreg_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('paiement__isnull', False)), fields=('paiement', 'type_mouvement'), name='mouvement_commission_paiement_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+REFERENCE = 'RC-REPRISE'
+
+
+def reprendre_commissions_reglees(apps, schema_editor):
+    """
+    Agent.solde_commissions (commissions déjà versées avant le grand livre)
+    repris en règlement d'ouverture, agrégé au prochain passage
+    """
+    Agent = apps.get_model('borne_auth', 'Agent')
+    ReglementCommission = apps.get_model('borne_auth', 'ReglementCommission')
+    MouvementCommission = apps.get_model('borne_auth', 'MouvementCommission')
+
+    agents = list(Agent.objects.filter(solde_commissions__gt=0).values_list('id', 'solde_commissions'))
+    if not agents or ReglementCommission.objects.filter(reference=REFERENCE).exists():
+        return
+    reglement = ReglementCommission.objects.create(
+        reference=REFERENCE,
+        nombre_agents=len(agents),
+        montant_total=sum(montant for _, montant in agents)
+    )
+    MouvementCommission.objects.bulk_create([
+        MouvementCommission(agent_id=agent_id, type_mouvement='reglement', reglement=reglement, montant=-montant)
+        for agent_id, montant in agents
+    ])
+
+
+def annuler_reprise(apps, schema_editor):
+    ReglementCommission = apps.get_model('borne_auth', 'ReglementCommission')
+    MouvementCommission = apps.get_model('borne_auth', 'MouvementCommission')
+    MouvementCommission.objects.filter(reglement__reference=REFERENCE).delete()
+    ReglementCommission.objects.filter(reference=REFERENCE).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borne_auth', '0003_commissions'),
+    ]
+
+    operations = [
+        migrations.RunPython(reprendre_commissions_reglees, annuler_reprise),
+    ]
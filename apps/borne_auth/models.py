@@ -40,6 +40,14 @@ class NumeroPolice(models.Model):
         ordering = ['-date_attribution']
         verbose_name = 'Numéro de Police'
         verbose_name_plural = 'Numéros de Police'
+        indexes = [
+            # Génération des numéros : LIKE 'CG-2025-KIM-%' (collation non C)
+            models.Index(
+                fields=['numero_police'],
+                name='police_numero_prefixe_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
         
     def __str__(self):
         return f"{self.numero_police} - {self.souscription_pass.client.nom_complet}"
@@ -88,3 +96,113 @@ class Agent(models.Model):
     def nom_complet(self):
         return f"{self.prenom} {self.nom}"
 
+
+
+class ReglementCommission(models.Model):
+    """Lot de règlement des commissions (export comptable)"""
+    
+    reference = models.CharField(max_length=30, unique=True)
+    nombre_agents = models.PositiveIntegerField(default=0)
+    montant_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'reglements_commissions'
+        ordering = ['-date_creation']
+        verbose_name = 'Règlement de commissions'
+        verbose_name_plural = 'Règlements de commissions'
+        
+    def __str__(self):
+        return f"{self.reference} - {self.montant_total} FCFA ({self.nombre_agents} agents)"
+
+
+class MouvementCommission(models.Model):
+    """
+    Ecriture du grand livre des commissions agents (ajout seul)
+    
+    Acquisition à chaque paiement réussi d'une souscription de l'agent,
+    annulation si le paiement est remboursé, règlement lors d'un export.
+    Les montants sont signés ; les soldes (SoldeCommission) en sont l'agrégat.
+    """
+    
+    TYPE_CHOICES = [
+        ('acquisition', 'Acquisition'),
+        ('annulation', 'Annulation'),
+        ('reglement', 'Règlement'),
+    ]
+    
+    agent = models.ForeignKey(Agent, on_delete=models.RESTRICT, related_name='mouvements_commission')
+    type_mouvement = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    paiement = models.ForeignKey(
+        'pass_payments.PaiementPass',
+        on_delete=models.RESTRICT,
+        null=True, blank=True,
+        related_name='mouvements_commission'
+    )
+    reglement = models.ForeignKey(
+        ReglementCommission,
+        on_delete=models.RESTRICT,
+        null=True, blank=True,
+        related_name='mouvements'
+    )
+    # Montant du paiement (négatif pour une annulation), taux appliqué et commission signée
+    assiette = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    taux = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    montant = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    date_creation = models.DateTimeField(auto_now_add=True)
+    # Prise en compte dans SoldeCommission (seule colonne modifiée après insertion)
+    date_agregation = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'mouvements_commissions'
+        ordering = ['id']
+        verbose_name = 'Mouvement de commission'
+        verbose_name_plural = 'Mouvements de commission'
+        constraints = [
+            # Une acquisition et au plus une annulation par paiement
+            models.UniqueConstraint(
+                fields=['paiement', 'type_mouvement'],
+                name='mouvement_commission_paiement_uniq',
+                condition=models.Q(paiement__isnull=False)
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['agent', '-date_creation'], name='mouvement_commission_agent_idx'),
+            # Mouvements restant à agréger (index partiel)
+            models.Index(
+                fields=['id'],
+                name='mouvement_commission_agreg_idx',
+                condition=models.Q(date_agregation__isnull=True)
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.agent_id} {self.type_mouvement} {self.montant} FCFA"
+
+
+class SoldeCommission(models.Model):
+    """Cumuls de commissions par agent, lus tels quels par les endpoints agents"""
+    
+    agent = models.OneToOneField(
+        Agent,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='solde_commission'
+    )
+    chiffre_affaires = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    nombre_paiements = models.IntegerField(default=0)
+    commissions_acquises = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    commissions_reglees = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Réglées : recopiées dans Agent.solde_commissions (commissions déjà versées)
+    # Solde : commissions dues (acquises - réglées)
+    solde = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    date_calcul = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'soldes_commissions'
+        verbose_name = 'Solde de commissions'
+        verbose_name_plural = 'Soldes de commissions'
+        
+    def __str__(self):
+        return f"{self.agent_id} - solde {self.solde} FCFA"
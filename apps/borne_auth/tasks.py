@@ -0,0 +1,21 @@
+# apps/borne_auth/tasks.py
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from . import commissions
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(bind=True)
+def comptabiliser_commissions(self):
+    """
+    Grand livre des commissions : écritures des paiements réussis ou
+    remboursés, puis report groupé dans les soldes agents
+    """
+    ecritures = commissions.comptabiliser()
+    agreges = commissions.agreger()
+    if ecritures or agreges:
+        logger.info(f"💼 Commissions: {ecritures} écritures, {agreges} mouvements agrégés")
+    return {'ecritures': ecritures, 'agreges': agreges}
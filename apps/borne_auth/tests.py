@@ -1,3 +1,87 @@
+from datetime import date
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.borne_auth import commissions
+from apps.borne_auth.models import Agent, MouvementCommission, SoldeCommission
+from apps.pass_clients.models import ClientPass, SouscriptionPass
+from apps.pass_payments.models import PaiementPass
+from apps.pass_products.models import ProduitPass
+
+
+class CommissionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(
+            nom='Agent', prenom='Test', telephone='+242060000001', matricule='AG001',
+            agence='Brazzaville', date_embauche=date(2024, 1, 1), taux_commission=Decimal('5.00')
+        )
+        produit = ProduitPass.objects.create(code_pass='TEST', nom_pass='Test', description='Test', categorie='mixte')
+        client = ClientPass.objects.create(nom='Test', prenom='Client', telephone='+242060000002', adresse='Brazzaville')
+        cls.souscription = SouscriptionPass.objects.create(
+            client=client, produit_pass=produit, agent=cls.agent, montant_souscription=1000,
+            numero_souscription='TEST-1'
+        )
+
+    def paiement(self, montant, statut='succes'):
+        return PaiementPass.objects.create(
+            souscription_pass=self.souscription, client=self.souscription.client, montant=montant,
+            operateur='mtn_money', numero_payeur='+242060000002', statut=statut
+        )
+
+    def solde(self):
+        return SoldeCommission.objects.get(agent=self.agent)
+
+    def test_agreger_reporte_acquisitions_et_annulations(self):
+        self.paiement(10000)
+        rembourse = self.paiement(2000)
+        self.paiement(5000, statut='echec')
+
+        self.assertEqual(commissions.comptabiliser(), 2)
+        PaiementPass.objects.filter(id=rembourse.id).update(statut='rembourse')
+        self.assertEqual(commissions.comptabiliser(), 1)
+        self.assertEqual(commissions.comptabiliser(), 0)
+        self.assertEqual(commissions.agreger(), 3)
+
+        solde = self.solde()
+        self.assertEqual(solde.chiffre_affaires, Decimal('10000'))
+        self.assertEqual(solde.nombre_paiements, 1)
+        self.assertEqual(solde.commissions_acquises, Decimal('500'))
+        self.assertEqual(solde.solde, Decimal('500'))
+        # Rejeu : rien à reporter deux fois
+        self.assertEqual(commissions.agreger(), 0)
+        self.assertEqual(self.solde().solde, Decimal('500'))
+
+    def test_regler_sans_double_reglement(self):
+        self.paiement(40000)
+        commissions.comptabiliser()
+
+        reglement, lignes = commissions.regler(montant_minimum=1000)
+
+        self.assertEqual(reglement.montant_total, Decimal('2000'))
+        self.assertEqual(lignes, [(self.agent, Decimal('2000'))])
+        solde = self.solde()
+        self.assertEqual((solde.solde, solde.commissions_reglees), (Decimal('0'), Decimal('2000')))
+        # Sens d'origine de la colonne : commissions déjà versées
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.solde_commissions, Decimal('2000'))
+        self.assertEqual(commissions.regler(montant_minimum=1000), (None, []))
+
+    def test_regler_respecte_le_minimum(self):
+        self.paiement(10000)
+        commissions.comptabiliser()
+
+        self.assertEqual(commissions.regler(montant_minimum=1000), (None, []))
+        self.assertEqual(self.solde().solde, Decimal('500'))
+
+    def test_reprise_historique(self):
+        paiement = self.paiement(10000)
+        # Paiement antérieur à la fenêtre LOOKBACK_HOURS
+        PaiementPass.objects.filter(id=paiement.id).update(date_modification='2024-01-01T00:00:00Z')
+
+        self.assertEqual(commissions.comptabiliser(), 0)
+        self.assertEqual(commissions.reprendre_historique(), 1)
+        self.assertEqual(commissions.reprendre_historique(), 0)
+        self.assertTrue(MouvementCommission.objects.filter(paiement=paiement, type_mouvement='acquisition').exists())
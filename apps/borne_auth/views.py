@@ -15,7 +15,9 @@ from apps.pass_clients.models import ClientPass, SouscriptionPass
 from apps.pass_payments.models import PaiementPass
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from .commissions import solde_agent
 from .models import Agent
+from nsia_pass_api.cache import INSTANTANES
 
 
 @api_view(['POST'])
@@ -356,41 +358,30 @@ def agent_stats(request, agent_id):
     GET /api/v1/agents/{id}/stats/
     """
     try:
-        agent = get_object_or_404(Agent, id=agent_id)
+        agent = get_object_or_404(Agent.objects.select_related('solde_commission'), id=agent_id)
         
         # Importer ici pour éviter les imports circulaires
         from apps.pass_clients.models import SouscriptionPass
-        from apps.pass_payments.models import PaiementPass
         
         # Statistiques souscriptions
         souscriptions = SouscriptionPass.objects.filter(agent=agent)
         souscriptions_actives = souscriptions.filter(statut='activee')
         
-        # Statistiques paiements
-        paiements_reussis = PaiementPass.objects.filter(
-            souscription_pass__agent=agent,
-            statut='succes'
-        )
+        # Chiffre d'affaires et commissions précalculés (grand livre des commissions)
+        solde = solde_agent(agent)
         
         # Calculs
         stats = {
             'nombre_souscriptions': souscriptions.count(),
             'souscriptions_actives': souscriptions_actives.count(),
-            'chiffre_affaires': paiements_reussis.aggregate(
-                total=Sum('montant')
-            )['total'] or 0,
-            'commissions_dues': 0,  # À calculer selon la logique métier
+            'chiffre_affaires': solde.chiffre_affaires,
+            'commissions_dues': solde.solde,
             'souscriptions_ce_mois': souscriptions.filter(
                 date_souscription__month=timezone.now().month,
                 date_souscription__year=timezone.now().year
             ).count(),
         }
         
-        # Calculer commissions dues
-        stats['commissions_dues'] = (
-            stats['chiffre_affaires'] * agent.taux_commission / 100
-        ) - agent.solde_commissions
-        
         # Sérialiser agent avec stats
         serializer = AgentStatsSerializer(agent)
         data = serializer.data
@@ -408,6 +399,49 @@ def agent_stats(request, agent_id):
             'details': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _calculer_dashboard_agents():
+    """Calcule les statistiques du dashboard agents"""
+    from apps.pass_clients.models import SouscriptionPass
+    
+    # Statistiques globales
+    total_agents = Agent.objects.filter(statut='actif').count()
+    total_souscriptions = SouscriptionPass.objects.count()
+    
+    # Top agents ce mois
+    current_month = timezone.now().replace(day=1)
+    top_agents = Agent.objects.filter(
+        statut='actif'
+    ).annotate(
+        souscriptions_ce_mois=Count(
+            'souscriptions',
+            filter=Q(souscriptions__date_souscription__gte=current_month)
+        )
+    ).order_by('-souscriptions_ce_mois')[:5]
+    
+    # Sérialiser top agents
+    top_agents_data = []
+    for agent in top_agents:
+        agent_data = dict(AgentListSerializer(agent).data)
+        agent_data['souscriptions_ce_mois'] = agent.souscriptions_ce_mois
+        top_agents_data.append(agent_data)
+    
+    return {
+        'statistiques_globales': {
+            'total_agents_actifs': total_agents,
+            'total_souscriptions': total_souscriptions,
+            'moyenne_souscriptions_par_agent': (
+                total_souscriptions / total_agents if total_agents > 0 else 0
+            )
+        },
+        'top_agents_ce_mois': top_agents_data,
+        'repartition_par_agence': list(
+            Agent.objects.filter(statut='actif')
+            .values('agence')
+            .annotate(nombre_agents=Count('id'))
+            .order_by('-nombre_agents')
+        )
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def agents_dashboard(request):
@@ -417,50 +451,14 @@ def agents_dashboard(request):
     GET /api/v1/agents/dashboard/
     """
     try:
-        from apps.pass_clients.models import SouscriptionPass
-        from apps.pass_payments.models import PaiementPass
-        from django.utils import timezone
-        
-        # Statistiques globales
-        total_agents = Agent.objects.filter(statut='actif').count()
-        total_souscriptions = SouscriptionPass.objects.count()
-        
-        # Top agents ce mois
-        current_month = timezone.now().replace(day=1)
-        top_agents = Agent.objects.filter(
-            statut='actif'
-        ).annotate(
-            souscriptions_ce_mois=Count(
-                'souscriptions',
-                filter=Q(souscriptions__date_souscription__gte=current_month)
-            )
-        ).order_by('-souscriptions_ce_mois')[:5]
-        
-        # Sérialiser top agents
-        top_agents_data = []
-        for agent in top_agents:
-            agent_data = AgentListSerializer(agent).data
-            agent_data['souscriptions_ce_mois'] = agent.souscriptions_ce_mois
-            top_agents_data.append(agent_data)
+        # Instantané partagé (60 s), invalidé quand un agent change
+        dashboard_data = INSTANTANES.get_or_set(
+            'agents_dashboard', _calculer_dashboard_agents
+        )
         
         return Response({
             'success': True,
-            'data': {
-                'statistiques_globales': {
-                    'total_agents_actifs': total_agents,
-                    'total_souscriptions': total_souscriptions,
-                    'moyenne_souscriptions_par_agent': (
-                        total_souscriptions / total_agents if total_agents > 0 else 0
-                    )
-                },
-                'top_agents_ce_mois': top_agents_data,
-                'repartition_par_agence': list(
-                    Agent.objects.filter(statut='actif')
-                    .values('agence')
-                    .annotate(nombre_agents=Count('id'))
-                    .order_by('-nombre_agents')
-                )
-            }
+            'data': dashboard_data
         })
         
     except Exception as e:
@@ -484,6 +482,7 @@ def toggle_agent_status(request, agent_id):
         # Basculer le statut
         agent.statut = 'inactif' if agent.statut == 'actif' else 'actif'
         agent.save()
+        INSTANTANES.delete('agents_dashboard')
         
         return Response({
             'success': True,
@@ -648,7 +647,9 @@ def agent_profile(request):
             
             # Récupérer l'agent
             agent_id = validated_token.get('agent_id')
-            agent = get_object_or_404(Agent, id=agent_id, statut='actif')
+            agent = get_object_or_404(
+                Agent.objects.select_related('solde_commission'), id=agent_id, statut='actif'
+            )
             
         except (InvalidToken, TokenError):
             return Response({
@@ -658,25 +659,15 @@ def agent_profile(request):
         
         # Statistiques détaillées
         from apps.pass_clients.models import SouscriptionPass
-        from apps.pass_payments.models import PaiementPass
         
         souscriptions = SouscriptionPass.objects.filter(agent=agent)
-        paiements_reussis = PaiementPass.objects.filter(
-            souscription_pass__agent=agent,
-            statut='succes'
-        )
-        
-        chiffre_affaires = paiements_reussis.aggregate(
-            total=Sum('montant')
-        )['total'] or 0
+        solde = solde_agent(agent)
         
         stats = {
             'total_souscriptions': souscriptions.count(),
             'souscriptions_actives': souscriptions.filter(statut='activee').count(),
-            'chiffre_affaires': float(chiffre_affaires),
-            'commissions_dues': float(
-                (chiffre_affaires * agent.taux_commission / 100) - agent.solde_commissions
-            ),
+            'chiffre_affaires': float(solde.chiffre_affaires),
+            'commissions_dues': float(solde.solde),
             'souscriptions_ce_mois': souscriptions.filter(
                 date_souscription__month=datetime.now().month,
                 date_souscription__year=datetime.now().year
@@ -737,7 +728,7 @@ class AgentDetailView(generics.RetrieveAPIView):
     
     GET /api/v1/agents/{id}/
     """
-    queryset = Agent.objects.all()
+    queryset = Agent.objects.select_related('solde_commission')
     serializer_class = AgentSerializer
     permission_classes = [IsAuthenticated]
     
@@ -755,6 +746,8 @@ class AgentDetailView(generics.RetrieveAPIView):
             statut='succes'
         )
         
+        solde = solde_agent(agent)
+        
         stats = {
             'souscriptions': {
                 'total': souscriptions.count(),
@@ -763,17 +756,18 @@ class AgentDetailView(generics.RetrieveAPIView):
                 'suspendues': souscriptions.filter(statut='suspendue').count()
             },
             'chiffre_affaires': {
-                'total': float(paiements_reussis.aggregate(
-                    total=Sum('montant')
-                )['total'] or 0),
+                'total': float(solde.chiffre_affaires),
                 'ce_mois': float(paiements_reussis.filter(
                     date_paiement__month=timezone.now().month,
                     date_paiement__year=timezone.now().year
                 ).aggregate(total=Sum('montant'))['total'] or 0)
             },
             'commissions': {
-                'solde_actuel': float(agent.solde_commissions),
-                'taux': float(agent.taux_commission)
+                'solde_actuel': float(solde.solde),
+                'acquises': float(solde.commissions_acquises),
+                'reglees': float(solde.commissions_reglees),
+                'taux': float(agent.taux_commission),
+                'date_calcul': solde.date_calcul
             }
         }
         
@@ -795,6 +789,7 @@ class AgentCreateView(generics.CreateAPIView):
             serializer.is_valid(raise_exception=True)
             
             agent = serializer.save()
+            INSTANTANES.delete('agents_dashboard')
             
             return Response({
                 'success': True,
@@ -997,6 +992,7 @@ class AgentDeleteView(generics.DestroyAPIView):
             }
             
             agent.delete()
+            INSTANTANES.delete('agents_dashboard')
             
             return Response({
                 'success': True,
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index construits sans verrouiller les tables en écriture
+    atomic = False
+
+    dependencies = [
+        ('mtn_integration', '0001_initial'),
+        ('pass_payments', '0002_alter_paiementpass_code_confirmation'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transactionmtn',
+            index=models.Index(condition=models.Q(('statut__in', ['initiated', 'pending'])), fields=['date_creation'], name='tx_mtn_en_attente_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transactionmtn',
+            index=models.Index(fields=['financial_transaction_id'], name='tx_mtn_fin_tx_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Tables d'archive partitionnées par mois (partitions créées à la demande
+# par apps.pass_payments.archivage)
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtn_integration', '0002_transactionmtn_tx_mtn_en_attente_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE transactions_mtn_archive (
+                    LIKE transactions_mtn INCLUDING DEFAULTS,
+                    date_archivage timestamp with time zone NOT NULL DEFAULT now(),
+                    PRIMARY KEY (id, date_creation)
+                ) PARTITION BY RANGE (date_creation);
+                CREATE INDEX transactions_mtn_archive_external_id_idx
+                    ON transactions_mtn_archive (external_id);
+                CREATE INDEX transactions_mtn_archive_fin_tx_id_idx
+                    ON transactions_mtn_archive (financial_transaction_id);
+                CREATE INDEX transactions_mtn_archive_paiement_idx
+                    ON transactions_mtn_archive (paiement_pass_id);
+
+                CREATE TABLE logs_mtn_archive (
+                    LIKE logs_mtn INCLUDING DEFAULTS,
+                    date_archivage timestamp with time zone NOT NULL DEFAULT now(),
+                    PRIMARY KEY (id, "timestamp")
+                ) PARTITION BY RANGE ("timestamp");
+                CREATE INDEX logs_mtn_archive_transaction_idx
+                    ON logs_mtn_archive (transaction_mtn_id);
+            """,
+            reverse_sql="""
+                DROP TABLE IF EXISTS logs_mtn_archive;
+                DROP TABLE IF EXISTS transactions_mtn_archive;
+            """,
+        ),
+    ]
@@ -0,0 +1,150 @@
+# Payloads JSON déplacés vers pass_payments.PayloadOperateur (compressés,
+# dédupliqués). Non atomique : la conversion est commitée par lots pour ne
+# pas verrouiller transactions_mtn pendant toute la migration.
+# Conversion figée ici : indépendante des évolutions de pass_payments.payloads.
+
+import hashlib
+import json
+import zlib
+
+import django.db.models.deletion
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models, transaction
+from psycopg2.extras import execute_values
+
+TABLES = ['transactions_mtn', 'transactions_mtn_archive']
+
+
+# Colonne JSON -> colonne de référence vers payloads_operateurs
+COLONNES = {
+    'request_payload': 'payload_requete_id',
+    'response_payload': 'payload_reponse_id',
+    'callback_payload': 'payload_callback_id',
+}
+
+
+def compresser(donnees):
+    """(empreinte, contenu compressé, taille JSON), comme PayloadOperateur à cette version"""
+    brut = json.dumps(
+        donnees, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+    return hashlib.sha256(brut).hexdigest(), zlib.compress(brut, 6), len(brut)
+
+
+def convertir_table(connexion, table, taille_lot=1000):
+    """Déplace les colonnes JSON de `table` vers payloads_operateurs, par lots commités séparément"""
+    sources = list(COLONNES)
+    cibles = list(COLONNES.values())
+    dernier_id = 0
+
+    while True:
+        with transaction.atomic(using=connexion.alias), connexion.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, {', '.join(sources)} FROM {table} "
+                f"WHERE id > %s ORDER BY id LIMIT %s",
+                [dernier_id, taille_lot]
+            )
+            lignes = cursor.fetchall()
+            if not lignes:
+                return
+            dernier_id = lignes[-1][0]
+
+            payloads = {}
+            references = []
+            for ligne in lignes:
+                empreintes = []
+                for donnees in ligne[1:]:
+                    # Django désactive le décodage jsonb de psycopg2 : texte brut
+                    if isinstance(donnees, str):
+                        donnees = json.loads(donnees)
+                    if donnees in (None, {}):
+                        empreintes.append(None)
+                        continue
+                    empreinte, contenu, taille = compresser(donnees)
+                    payloads[empreinte] = (contenu, taille)
+                    empreintes.append(empreinte)
+                references.append((ligne[0], empreintes))
+
+            ids = {}
+            if payloads:
+                execute_values(
+                    cursor.cursor,
+                    "INSERT INTO payloads_operateurs (empreinte, contenu, taille, date_creation) "
+                    "VALUES %s ON CONFLICT (empreinte) DO NOTHING",
+                    [(e, contenu, taille) for e, (contenu, taille) in payloads.items()],
+                    template="(%s, %s, %s, now())"
+                )
+                cursor.execute(
+                    "SELECT empreinte, id FROM payloads_operateurs WHERE empreinte = ANY(%s)",
+                    [list(payloads)]
+                )
+                ids = dict(cursor.fetchall())
+
+            execute_values(
+                cursor.cursor,
+                f"UPDATE {table} AS t SET "
+                f"{', '.join(f'{c} = v.{c}' for c in cibles)} "
+                f"FROM (VALUES %s) AS v(id, {', '.join(cibles)}) WHERE t.id = v.id",
+                [(id_ligne, *[ids.get(e) for e in empreintes]) for id_ligne, empreintes in references],
+                template="(%s, %s::bigint, %s::bigint, %s::bigint)"
+            )
+
+
+def convertir_payloads(apps, schema_editor):
+    for table in TABLES:
+        convertir_table(schema_editor.connection, table)
+
+
+def reference_payload(help_text=''):
+    return models.ForeignKey(
+        blank=True, db_constraint=False, db_index=False, help_text=help_text, null=True,
+        on_delete=django.db.models.deletion.DO_NOTHING, related_name='+',
+        to='pass_payments.payloadoperateur'
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('mtn_integration', '0003_tables_archive'),
+        ('pass_payments', '0004_payloadoperateur'),
+    ]
+
+    operations = [
+        migrations.AddField('transactionmtn', 'payload_requete', reference_payload()),
+        migrations.AddField('transactionmtn', 'payload_reponse', reference_payload()),
+        migrations.AddField('transactionmtn', 'payload_callback', reference_payload()),
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE transactions_mtn_archive
+                    ADD COLUMN payload_requete_id bigint NULL,
+                    ADD COLUMN payload_reponse_id bigint NULL,
+                    ADD COLUMN payload_callback_id bigint NULL;
+            """,
+            reverse_sql="""
+                ALTER TABLE transactions_mtn_archive
+                    DROP COLUMN payload_requete_id,
+                    DROP COLUMN payload_reponse_id,
+                    DROP COLUMN payload_callback_id;
+            """,
+        ),
+        migrations.RunPython(convertir_payloads, migrations.RunPython.noop),
+        migrations.RemoveField('transactionmtn', 'request_payload'),
+        migrations.RemoveField('transactionmtn', 'response_payload'),
+        migrations.RemoveField('transactionmtn', 'callback_payload'),
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE transactions_mtn_archive
+                    DROP COLUMN request_payload,
+                    DROP COLUMN response_payload,
+                    DROP COLUMN callback_payload;
+            """,
+            reverse_sql="""
+                ALTER TABLE transactions_mtn_archive
+                    ADD COLUMN request_payload jsonb NOT NULL DEFAULT '{}',
+                    ADD COLUMN response_payload jsonb NOT NULL DEFAULT '{}',
+                    ADD COLUMN callback_payload jsonb NOT NULL DEFAULT '{}';
+            """,
+        ),
+    ]
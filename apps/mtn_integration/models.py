@@ -1,6 +1,8 @@
 from django.db import models
 from apps.pass_payments.models import PaiementPass
-class TransactionMTN(models.Model):
+from apps.pass_payments.payloads import PayloadsOperateurMixin, payload_differe, reference_payload
+
+class TransactionMTN(PayloadsOperateurMixin, models.Model):
     """Log des transactions MTN Mobile Money"""
     
     TYPE_TRANSACTION_CHOICES = [
@@ -45,10 +47,13 @@ class TransactionMTN(models.Model):
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='initiated')
     status_reason = models.CharField(max_length=100, blank=True)
     
-    # Réponses API MTN (JSON)
-    request_payload = models.JSONField(default=dict)
-    response_payload = models.JSONField(default=dict)
-    callback_payload = models.JSONField(default=dict)
+    # Réponses API MTN (payloads compressés, chargés à la demande)
+    payload_requete = reference_payload()
+    payload_reponse = reference_payload()
+    payload_callback = reference_payload()
+    request_payload = payload_differe('request_payload', defaut=dict)
+    response_payload = payload_differe('response_payload', defaut=dict)
+    callback_payload = payload_differe('callback_payload', defaut=dict)
     
     # Dates
     date_creation = models.DateTimeField(auto_now_add=True)
@@ -64,6 +69,18 @@ class TransactionMTN(models.Model):
         ordering = ['-date_creation']
         verbose_name = 'Transaction MTN'
         verbose_name_plural = 'Transactions MTN'
+        indexes = [
+            # Poller : uniquement les transactions en attente (index partiel)
+            models.Index(
+                fields=['date_creation'],
+                name='tx_mtn_en_attente_idx',
+                condition=models.Q(statut__in=['initiated', 'pending'])
+            ),
+            # Callback MTN et rapprochement par reference_id
+            models.Index(fields=['financial_transaction_id'], name='tx_mtn_fin_tx_id_idx'),
+            # Exports incrémentaux (BI)
+            models.Index(fields=['date_modification'], name='tx_mtn_date_modif_idx'),
+        ]
         
     def __str__(self):
         return f"{self.external_id} - {self.montant} XAF ({self.statut})"
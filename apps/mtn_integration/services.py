@@ -1,9 +1,13 @@
 import requests
 import uuid
 import json
+import time
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.core.cache import cache
+from nsia_pass_api.cache import JETONS_OPERATEURS
+from apps.pass_payments.tracing import tracer_appel_operateur
+from apps.pass_payments.circuit_breaker import DisjoncteurOperateur, resultat_indisponible
+from apps.pass_payments.rate_limiter import LimiteurOperateur, PRIORITE_HAUTE, resultat_limite
 import logging
 import base64
 
@@ -19,7 +23,7 @@ class MTNMobileMoneyService:
         self.api_key = self.config['COLLECTION_API_KEY']
         self.user_id = self.config['COLLECTION_USER_ID']
         
-    def _get_headers(self, include_auth=True):
+    def _get_headers(self, include_auth=True, priorite=PRIORITE_HAUTE):
         """Génère les headers pour les requêtes MTN"""
         headers = {
             'Content-Type': 'application/json',
@@ -32,14 +36,25 @@ class MTNMobileMoneyService:
         }
         
         if include_auth:
-            token = self._get_access_token()
+            token = self._get_access_token(priorite)
             if token:
                 headers['Authorization'] = f'Bearer {token}'
         
         return headers
     
-    def _get_access_token(self):
+    def _get_access_token(self, priorite=PRIORITE_HAUTE):
         """Récupère ou génère un token d'accès MTN"""
+        cached_token = JETONS_OPERATEURS.get('mtn')
+        if cached_token:
+            return cached_token
+        
+        disjoncteur = DisjoncteurOperateur('mtn', 'token')
+        if not disjoncteur.autoriser():
+            return None
+        if not LimiteurOperateur('mtn', 'token').acquerir(priorite):
+            logger.warning("Limite de débit token MTN atteinte")
+            disjoncteur.liberer()
+            return None
             
         # Générer un nouveau token
         try:
@@ -53,20 +68,39 @@ class MTNMobileMoneyService:
 
             }
             
-            response = requests.post(url, headers=headers)
+            debut = time.monotonic()
+            try:
+                response = requests.post(url, headers=headers, timeout=self.config['TIMEOUT'])
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            tracer_appel_operateur(
+                'mtn', 'token',
+                methode='POST', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                headers=headers, reponse=response
+            )
             response.raise_for_status()
             
             token_data = response.json()
             access_token = token_data.get('access_token')
+            expires_in = int(token_data.get('expires_in', 3600))
             
+            if access_token:
+                JETONS_OPERATEURS.set('mtn', access_token, max(expires_in - 300, 60))
 
             return access_token
             
         except Exception as e:
             logger.error(f"Erreur génération token MTN: {e}")
             return None
+        finally:
+            disjoncteur.liberer()
     
-    def request_to_pay(self, amount, phone_number, external_id, payer_message="Paiement NSIA PASS"):
+    def request_to_pay(self, amount, phone_number, external_id, payer_message="Paiement NSIA PASS",
+                       priorite=PRIORITE_HAUTE, reference_id=None):
         """
         Initie une demande de paiement MTN Mobile Money
         
@@ -75,10 +109,19 @@ class MTNMobileMoneyService:
             phone_number (str): Numéro de téléphone au format +242XXXXXXXX
             external_id (str): ID unique de la transaction
             payer_message (str): Message pour le payeur
+            priorite (str): Priorité auprès du limiteur de débit
+            reference_id (str): X-Reference-Id généré à l'avance (reprises idempotentes)
             
         Returns:
             dict: Résultat de la demande de paiement
         """
+        disjoncteur = DisjoncteurOperateur('mtn', 'request_to_pay')
+        if not disjoncteur.autoriser():
+            return resultat_indisponible('mtn')
+        if not LimiteurOperateur('mtn', 'request_to_pay').acquerir(priorite):
+            disjoncteur.liberer()
+            return resultat_limite('mtn')
+        
         try:
             # Nettoyer le numéro de téléphone (format MTN attendu)
             clean_phone = phone_number.replace('+', '').replace(' ', '')
@@ -86,7 +129,8 @@ class MTNMobileMoneyService:
                 clean_phone = f"242{clean_phone}"
             
             url = f"{self.base_url}/collection/v1_0/requesttopay"
-            reference_id = str(uuid.uuid4())
+            reference_fournie = reference_id is not None
+            reference_id = reference_id or str(uuid.uuid4())
             
             payload = {
                 "amount": str(amount),
@@ -100,20 +144,36 @@ class MTNMobileMoneyService:
                 "payeeNote": f"NSIA PASS - Transaction {external_id}"
             }
             
-            headers = self._get_headers()
+            headers = self._get_headers(priorite=priorite)
             headers['X-Reference-Id'] = reference_id
             
-            response = requests.post(
-                url, 
-                headers=headers, 
-                data=json.dumps(payload)
+            debut = time.monotonic()
+            try:
+                response = requests.post(
+                    url, 
+                    headers=headers, 
+                    data=json.dumps(payload),
+                    timeout=self.config['TIMEOUT']
+                )
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            if response.status_code == 401:
+                JETONS_OPERATEURS.delete('mtn')
+            tracer_appel_operateur(
+                'mtn', 'request_to_pay',
+                methode='POST', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                headers=headers, requete=payload, reponse=response
             )
             
-            
             # Log de la requête
             logger.info(f"MTN Request to Pay: {reference_id} - {response.status_code}")
             
-            if response.status_code == 202:  # Accepted
+            # 409 sur une référence fournie : demande déjà acceptée (reprise)
+            if response.status_code == 202 or (response.status_code == 409 and reference_fournie):
                 return {
                     'success': True,
                     'reference_id': reference_id,
@@ -126,32 +186,63 @@ class MTNMobileMoneyService:
                 return {
                     'success': False,
                     'error': 'Erreur lors de l\'initiation du paiement',
-                    'details': response.text
+                    'details': response.text,
+                    'status_code': response.status_code
                 }
                 
         except Exception as e:
             logger.error(f"Exception MTN Request to Pay: {e}")
+            tracer_appel_operateur(
+                'mtn', 'request_to_pay', methode='POST',
+                url=f"{self.base_url}/collection/v1_0/requesttopay", erreur=e
+            )
             return {
                 'success': False,
                 'error': 'Erreur technique lors du paiement',
-                'details': str(e)
+                'details': str(e),
+                'erreur_reseau': isinstance(e, requests.RequestException)
             }
+        finally:
+            disjoncteur.liberer()
     
-    def check_payment_status(self, reference_id):
+    def check_payment_status(self, reference_id, priorite=PRIORITE_HAUTE):
         """
         Vérifie le statut d'un paiement MTN
         
         Args:
             reference_id (str): Reference ID de la transaction
+            priorite (str): Priorité auprès du limiteur de débit
             
         Returns:
             dict: Statut du paiement
         """
+        disjoncteur = DisjoncteurOperateur('mtn', 'payment_status')
+        if not disjoncteur.autoriser():
+            return resultat_indisponible('mtn')
+        if not LimiteurOperateur('mtn', 'payment_status').acquerir(priorite):
+            disjoncteur.liberer()
+            return resultat_limite('mtn')
+        
         try:
             url = f"{self.base_url}/collection/v1_0/requesttopay/{reference_id}"
-            headers = self._get_headers()
+            headers = self._get_headers(priorite=priorite)
             
-            response = requests.get(url, headers=headers, timeout=30)
+            debut = time.monotonic()
+            try:
+                response = requests.get(url, headers=headers, timeout=30)
+            except requests.RequestException as e:
+                disjoncteur.enregistrer_echec(str(e))
+                raise
+            duree_ms = int((time.monotonic() - debut) * 1000)
+            disjoncteur.enregistrer_reponse(response.status_code, duree_ms)
+            if response.status_code == 401:
+                JETONS_OPERATEURS.delete('mtn')
+            tracer_appel_operateur(
+                'mtn', 'payment_status',
+                methode='GET', url=url,
+                statut_http=response.status_code, duree_ms=duree_ms,
+                headers=headers, reponse=response
+            )
             
             if response.status_code == 200:
                 payment_data = response.json()
@@ -168,16 +259,23 @@ class MTNMobileMoneyService:
                 return {
                     'success': False,
                     'error': 'Impossible de vérifier le statut',
+                    'status_code': response.status_code,
                     'details': response.text
                 }
                 
         except Exception as e:
             logger.error(f"Erreur vérification statut MTN: {e}")
+            tracer_appel_operateur(
+                'mtn', 'payment_status', methode='GET',
+                url=f"{self.base_url}/collection/v1_0/requesttopay/{reference_id}", erreur=e
+            )
             return {
                 'success': False,
                 'error': 'Erreur technique',
                 'details': str(e)
             }
+        finally:
+            disjoncteur.liberer()
     
     def get_account_balance(self):
         """Récupère le solde du compte MTN Collection"""
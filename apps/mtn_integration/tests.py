@@ -1,3 +1,26 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.mtn_integration import services
+from apps.mtn_integration.services import MTNMobileMoneyService
+from nsia_pass_api import cache as cache_deux_niveaux
+
+
+class JetonCacheIndisponibleTests(TestCase):
+
+    def test_paiement_initie_sans_cache_partage(self):
+        panne = mock.Mock()
+        for operation in ('get', 'set', 'add', 'delete', 'incr'):
+            getattr(panne, operation).side_effect = ConnectionError('Redis injoignable')
+        jeton = mock.Mock(status_code=200, json=lambda: {'access_token': 'jeton', 'expires_in': 3600})
+        demande = mock.Mock(status_code=202, text='')
+
+        with mock.patch.object(cache_deux_niveaux, 'cache', panne), \
+                mock.patch.object(services.requests, 'post', side_effect=[jeton, demande]) as post, \
+                self.assertLogs(cache_deux_niveaux.logger, 'WARNING'):
+            resultat = MTNMobileMoneyService().request_to_pay(1000, '+242060000000', 'TX-CACHE')
+
+        self.assertTrue(resultat['success'])
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(post.call_args.kwargs['headers']['Authorization'], 'Bearer jeton')
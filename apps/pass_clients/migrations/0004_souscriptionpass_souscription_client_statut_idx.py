@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index construits sans verrouiller les tables en écriture
+    atomic = False
+
+    dependencies = [
+        ('borne_auth', '0002_numeropolice_police_numero_prefixe_idx'),
+        ('pass_clients', '0003_add_agent_to_souscription'),
+        ('pass_products', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='souscriptionpass',
+            index=models.Index(fields=['client', 'statut'], name='souscription_client_statut_idx'),
+        ),
+    ]
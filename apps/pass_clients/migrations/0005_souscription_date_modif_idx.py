@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:24
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Table chaude : index construit sans verrouiller les écritures
+    atomic = False
+
+    dependencies = [
+        ('borne_auth', '0003_commissions'),
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_products', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='souscriptionpass',
+            index=models.Index(fields=['date_modification'], name='souscription_date_modif_idx'),
+        ),
+    ]
@@ -126,6 +126,10 @@ class SouscriptionPass(models.Model):
             models.Index(fields=['numero_souscription']),
             models.Index(fields=['statut']),
             models.Index(fields=['agent']),  #  Index pour les requêtes par agent
+            # Souscriptions d'un client par statut (compteurs, dashboard)
+            models.Index(fields=['client', 'statut'], name='souscription_client_statut_idx'),
+            # Exports incrémentaux (BI)
+            models.Index(fields=['date_modification'], name='souscription_date_modif_idx'),
         ]
 
     def __str__(self):
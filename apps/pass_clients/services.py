@@ -1,4 +1,10 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from apps.borne_auth.models import Agent, NumeroPolice
 from apps.pass_clients.models import ClientPass, SouscriptionPass
@@ -6,6 +12,7 @@ from apps.pass_products.models import ProduitPass, BeneficiairePass
 from apps.pass_payments.models import PaiementPass
 import uuid
 
+logger = logging.getLogger(__name__)
 
 
 class SouscriptionPassService:
@@ -115,14 +122,21 @@ class SouscriptionPassService:
     @staticmethod
     @transaction.atomic  
     def activer_souscription(souscription_id):
-        """Activer une souscription après paiement validé"""
+        """
+        Activer une souscription après paiement validé
+        Idempotente : une souscription déjà activée renvoie sa police existante
+        """
         
         try:
-            souscription = SouscriptionPass.objects.get(id=souscription_id)
+            # Verrou : deux activations concurrentes de la même souscription s'attendent
+            souscription = SouscriptionPass.objects.select_for_update().select_related(
+                'produit_pass'
+            ).get(id=souscription_id)
         except SouscriptionPass.DoesNotExist:
             raise ValueError("Souscription non trouvée")
         
-        if souscription.statut != 'en_cours':
+        # 'activee' sans police : activation directe historique (callback MTN)
+        if souscription.statut not in ('en_cours', 'activee'):
             raise ValueError("Seules les souscriptions 'en_cours' peuvent être activées")
         
         # Vérifier si la police n'existe pas déjà (éviter les doublons)
@@ -130,13 +144,18 @@ class SouscriptionPassService:
             souscription_pass=souscription
         ).first()
         
-        if police_existante:
+        if police_existante and souscription.statut == 'activee':
             print(f"⚠️ Police déjà générée pour souscription {souscription_id}: {police_existante.numero_police}")
-            return souscription
+            return {
+                'souscription': souscription,
+                'numero_police': police_existante.numero_police,
+                'police': police_existante,
+                'deja_activee': True
+            }
         
         # 1. Activer la souscription
         souscription.statut = 'activee'
-        souscription.date_activation = timezone.now()
+        souscription.date_activation = souscription.date_activation or timezone.now()
 
         # Quand souscription activée
         #if souscription.statut == 'activee' and souscription.agent:
@@ -154,30 +173,27 @@ class SouscriptionPassService:
         souscription.paiement_initial_recu = True
         souscription.save()
         
-        # 4. NOUVEAU : Générer le numéro de police
-        numero_police = SouscriptionPassService.generer_numero_police(souscription)
-        
-        # 5. Créer l'enregistrement NumeroPolice
-        police = NumeroPolice.objects.create(
-            souscription_pass=souscription,
-            numero_police=numero_police,
-            date_attribution=timezone.now(),
-            statut='attribue'
-        )
-        
-        print(f"✅ Police générée: {numero_police} pour souscription {souscription_id}")
-        
-        # 6. Mettre à jour les statistiques client
-        client = souscription.client
-        client.nombre_souscriptions_actives = client.souscriptions.filter(
-            statut='activee'
-        ).count()
-        client.valeur_totale_souscriptions = sum(
-            s.montant_souscription for s in client.souscriptions.filter(
-                statut__in=['activee', 'en_cours']
+        if police_existante:
+            police = police_existante
+            numero_police = police.numero_police
+        else:
+            # 4. NOUVEAU : Générer le numéro de police
+            # Séquence par produit : les activations du même produit sont sérialisées
+            ProduitPass.objects.select_for_update().only('id').get(id=souscription.produit_pass_id)
+            numero_police = SouscriptionPassService.generer_numero_police(souscription)
+            
+            # 5. Créer l'enregistrement NumeroPolice
+            police = NumeroPolice.objects.create(
+                souscription_pass=souscription,
+                numero_police=numero_police,
+                date_attribution=timezone.now(),
+                statut='attribue'
             )
-        )
-        client.save()
+            
+            print(f"✅ Police générée: {numero_police} pour souscription {souscription_id}")
+        
+        # 6. Mettre à jour les statistiques client (une écriture)
+        SouscriptionPassService.mettre_a_jour_compteurs_clients([souscription.client_id])
         
         return {
             'souscription': souscription,
@@ -185,6 +201,88 @@ class SouscriptionPassService:
             'police': police
         }
     
+    @staticmethod
+    def mettre_a_jour_compteurs_clients(client_ids):
+        """Compteurs de souscriptions de plusieurs clients recalculés en un UPDATE"""
+        souscriptions = SouscriptionPass.objects.filter(client_id=OuterRef('pk')).order_by().values('client_id')
+        return ClientPass.objects.filter(id__in=client_ids).update(
+            nombre_souscriptions_actives=Coalesce(
+                Subquery(souscriptions.filter(statut='activee').annotate(n=Count('id')).values('n')),
+                0
+            ),
+            valeur_totale_souscriptions=Coalesce(
+                Subquery(
+                    souscriptions.filter(statut__in=['activee', 'en_cours'])
+                    .annotate(total=Sum('montant_souscription')).values('total')
+                ),
+                Value(0, output_field=DecimalField())
+            )
+        )
+    
+    @staticmethod
+    def expirer_souscriptions():
+        """
+        Souscriptions activées dont la date d'expiration est passée -> 'expiree'
+        UPDATE par lots courts, compteurs des clients concernés ajustés à chaque lot
+        """
+        taille_lot = settings.SUBSCRIPTION_RENEWAL['EXPIRY_CHUNK_SIZE']
+        a_expirer = SouscriptionPass.objects.filter(statut='activee', date_expiration__lt=timezone.localdate())
+        expirees = 0
+        while True:
+            lot = list(a_expirer.order_by().values_list('id', 'client_id')[:taille_lot])
+            if not lot:
+                return expirees
+            with transaction.atomic():
+                # Le filtre d'origine est réappliqué : une souscription renouvelée entre-temps est ignorée
+                expirees += a_expirer.filter(id__in=[souscription_id for souscription_id, _ in lot]).update(
+                    statut='expiree', date_modification=timezone.now()
+                )
+                SouscriptionPassService.mettre_a_jour_compteurs_clients({client_id for _, client_id in lot})
+    
+    @staticmethod
+    def demander_activation(*souscription_ids):
+        """
+        Planifie l'activation en tâche de fond (activer_souscriptions) après
+        commit, par lots, dédoublonnée par souscription
+        """
+        if souscription_ids:
+            ids = list(dict.fromkeys(souscription_ids))
+            transaction.on_commit(lambda: SouscriptionPassService.planifier_activations(ids))
+    
+    @staticmethod
+    def payees_non_activees():
+        """Souscriptions dont le paiement initial a réussi, toujours en cours"""
+        return SouscriptionPass.objects.filter(
+            statut='en_cours',
+            paiements__statut='succes',
+            paiements__type_paiement='souscription_initiale'
+        )
+    
+    @staticmethod
+    def activees_sans_police():
+        """Souscriptions activées directement, sans numéro de police"""
+        return SouscriptionPass.objects.filter(statut='activee', numero_police__isnull=True)
+    
+    @staticmethod
+    def planifier_activations(souscription_ids):
+        from apps.pass_clients.tasks import activer_souscriptions
+        
+        config = settings.SUBSCRIPTION_ACTIVATION
+        # Déjà en file : la tâche planifiée traitera aussi ce paiement
+        ids = [
+            souscription_id for souscription_id in souscription_ids
+            if cache.add(f"activation_souscription:{souscription_id}", 1, config['DEDUP_SECONDS'])
+        ]
+        for debut in range(0, len(ids), config['BATCH_SIZE']):
+            lot = ids[debut:debut + config['BATCH_SIZE']]
+            try:
+                activer_souscriptions.delay(lot)
+            except Exception as e:
+                # Broker indisponible : le rattrapage périodique activera ces souscriptions
+                cache.delete_many([f"activation_souscription:{i}" for i in lot])
+                logger.warning(f"Activation {lot} non planifiée: {e}")
+        return ids
+    
     @staticmethod
     def generer_numero_police(souscription):
         """Génère un numéro de police unique au format CG-YYYY-PPP-NNN"""
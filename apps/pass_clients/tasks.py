@@ -0,0 +1,76 @@
+# apps/pass_clients/tasks.py
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from apps.pass_payments.services import RenouvellementService
+
+from .services import SouscriptionPassService
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(bind=True)
+def activer_souscriptions(self, souscription_ids):
+    """
+    Active un lot de souscriptions payées (police, dates, statistiques client)
+    Idempotente ; les échecs transitoires (base) sont repris avec backoff
+    """
+    config = settings.SUBSCRIPTION_ACTIVATION
+    activees, a_reprendre = [], []
+
+    for souscription_id in souscription_ids:
+        try:
+            resultat = SouscriptionPassService.activer_souscription(souscription_id)
+            if not resultat.get('deja_activee'):
+                activees.append(souscription_id)
+                logger.info(f"🎉 Souscription activée - Police: {resultat['numero_police']}")
+        except ValueError as e:
+            # Souscription introuvable ou dans un statut non activable : rien à reprendre
+            logger.warning(f"⚠️ Activation souscription {souscription_id} ignorée: {e}")
+        except DatabaseError as e:
+            # Collision de numéro de police, verrou, connexion : nouvelle tentative
+            logger.error(f"❌ Erreur activation souscription {souscription_id}: {e}")
+            a_reprendre.append(souscription_id)
+        finally:
+            cache.delete(f"activation_souscription:{souscription_id}")
+
+    if a_reprendre and self.request.retries < config['MAX_RETRIES']:
+        raise self.retry(
+            args=[a_reprendre],
+            countdown=config['RETRY_BACKOFF_SECONDS'] * 2 ** self.request.retries,
+            max_retries=config['MAX_RETRIES']
+        )
+
+    return {'success': not a_reprendre, 'activees': activees, 'echecs': a_reprendre}
+
+
+@shared_task(bind=True)
+def rattraper_activations(self):
+    """
+    Filet de sécurité : souscriptions payées restées sans activation
+    (message perdu, reprises épuisées, activation directe sans police)
+    """
+    a_activer = SouscriptionPassService.payees_non_activees() | SouscriptionPassService.activees_sans_police()
+    ids = list(
+        a_activer.values_list('id', flat=True).distinct()[:settings.SUBSCRIPTION_ACTIVATION['CATCHUP_LIMIT']]
+    )
+    if ids:
+        logger.warning(f"🔁 {len(ids)} souscriptions payées sans activation, replanifiées")
+        SouscriptionPassService.planifier_activations(ids)
+    return {'replanifiees': len(ids)}
+
+
+@shared_task(bind=True)
+def cycle_vie_souscriptions(self):
+    """
+    Pipeline nocturne : expiration des souscriptions échues (lots, compteurs
+    clients ajustés) puis pré-génération des renouvellements à venir
+    """
+    expirees = SouscriptionPassService.expirer_souscriptions()
+    renouvellements = RenouvellementService.generer()
+    logger.info(f"📅 Cycle de vie: {expirees} souscriptions expirées, {renouvellements} renouvellements planifiés")
+    return {'expirees': expirees, 'renouvellements_planifies': renouvellements}
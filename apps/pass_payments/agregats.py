@@ -0,0 +1,140 @@
+# apps/pass_payments/agregats.py
+
+"""
+Agrégats financiers journaliers des paiements
+
+Une ligne par jour (date_paiement, fuseau TIME_ZONE), opérateur, produit,
+agence et statut : nombre, montant, frais_transaction et montant_net.
+
+Une journée est recalculée entièrement par un GROUP BY sur ses paiements
+(index paiement_date_idx), écrit par upsert ; les groupes disparus (tous
+leurs paiements ont changé de statut) sont supprimés ensuite. Le calcul est
+donc rejouable et deux recalculs concurrents de la même journée convergent.
+
+- recalculer_incremental() : journées des paiements modifiés récemment
+  (changements de statut), toutes les quelques minutes
+- reconstruire(debut, fin) : reprise d'une période (commande, nuit)
+- rapport() : totaux d'une période quelconque, sommés sur les agrégats
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import AgregatPaiementJournalier, PaiementPass
+
+logger = logging.getLogger(__name__)
+
+CHAMPS_AGREGAT = ['nombre', 'montant', 'frais_transaction', 'montant_net', 'date_calcul']
+MONTANTS = ('montant', 'frais_transaction', 'montant_net')
+
+# Regroupements proposés par rapport() : champ lu sur les agrégats
+REGROUPEMENTS = {
+    'jour': 'jour',
+    'mois': 'mois',
+    'operateur': 'operateur',
+    'produit': 'produit__code_pass',
+    'agence': 'agence',
+    'statut': 'statut',
+}
+
+
+def _debut_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def _recalculer(debut, fin):
+    """Recalcule les journées debut..fin incluses ; retourne le nombre de lignes écrites"""
+    date_calcul = timezone.now()
+    groupes = PaiementPass.objects.filter(
+        date_paiement__gte=_debut_jour(debut),
+        date_paiement__lt=_debut_jour(fin + timedelta(days=1))
+    ).values(
+        'operateur', 'statut',
+        jour=TruncDate('date_paiement'),
+        produit_id=F('souscription_pass__produit_pass_id'),
+        agence=Coalesce('souscription_pass__agent__agence', Value(''), output_field=CharField()),
+    ).order_by().annotate(
+        nombre=Count('id'),
+        **{champ: Sum(champ, default=0) for champ in MONTANTS}
+    )
+
+    lignes = [AgregatPaiementJournalier(date_calcul=date_calcul, **groupe) for groupe in groupes]
+    AgregatPaiementJournalier.objects.bulk_create(
+        lignes,
+        batch_size=settings.PAYMENT_ROLLUPS['WRITE_BATCH'],
+        update_conflicts=True,
+        unique_fields=['jour', 'operateur', 'produit', 'agence', 'statut'],
+        update_fields=CHAMPS_AGREGAT
+    )
+    # Groupes sans paiement à ce calcul (recalcul concurrent plus récent conservé)
+    AgregatPaiementJournalier.objects.filter(
+        jour__gte=debut, jour__lte=fin, date_calcul__lt=date_calcul
+    ).delete()
+    return len(lignes)
+
+
+def recalculer_jours(jours):
+    """Recalcule des journées isolées ; retourne le nombre de lignes écrites"""
+    return sum(_recalculer(jour, jour) for jour in sorted(set(jours)))
+
+
+def reconstruire(debut, fin):
+    """Reconstruit la période debut..fin par tranches de CHUNK_DAYS journées"""
+    tranche = timedelta(days=settings.PAYMENT_ROLLUPS['CHUNK_DAYS'])
+    total = 0
+    while debut <= fin:
+        fin_tranche = min(debut + tranche - timedelta(days=1), fin)
+        total += _recalculer(debut, fin_tranche)
+        logger.info(f"Agrégats paiements {debut} - {fin_tranche}: {total} lignes")
+        debut = fin_tranche + timedelta(days=1)
+    return total
+
+
+def recalculer_incremental():
+    """
+    Journées dont un paiement a été créé ou a changé de statut récemment
+    Fenêtre LOOKBACK_MINUTES plus longue que l'intervalle de la tâche : un
+    passage manqué est rattrapé par le suivant
+    """
+    depuis = timezone.now() - timedelta(minutes=settings.PAYMENT_ROLLUPS['LOOKBACK_MINUTES'])
+    jours = set(
+        PaiementPass.objects.filter(date_modification__gte=depuis)
+        .values_list(TruncDate('date_paiement'), flat=True).distinct()
+    )
+    return len(jours), recalculer_jours(jours)
+
+
+def rapport(debut, fin, regroupement=('jour',), statut='succes', **filtres):
+    """
+    Totaux de la période debut..fin par regroupement (clés de REGROUPEMENTS)
+    filtres : operateur, produit (code), agence ; statut None pour tous
+    Retourne {'lignes': [...], 'totaux': {...}}
+    """
+    agregats = AgregatPaiementJournalier.objects.filter(jour__gte=debut, jour__lte=fin)
+    if statut:
+        agregats = agregats.filter(statut=statut)
+    if filtres.get('operateur'):
+        agregats = agregats.filter(operateur=filtres['operateur'])
+    if filtres.get('produit'):
+        agregats = agregats.filter(produit__code_pass=filtres['produit'])
+    if filtres.get('agence') is not None:
+        agregats = agregats.filter(agence=filtres['agence'])
+
+    sommes = {'nombre': Sum('nombre'), **{champ: Sum(champ) for champ in MONTANTS}}
+    champs = [REGROUPEMENTS[nom] for nom in regroupement]
+    lignes = list(
+        agregats.annotate(mois=TruncMonth('jour')).values(*champs).order_by(*champs).annotate(**sommes)
+    ) if regroupement else []
+    totaux = agregats.aggregate(**sommes)
+    return {
+        # Clés de regroupement telles que demandées (produit : code du produit)
+        'lignes': [
+            {nom: ligne.pop(REGROUPEMENTS[nom]) for nom in regroupement} | ligne for ligne in lignes
+        ],
+        'totaux': {champ: valeur or 0 for champ, valeur in totaux.items()},
+    }
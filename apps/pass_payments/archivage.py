@@ -0,0 +1,252 @@
+# apps/pass_payments/archivage.py
+
+"""
+Archivage des tables opérateurs (transactions MTN/Airtel et logs MTN)
+
+Les tables chaudes ne gardent que HOT_DAYS jours : au-delà, les transactions
+terminées sont déplacées par lots vers des tables d'archive partitionnées
+par mois (<table>_archive_pAAAAMM). La rétention se fait en supprimant des
+partitions entières (DROP TABLE instantané, sans VACUUM).
+
+Le statut d'un paiement (bornes, back-office) reste disponible après
+archivage : transactions_archivees() relit l'archive par external_id.
+"""
+
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.airtel_integration.models import TransactionAirtel
+from apps.mtn_integration.models import LogMTN, TransactionMTN
+
+from .payloads import CHAMPS_PAYLOADS
+
+logger = logging.getLogger(__name__)
+
+# Seules les transactions terminées sont archivées
+STATUTS_ACTIFS = ('initiated', 'pending')
+
+# Table chaude -> table d'archive et tables dépendantes (archivées avec elle)
+ARCHIVES = {
+    'mtn': {
+        'modele': TransactionMTN,
+        'archive': 'transactions_mtn_archive',
+        'dependantes': [
+            {'modele': LogMTN, 'archive': 'logs_mtn_archive', 'cle': 'transaction_mtn_id'},
+        ],
+    },
+    'airtel': {
+        'modele': TransactionAirtel,
+        'archive': 'airtel_transactions_archive',
+        'dependantes': [],
+    },
+}
+
+
+def _colonnes(modele):
+    return ', '.join(connection.ops.quote_name(f.column) for f in modele._meta.concrete_fields)
+
+
+def _debut_mois(date):
+    return datetime(date.year, date.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _mois_suivant(date):
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def creer_partitions(table_archive, debut, fin):
+    """Crée les partitions mensuelles couvrant [debut, fin] si absentes"""
+    mois = _debut_mois(debut)
+    with connection.cursor() as cursor:
+        while mois <= fin:
+            suivant = _mois_suivant(mois)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_archive}_p{mois:%Y%m} "
+                f"PARTITION OF {table_archive} "
+                f"FOR VALUES FROM ('{mois.isoformat()}') TO ('{suivant.isoformat()}')"
+            )
+            mois = suivant
+
+
+def _archiver_lot(spec, limite, taille_lot):
+    """
+    Déplace un lot en une seule requête (CTE DELETE ... RETURNING -> INSERT)
+    Retourne (transactions archivées, lignes dépendantes archivées)
+    """
+    modele = spec['modele']
+    table = modele._meta.db_table
+    colonnes = _colonnes(modele)
+
+    # Lot verrouillé, parcouru par clé primaire (corrélée à la date)
+    ctes = [
+        f"lot AS (SELECT id FROM {table} "
+        f"WHERE date_creation < %s AND statut NOT IN %s "
+        f"ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)"
+    ]
+    for i, dependante in enumerate(spec['dependantes']):
+        colonnes_dep = _colonnes(dependante['modele'])
+        table_dep = dependante['modele']._meta.db_table
+        ctes.append(
+            f"dep{i} AS (DELETE FROM {table_dep} "
+            f"WHERE {dependante['cle']} IN (SELECT id FROM lot) RETURNING {colonnes_dep})"
+        )
+        ctes.append(
+            f"dep{i}_archive AS (INSERT INTO {dependante['archive']} ({colonnes_dep}) "
+            f"SELECT {colonnes_dep} FROM dep{i} RETURNING 1)"
+        )
+    ctes.append(
+        f"deplacees AS (DELETE FROM {table} WHERE id IN (SELECT id FROM lot) RETURNING {colonnes})"
+    )
+    ctes.append(
+        f"archivees AS (INSERT INTO {spec['archive']} ({colonnes}) "
+        f"SELECT {colonnes} FROM deplacees RETURNING 1)"
+    )
+    compteurs = ['(SELECT count(*) FROM archivees)'] + [
+        f"(SELECT count(*) FROM dep{i}_archive)" for i in range(len(spec['dependantes']))
+    ]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH {', '.join(ctes)} SELECT {', '.join(compteurs)}",
+            [limite, STATUTS_ACTIFS, taille_lot]
+        )
+        resultat = cursor.fetchone()
+    return resultat[0], sum(resultat[1:])
+
+
+def archiver(operateur, jours=None, taille_lot=None, simulation=False):
+    """Archive les transactions terminées plus vieilles que la fenêtre chaude"""
+    config = settings.OPERATOR_ARCHIVE
+    spec = ARCHIVES[operateur]
+    modele = spec['modele']
+    limite = timezone.now() - timedelta(days=jours or config['HOT_DAYS'])
+    taille_lot = taille_lot or config['CHUNK_SIZE']
+
+    candidates = modele.objects.filter(date_creation__lt=limite).exclude(statut__in=STATUTS_ACTIFS)
+    if simulation:
+        return {'operateur': operateur, 'limite': limite.isoformat(), 'a_archiver': candidates.count()}
+
+    plus_ancienne = candidates.aggregate(date=Min('date_creation'))['date']
+    rapport = {'operateur': operateur, 'limite': limite.isoformat(), 'archivees': 0, 'dependantes': 0}
+    if plus_ancienne is None:
+        return rapport
+
+    # Les lignes dépendantes peuvent être postérieures à la limite
+    maintenant = timezone.now()
+    creer_partitions(spec['archive'], plus_ancienne, limite)
+    for dependante in spec['dependantes']:
+        creer_partitions(dependante['archive'], plus_ancienne, maintenant)
+
+    while True:
+        archivees, dependantes = _archiver_lot(spec, limite, taille_lot)
+        rapport['archivees'] += archivees
+        rapport['dependantes'] += dependantes
+        if archivees < taille_lot:
+            break
+
+    logger.info(
+        f"Archivage {operateur}: {rapport['archivees']} transactions, "
+        f"{rapport['dependantes']} lignes dépendantes"
+    )
+    return rapport
+
+
+def partitions(table_archive):
+    """Partitions existantes d'une table d'archive, triées par mois"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT enfant.relname FROM pg_inherits "
+            "JOIN pg_class enfant ON enfant.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = %s ORDER BY enfant.relname",
+            [table_archive]
+        )
+        return [ligne[0] for ligne in cursor.fetchall()]
+
+
+def transactions_archivees(modele, champ_reference, external_ids):
+    """
+    Transactions archivées par external_id (table chaude sans la ligne) :
+    {external_id: {statut, status_reason, reference, date_modification}}
+    """
+    spec = next(spec for spec in ARCHIVES.values() if spec['modele'] is modele)
+    external_ids = list(external_ids)
+    if not external_ids:
+        return {}
+    reference = connection.ops.quote_name(modele._meta.get_field(champ_reference).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT ON (external_id) external_id, statut, status_reason, {reference}, date_modification "
+            f"FROM {spec['archive']} WHERE external_id = ANY(%s) ORDER BY external_id, date_modification DESC",
+            [external_ids]
+        )
+        return {
+            external_id: {
+                'statut': statut,
+                'status_reason': status_reason,
+                'reference': reference,
+                'date_modification': date_modification.isoformat(),
+            }
+            for external_id, statut, status_reason, reference, date_modification in cursor.fetchall()
+        }
+
+
+def purger(mois_retention=None, simulation=False):
+    """Supprime les partitions d'archive plus anciennes que la rétention"""
+    mois_retention = mois_retention or settings.OPERATOR_ARCHIVE['RETENTION_MONTHS']
+    maintenant = timezone.now()
+    total_mois = maintenant.year * 12 + maintenant.month - 1 - mois_retention
+    seuil = f"{total_mois // 12:04d}{total_mois % 12 + 1:02d}"
+
+    tables = [spec['archive'] for spec in ARCHIVES.values()] + [
+        dep['archive'] for spec in ARCHIVES.values() for dep in spec['dependantes']
+    ]
+    supprimees = []
+    for table in tables:
+        for partition in partitions(table):
+            correspondance = re.fullmatch(rf"{table}_p(\d{{6}})", partition)
+            if correspondance and correspondance.group(1) < seuil:
+                supprimees.append(partition)
+
+    if not simulation:
+        with connection.cursor() as cursor:
+            for partition in supprimees:
+                cursor.execute(f"DROP TABLE IF EXISTS {partition}")
+                logger.info(f"Partition d'archive supprimée: {partition}")
+    return supprimees
+
+
+def purger_payloads_orphelins(delai_heures=24):
+    """
+    Supprime les payloads qui ne sont plus référencés par aucune transaction
+    (chaude ou archivée), typiquement après la suppression d'une partition.
+    Les payloads créés ou réutilisés récemment (date_utilisation, rafraîchie
+    à chaque déduplication) sont épargnés : une transaction qui les référence
+    peut être en cours d'écriture. La condition de date est revérifiée par
+    PostgreSQL sur une ligne réutilisée pendant la suppression.
+    """
+    colonnes = [f"{champ}_id" for champ in CHAMPS_PAYLOADS.values()]
+    tables = [spec['modele']._meta.db_table for spec in ARCHIVES.values()] + [
+        spec['archive'] for spec in ARCHIVES.values()
+    ]
+    references = ' UNION ALL '.join(
+        f"SELECT {colonne} AS id FROM {table} WHERE {colonne} IS NOT NULL"
+        for table in tables for colonne in colonnes
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM payloads_operateurs AS p "
+            f"WHERE p.date_utilisation < now() - make_interval(hours => %s) "
+            f"AND NOT EXISTS (SELECT 1 FROM ({references}) AS r WHERE r.id = p.id)",
+            [delai_heures]
+        )
+        supprimes = cursor.rowcount
+    if supprimes:
+        logger.info(f"Payloads orphelins supprimés: {supprimes}")
+    return supprimes
@@ -0,0 +1,213 @@
+# apps/pass_payments/circuit_breaker.py
+
+"""
+Disjoncteur partagé par opérateur et par endpoint
+
+L'état vit dans le cache Django afin que tous les processus (gunicorn,
+Celery) le partagent :
+    ferme        - les appels passent, échecs et lenteurs sont comptés
+    ouvert       - les appels échouent immédiatement (fast-fail)
+    demi_ouvert  - après OPEN_SECONDS, une sonde à la fois est autorisée ;
+                   HALF_OPEN_SUCCESSES sondes réussies referment le circuit,
+                   un échec le rouvre
+
+Cache indisponible : le disjoncteur se comporte comme fermé (appels
+autorisés, rien n'est compté), comme le limiteur de débit. La sonde
+demi-ouverte est rendue par liberer() si l'appel s'arrête avant d'avoir
+enregistré un résultat (limiteur, jeton indisponible, exception).
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FERME = 'ferme'
+OUVERT = 'ouvert'
+DEMI_OUVERT = 'demi_ouvert'
+
+# Endpoints surveillés par opérateur
+ENDPOINTS = {
+    'mtn': ['token', 'request_to_pay', 'payment_status'],
+    'airtel': ['token', 'debit_request', 'payment_status'],
+}
+
+# Endpoints nécessaires pour initier un paiement
+ENDPOINTS_INITIATION = {
+    'mtn': ['token', 'request_to_pay'],
+    'airtel': ['token', 'debit_request'],
+}
+
+NOMS_OPERATEURS = {
+    'mtn': 'MTN Mobile Money',
+    'airtel': 'Airtel Money',
+}
+
+
+def _cache(operation, *args, defaut=None):
+    """Opération sur le cache ; `defaut` si le cache (Redis) ne répond pas"""
+    try:
+        return getattr(cache, operation)(*args)
+    except Exception as e:
+        logger.warning(f"Disjoncteur: cache indisponible ({operation}), disjoncteur considéré fermé: {e}")
+        return defaut
+
+
+def resultat_indisponible(operateur):
+    """Résultat de service renvoyé quand le disjoncteur refuse l'appel"""
+    return {
+        'success': False,
+        'error': f"{NOMS_OPERATEURS.get(operateur, operateur)} temporairement indisponible",
+        'operateur_indisponible': True
+    }
+
+
+class DisjoncteurOperateur:
+    """Disjoncteur d'un endpoint opérateur (état stocké dans le cache)"""
+
+    def __init__(self, operateur, endpoint):
+        self.operateur = operateur
+        self.endpoint = endpoint
+        self.config = settings.OPERATOR_CIRCUIT_BREAKER
+        # Sonde demi-ouverte prise par autoriser() et pas encore rendue
+        self.sonde = False
+
+    def _cle(self, suffixe):
+        return f"cb:{self.operateur}:{self.endpoint}:{suffixe}"
+
+    def _cle_fenetre(self, compteur):
+        fenetre = int(time.time() // self.config['WINDOW_SECONDS'])
+        return self._cle(f"{compteur}:{fenetre}")
+
+    def _incrementer(self, cle, ttl):
+        try:
+            cache.add(cle, 0, ttl)
+            return cache.incr(cle)
+        except ValueError:
+            # Clé expirée entre add() et incr()
+            _cache('set', cle, 1, ttl)
+            return 1
+        except Exception as e:
+            logger.warning(f"Disjoncteur: cache indisponible (incr), disjoncteur considéré fermé: {e}")
+            return 0
+
+    def etat(self):
+        """Etat courant du circuit"""
+        donnees = _cache('get', self._cle('etat'))
+        if not donnees:
+            return FERME
+        if time.time() - donnees['ouvert_a'] >= self.config['OPEN_SECONDS']:
+            return DEMI_OUVERT
+        return OUVERT
+
+    def autoriser(self):
+        """Indique si un appel peut partir maintenant"""
+        etat = self.etat()
+        if etat == FERME:
+            return True
+        if etat == OUVERT:
+            return False
+        # Demi-ouvert : une seule sonde en vol pour toute la flotte
+        self.sonde = _cache('add', self._cle('sonde'), 1, self.config['PROBE_TIMEOUT_SECONDS'], defaut=True)
+        return self.sonde
+
+    def liberer(self):
+        """Rend la sonde prise par autoriser() si aucun résultat n'a été enregistré"""
+        if self.sonde:
+            self.sonde = False
+            _cache('delete', self._cle('sonde'))
+
+    def enregistrer_reponse(self, statut_http, duree_ms):
+        """Classe une réponse HTTP : 5xx, 429 et appels trop lents sont des échecs"""
+        if statut_http >= 500 or statut_http == 429:
+            self.enregistrer_echec(f"HTTP {statut_http}")
+        elif duree_ms is not None and duree_ms > self.config['SLOW_CALL_MS']:
+            self.enregistrer_echec(f"lenteur {duree_ms} ms")
+        else:
+            self.enregistrer_succes()
+
+    def enregistrer_succes(self):
+        self.sonde = False
+        etat = self.etat()
+        if etat == FERME:
+            self._incrementer(self._cle_fenetre('appels'), self.config['WINDOW_SECONDS'] * 2)
+            return
+        if etat == OUVERT:
+            # Appel parti avant l'ouverture : ne compte pas comme sonde
+            return
+
+        sondes_ok = self._incrementer(self._cle('sondes_ok'), self.config['PROBE_TIMEOUT_SECONDS'])
+        if sondes_ok >= self.config['HALF_OPEN_SUCCESSES']:
+            self.fermer()
+        else:
+            _cache('delete', self._cle('sonde'))
+
+    def enregistrer_echec(self, motif=''):
+        self.sonde = False
+        etat = self.etat()
+        if etat == OUVERT:
+            return
+        if etat == DEMI_OUVERT:
+            # Sonde échouée : on repart pour une période d'ouverture complète
+            self.ouvrir(f"sonde échouée ({motif})")
+            return
+
+        ttl = self.config['WINDOW_SECONDS'] * 2
+        appels = self._incrementer(self._cle_fenetre('appels'), ttl)
+        echecs = self._incrementer(self._cle_fenetre('echecs'), ttl)
+
+        if echecs >= self.config['MIN_CALLS'] and echecs / max(appels, 1) >= self.config['FAILURE_RATIO']:
+            self.ouvrir(f"{echecs}/{appels} échecs ({motif})")
+
+    def ouvrir(self, motif=''):
+        _cache(
+            'set',
+            self._cle('etat'),
+            {'ouvert_a': time.time(), 'motif': motif},
+            self.config['OPEN_SECONDS'] + self.config['PROBE_TIMEOUT_SECONDS'] * 10
+        )
+        _cache('delete_many', [self._cle('sonde'), self._cle('sondes_ok')])
+        logger.warning(f"Disjoncteur {self.operateur}/{self.endpoint} ouvert: {motif}")
+
+    def fermer(self):
+        _cache('delete_many', [
+            self._cle('etat'),
+            self._cle('sonde'),
+            self._cle('sondes_ok'),
+            self._cle_fenetre('appels'),
+            self._cle_fenetre('echecs'),
+        ])
+        logger.info(f"Disjoncteur {self.operateur}/{self.endpoint} refermé")
+
+    def instantane(self):
+        """Etat détaillé pour l'observabilité"""
+        donnees = _cache('get', self._cle('etat')) or {}
+        return {
+            'operateur': self.operateur,
+            'endpoint': self.endpoint,
+            'etat': self.etat(),
+            'motif': donnees.get('motif'),
+            'ouvert_depuis_s': int(time.time() - donnees['ouvert_a']) if donnees else None,
+            'appels_fenetre': _cache('get', self._cle_fenetre('appels'), 0),
+            'echecs_fenetre': _cache('get', self._cle_fenetre('echecs'), 0),
+        }
+
+
+def operateur_disponible(operateur):
+    """Vrai si aucun endpoint d'initiation de l'opérateur n'est ouvert"""
+    return all(
+        DisjoncteurOperateur(operateur, endpoint).etat() != OUVERT
+        for endpoint in ENDPOINTS_INITIATION[operateur]
+    )
+
+
+def etat_disjoncteurs():
+    """Instantané de tous les disjoncteurs"""
+    return [
+        DisjoncteurOperateur(operateur, endpoint).instantane()
+        for operateur, endpoints in ENDPOINTS.items()
+        for endpoint in endpoints
+    ]
@@ -0,0 +1,208 @@
+# apps/pass_payments/coherence.py
+
+"""
+Contrôle de cohérence paiements / transactions opérateurs / souscriptions
+
+Le callback MTN, update_from_callback (Airtel) et le balayage mettent à jour
+les statuts chacun de leur côté : PaiementPass.statut, TransactionMTN.statut,
+TransactionAirtel.statut et SouscriptionPass.statut peuvent diverger.
+
+Chaque contrôle est une requête ensembliste (EXISTS sur les tables
+opérateurs), comptée en une requête puis corrigée par lots d'identifiants ;
+le filtre du contrôle est réappliqué à chaque lot, une ligne corrigée
+entre-temps par le flux normal est ignorée. Les lignes modifiées depuis
+moins de GRACE_MINUTES (mise à jour en cours) ne sont pas examinées.
+
+Les bornes abonnées sont notifiées des paiements et transactions corrigés.
+Les activations de souscriptions sont planifiées (tâche dédiée) : comptées
+en 'planifies', pas en 'corriges'. Les contrôles sans correction sûre sont
+seulement comptés (revue manuelle).
+Résultats du dernier contrôle : etat_coherence().
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.airtel_integration.models import TransactionAirtel
+from apps.mtn_integration.models import TransactionMTN
+from apps.pass_clients.models import SouscriptionPass
+from apps.pass_clients.services import SouscriptionPassService
+
+from .models import PaiementPass
+from .services import StatutPaiementService
+
+logger = logging.getLogger(__name__)
+
+CLE_ETAT = 'coherence:dernier_controle'
+
+EN_ATTENTE = ('initiated', 'pending')
+ECHECS = ('failed', 'cancelled')
+# Paiements qu'une transaction opérateur réussie fait passer en succès
+NON_CONFIRMES = ('en_cours', 'echec', 'expire', 'en_verification')
+# Contrôles dont la correction est une activation planifiée, pas encore appliquée
+PLANIFIES = ('souscription_payee_non_activee', 'souscription_activee_sans_police')
+
+
+def _transaction_operateur(statuts, paiement=None):
+    """EXISTS : le paiement a une transaction MTN ou Airtel dans `statuts`"""
+    paiement = paiement or OuterRef('pk')
+    return (
+        Exists(TransactionMTN.objects.filter(paiement_pass=paiement, statut__in=statuts))
+        | Exists(TransactionAirtel.objects.filter(paiement_pass=paiement, statut__in=statuts))
+    )
+
+
+def _paiements(limite):
+    return PaiementPass.objects.filter(date_modification__lt=limite)
+
+
+def controles(limite):
+    """
+    Contrôles dans l'ordre d'exécution : nom -> (queryset, correction)
+    correction(queryset, ids) retourne le nombre corrigé (ou planifié), None : comptage seul
+    """
+    maintenant = timezone.now()
+    motif_echec = 'Transaction opérateur en échec (contrôle de cohérence)'
+
+    def notifier(queryset, ids, champ, **valeurs):
+        # Numéros lus avant la mise à jour, qui fait sortir les lignes du contrôle
+        lot = queryset.filter(id__in=ids)
+        numeros = list(lot.values_list(champ, flat=True))
+        corriges = lot.update(**valeurs)
+        StatutPaiementService.notifier(*numeros)
+        return corriges
+
+    def confirmer_paiements(queryset, ids):
+        return notifier(
+            queryset, ids, 'numero_transaction',
+            statut='succes',
+            date_confirmation=Coalesce(F('date_confirmation'), Value(maintenant)),
+            date_modification=maintenant
+        )
+
+    def echec_paiements(queryset, ids):
+        return notifier(
+            queryset, ids, 'numero_transaction',
+            statut='echec', motif_echec=motif_echec, date_modification=maintenant
+        )
+
+    def confirmer_transactions(queryset, ids):
+        # external_id : numéro de transaction du paiement
+        return notifier(queryset, ids, 'external_id', statut='successful', date_modification=maintenant)
+
+    def dater_confirmation(queryset, ids):
+        return queryset.filter(id__in=ids).update(date_confirmation=F('date_modification'))
+
+    def activer(queryset, ids):
+        # Activation idempotente : police attribuée, statut et compteurs clients
+        SouscriptionPassService.planifier_activations(ids)
+        return len(ids)
+
+    def transactions_non_confirmees(modele):
+        # Paiement réussi (callback appliqué au paiement seul), transaction restée en attente
+        return modele.objects.filter(
+            statut__in=EN_ATTENTE,
+            date_modification__lt=limite,
+            paiement_pass__statut='succes'
+        ).exclude(_transaction_operateur(['successful'], paiement=OuterRef('paiement_pass')))
+
+    return {
+        'paiement_non_confirme': (
+            _paiements(limite).filter(statut__in=NON_CONFIRMES).filter(_transaction_operateur(['successful'])),
+            confirmer_paiements
+        ),
+        'paiement_echec_non_reporte': (
+            _paiements(limite).filter(statut='en_cours').filter(_transaction_operateur(ECHECS)).exclude(
+                _transaction_operateur(['successful', *EN_ATTENTE])
+            ),
+            echec_paiements
+        ),
+        'transaction_mtn_non_confirmee': (transactions_non_confirmees(TransactionMTN), confirmer_transactions),
+        'transaction_airtel_non_confirmee': (transactions_non_confirmees(TransactionAirtel), confirmer_transactions),
+        'paiement_sans_date_confirmation': (
+            _paiements(limite).filter(statut='succes', date_confirmation__isnull=True),
+            dater_confirmation
+        ),
+        # Après les corrections de paiements : souscriptions payées à l'instant comprises
+        'souscription_payee_non_activee': (
+            SouscriptionPassService.payees_non_activees().filter(date_modification__lt=limite).distinct(),
+            activer
+        ),
+        'souscription_activee_sans_police': (
+            SouscriptionPassService.activees_sans_police().filter(date_modification__lt=limite),
+            activer
+        ),
+        # Revue manuelle
+        'souscription_activee_sans_paiement': (
+            SouscriptionPass.objects.filter(statut='activee', date_modification__lt=limite).exclude(
+                Exists(PaiementPass.objects.filter(souscription_pass=OuterRef('pk'), statut='succes'))
+            ),
+            None
+        ),
+        'paiement_succes_transaction_echec': (
+            _paiements(limite).filter(statut='succes').filter(_transaction_operateur(ECHECS)).exclude(
+                _transaction_operateur(['successful'])
+            ),
+            None
+        ),
+    }
+
+
+def _corriger_par_lots(queryset, correction, taille_lot):
+    """Lots parcourus par identifiant croissant (une activation planifiée reste sélectionnée)"""
+    total, dernier = 0, 0
+    while True:
+        ids = list(queryset.filter(id__gt=dernier).order_by('id').values_list('id', flat=True)[:taille_lot])
+        if not ids:
+            return total
+        total += correction(queryset, ids)
+        dernier = ids[-1]
+
+
+def controler(corriger=True):
+    """
+    Exécute tous les contrôles ; retourne {contrôle: {'detectes', 'corriges'}}
+    ('planifies' au lieu de 'corriges' pour les activations) et enregistre le
+    résultat pour etat_coherence()
+    """
+    config = settings.CONSISTENCY_CHECK
+    debut = timezone.now()
+    limite = debut - timedelta(minutes=config['GRACE_MINUTES'])
+
+    resultats = {}
+    for nom, (queryset, correction) in controles(limite).items():
+        detectes = queryset.count()
+        corriges = 0
+        if detectes and corriger and correction is not None:
+            corriges = _corriger_par_lots(queryset, correction, config['BATCH_SIZE'])
+        if nom in PLANIFIES:
+            resultats[nom] = {'detectes': detectes, 'planifies': corriges}
+        else:
+            resultats[nom] = {'detectes': detectes, 'corriges': corriges}
+        if detectes:
+            logger.warning(
+                f"🩺 Cohérence {nom}: {detectes} détectés, {corriges} {'planifiés' if nom in PLANIFIES else 'corrigés'}"
+            )
+
+    etat = {
+        'date': debut.isoformat(),
+        'duree_s': round((timezone.now() - debut).total_seconds(), 2),
+        'correction': corriger,
+        'controles': resultats,
+        'anomalies': sum(resultat['detectes'] for resultat in resultats.values()),
+        'corrections': sum(resultat.get('corriges', 0) for resultat in resultats.values()),
+        'planifications': sum(resultat.get('planifies', 0) for resultat in resultats.values()),
+    }
+    cache.set(CLE_ETAT, etat, None)
+    return etat
+
+
+def etat_coherence():
+    """Résultat du dernier contrôle (None si aucun)"""
+    return cache.get(CLE_ETAT)
@@ -0,0 +1,159 @@
+# apps/pass_payments/exports.py
+
+"""
+Exports en masse pour la BI : CSV ou NDJSON compressés gzip, en flux
+
+Les lignes sont lues par un curseur serveur (iterator(chunk_size)) dans
+l'ordre date_modification, id, sérialisées par blocs et compressées au fil
+de l'eau : la mémoire reste bornée quel que soit le nombre de lignes, ni
+pagination ni OFFSET. Colonnes fixes par export, sans payloads opérateurs.
+
+Export incrémental : lignes modifiées dans ]depuis, jusqu_a]. jusqu_a est
+fixé au début de l'export avec une marge (WATERMARK_MARGIN_SECONDS) pour
+les transactions encore ouvertes ; c'est le `depuis` de l'export suivant.
+
+Lecture sur l'alias EXPORTS['DATABASE'] (réplica si configuré).
+
+Sous ASGI, StreamingHttpResponse lit un itérateur synchrone en entier
+(sync_to_async(list)) avant d'envoyer le premier octet : la vue sert
+flux_async(), qui produit les morceaux un par un dans un thread dédié.
+"""
+
+import csv
+import io
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.airtel_integration.models import TransactionAirtel
+from apps.mtn_integration.models import TransactionMTN
+from apps.pass_clients.models import SouscriptionPass
+
+from .models import PaiementPass
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORTS = {
+    'paiements': (PaiementPass, [
+        'id', 'numero_transaction', 'souscription_pass_id', 'client_id', 'type_paiement',
+        'montant', 'frais_transaction', 'montant_net', 'devise', 'operateur', 'statut',
+        'reference_mobile_money', 'date_paiement', 'date_confirmation', 'date_comptabilisation',
+        'date_creation', 'date_modification',
+    ]),
+    'souscriptions': (SouscriptionPass, [
+        'id', 'numero_souscription', 'client_id', 'produit_pass_id', 'agent_id',
+        'montant_souscription', 'periodicite', 'statut', 'paiement_initial_recu',
+        'operateur_paiement', 'date_souscription', 'date_activation', 'date_expiration',
+        'date_modification',
+    ]),
+    'transactions_mtn': (TransactionMTN, [
+        'id', 'external_id', 'financial_transaction_id', 'paiement_pass_id', 'type_transaction',
+        'montant', 'devise', 'statut', 'status_reason', 'nombre_tentatives',
+        'date_creation', 'date_modification', 'date_expiration',
+    ]),
+    'transactions_airtel': (TransactionAirtel, [
+        'id', 'external_id', 'airtel_transaction_id', 'paiement_pass_id', 'type_transaction',
+        'montant', 'devise', 'statut', 'status_reason',
+        'date_creation', 'date_modification', 'date_callback',
+    ]),
+}
+
+
+def borne_export():
+    """Borne haute d'un export commencé maintenant (prochain watermark)"""
+    return timezone.now() - timedelta(seconds=settings.EXPORTS['WATERMARK_MARGIN_SECONDS'])
+
+
+def _lignes(nom, depuis, jusqu_a):
+    modele, champs = EXPORTS[nom]
+    queryset = modele.objects.using(settings.EXPORTS['DATABASE']).filter(date_modification__lte=jusqu_a)
+    if depuis is not None:
+        queryset = queryset.filter(date_modification__gt=depuis)
+    return queryset.order_by('date_modification', 'id').values_list(*champs).iterator(
+        chunk_size=settings.EXPORTS['CHUNK_SIZE']
+    )
+
+
+def _texte_csv(champs, lignes):
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+    writer.writerow(champs)
+    yield tampon.getvalue()
+    for ligne in lignes:
+        tampon.seek(0)
+        tampon.truncate()
+        writer.writerow([
+            valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur for valeur in ligne
+        ])
+        yield tampon.getvalue()
+
+
+def _texte_ndjson(champs, lignes):
+    encodeur = DjangoJSONEncoder(ensure_ascii=False)
+    for ligne in lignes:
+        yield encodeur.encode(dict(zip(champs, ligne))) + '\n'
+
+
+def flux(nom, format='csv', depuis=None, jusqu_a=None):
+    """
+    Fichier gzip de l'export `nom`, en morceaux de bytes
+    jusqu_a par défaut : borne_export()
+    """
+    config = settings.EXPORTS
+    jusqu_a = jusqu_a or borne_export()
+    champs = EXPORTS[nom][1]
+    textes = (_texte_csv if format == 'csv' else _texte_ndjson)(champs, _lignes(nom, depuis, jusqu_a))
+
+    # wbits 31 : en-tête et pied gzip
+    compresseur = zlib.compressobj(config['COMPRESSION_LEVEL'], zlib.DEFLATED, 31)
+    bloc, taille, nombre = [], 0, -1 if format == 'csv' else 0
+    for texte in textes:
+        bloc.append(texte)
+        taille += len(texte)
+        nombre += 1
+        if taille >= config['BLOCK_BYTES']:
+            morceau = compresseur.compress(''.join(bloc).encode('utf-8'))
+            bloc, taille = [], 0
+            if morceau:
+                yield morceau
+    yield compresseur.compress(''.join(bloc).encode('utf-8')) + compresseur.flush()
+
+    logger.info(f"📤 Export {nom} ({format}) {depuis or 'complet'} -> {jusqu_a.isoformat()}: {nombre} lignes")
+
+
+def _fermer(morceaux):
+    morceaux.close()
+    # Connexion propre au thread de l'export
+    connections.close_all()
+
+
+async def flux_async(nom, format='csv', depuis=None, jusqu_a=None):
+    """
+    flux() en itérateur asynchrone, pour ASGI
+    Un seul thread pour tout l'export : le curseur serveur reste sur sa connexion
+    """
+    morceaux = flux(nom, format, depuis, jusqu_a)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'export-{nom}') as thread:
+        suivant = sync_to_async(next, thread_sensitive=False, executor=thread)
+        try:
+            while (morceau := await suivant(morceaux, None)) is not None:
+                yield morceau
+        finally:
+            # Fin de l'export ou client déconnecté : curseur et connexion libérés
+            await sync_to_async(_fermer, thread_sensitive=False, executor=thread)(morceaux)
+
+
+def nom_fichier(nom, format, jusqu_a):
+    return f"{nom}-{timezone.localtime(jusqu_a):%Y%m%d-%H%M%S}.{format}.gz"
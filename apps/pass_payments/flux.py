@@ -0,0 +1,87 @@
+# apps/pass_payments/flux.py
+
+"""
+Flux SSE du statut d'un paiement pour les bornes
+
+La borne s'abonne juste après l'initiation et reçoit la transition de statut
+dès que le callback ou le monitoring la résout (publication Redis pub/sub,
+voir StatutPaiementService.notifier). Servi sous ASGI (nsia_pass_api/asgi.py) :
+un abonnement en attente n'occupe pas de worker.
+
+Evénements :
+    event: statut   état au format de /statut/ (source 'base', 'cache' ou 'flux')
+    event: expire   durée maximale atteinte, la borne reprend le polling
+    : ping          commentaire keep-alive
+"""
+
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from redis import RedisError
+
+from nsia_pass_api.redis_client import get_redis_async
+
+from .services import StatutPaiementService
+
+logger = logging.getLogger(__name__)
+
+statut_async = sync_to_async(StatutPaiementService.statut)
+
+
+def evenement(nom, donnees):
+    return f"event: {nom}\ndata: {json.dumps(donnees, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def evenements_statut(numero_transaction):
+    """Générateur SSE : état courant, puis transitions jusqu'au statut final"""
+    config = settings.PAYMENT_STATUS_STREAM
+    # Le client demande à être reconnecté après 3 s en cas de coupure
+    yield "retry: 3000\n\n"
+
+    pubsub = None
+    try:
+        pubsub = get_redis_async().pubsub(ignore_subscribe_messages=True)
+        # Abonnement avant la lecture : aucune transition ne peut être manquée
+        await pubsub.subscribe(StatutPaiementService.canal(numero_transaction))
+    except RedisError as e:
+        logger.warning(f"Flux statut {numero_transaction} sans pub/sub: {e}")
+        pubsub = None
+
+    try:
+        etat = await statut_async(numero_transaction)
+        if etat is None:
+            return
+        yield evenement('statut', etat)
+        if etat['status'] != 'PENDING' or pubsub is None:
+            return
+
+        fin = time.monotonic() + config['MAX_SECONDS']
+        while time.monotonic() < fin:
+            message = await pubsub.get_message(timeout=config['KEEPALIVE_SECONDS'])
+            if message is not None:
+                etat = {**json.loads(message['data']), 'source': 'flux'}
+            else:
+                # Filet de sécurité : publication perdue ou expiration par le balayeur.
+                # Relance aussi la vérification opérateur coalescée.
+                etat = await statut_async(numero_transaction)
+                if etat is None:
+                    return
+                if etat['status'] == 'PENDING':
+                    yield ": ping\n\n"
+                    continue
+
+            yield evenement('statut', etat)
+            if etat['status'] != 'PENDING':
+                return
+
+        yield evenement('expire', {'numero_transaction': numero_transaction})
+    finally:
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except RedisError:
+                pass
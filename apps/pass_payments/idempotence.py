@@ -0,0 +1,187 @@
+# apps/pass_payments/idempotence.py
+
+"""
+En-tête Idempotency-Key sur les endpoints d'initiation de paiement
+
+La première requête réserve la clé (ligne requetes_idempotentes, contrainte
+unique) puis enregistre sa réponse ; les reprises réseau de la borne
+rejouent cette réponse (cache, puis base) sans recréer de paiement ni
+renvoyer de demande au téléphone du client. Une reprise concurrente attend
+la fin de la première requête au lieu de s'exécuter en parallèle.
+
+Les clés sont propres à chaque utilisateur authentifié (portée
+'<endpoint>:<user.pk>') : une même clé envoyée par deux bornes ne rejoue
+jamais la réponse de l'autre.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import RequeteIdempotente
+
+logger = logging.getLogger(__name__)
+
+EN_TETE = 'Idempotency-Key'
+
+
+def _cle_cache(portee, cle):
+    return f"idempotence:{portee}:{cle}"
+
+
+def empreinte_requete(donnees):
+    brut = json.dumps(donnees, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(brut.encode('utf-8')).hexdigest()
+
+
+def lire(portee, cle):
+    """Réponse enregistrée pour la clé (cache puis base), None sinon"""
+    enregistree = cache.get(_cle_cache(portee, cle))
+    if enregistree is not None:
+        return enregistree
+
+    enregistree = RequeteIdempotente.objects.filter(
+        portee=portee, cle=cle, statut_http__isnull=False, date_expiration__gt=timezone.now()
+    ).values('empreinte', 'statut_http', 'reponse').first()
+    if enregistree is not None:
+        cache.set(_cle_cache(portee, cle), enregistree, settings.IDEMPOTENCY['CACHE_SECONDS'])
+    return enregistree
+
+
+def reserver(portee, cle, empreinte):
+    """Vrai si cette requête devient propriétaire de la clé"""
+    config = settings.IDEMPOTENCY
+    maintenant = timezone.now()
+    valeurs = {
+        'empreinte': empreinte,
+        'statut_http': None,
+        'reponse': None,
+        'verrou_expire': maintenant + timedelta(seconds=config['LOCK_SECONDS']),
+        'date_expiration': maintenant + timedelta(hours=config['TTL_HOURS']),
+    }
+    try:
+        with transaction.atomic():
+            RequeteIdempotente.objects.create(portee=portee, cle=cle, **valeurs)
+        return True
+    except IntegrityError:
+        # Reprise d'une clé expirée ou abandonnée (worker arrêté en cours de traitement)
+        return bool(RequeteIdempotente.objects.filter(
+            Q(date_expiration__lte=maintenant) | Q(statut_http__isnull=True, verrou_expire__lte=maintenant),
+            portee=portee, cle=cle
+        ).update(**valeurs))
+
+
+def enregistrer(portee, cle, empreinte, response):
+    RequeteIdempotente.objects.filter(portee=portee, cle=cle).update(
+        statut_http=response.status_code, reponse=response.data
+    )
+    cache.set(_cle_cache(portee, cle), {
+        'empreinte': empreinte,
+        'statut_http': response.status_code,
+        'reponse': response.data,
+    }, settings.IDEMPOTENCY['CACHE_SECONDS'])
+
+
+def liberer(portee, cle):
+    """Erreur serveur : la clé redevient utilisable pour une nouvelle tentative"""
+    RequeteIdempotente.objects.filter(portee=portee, cle=cle, statut_http__isnull=True).delete()
+
+
+def attendre(portee, cle):
+    """Attend la réponse de la requête concurrente propriétaire de la clé"""
+    fin = time.monotonic() + settings.IDEMPOTENCY['WAIT_SECONDS']
+    while time.monotonic() < fin:
+        time.sleep(0.2)
+        enregistree = lire(portee, cle)
+        if enregistree is not None:
+            return enregistree
+    return None
+
+
+def rejouer(enregistree, empreinte):
+    if enregistree['empreinte'] != empreinte:
+        return Response({
+            'success': False,
+            'error': f'{EN_TETE} déjà utilisée pour une requête différente'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(
+        enregistree['reponse'],
+        status=enregistree['statut_http'],
+        headers={'Idempotent-Replayed': 'true'}
+    )
+
+
+def idempotent(portee):
+    """
+    Décorateur de vue DRF (sous @permission_classes) : sans en-tête
+    Idempotency-Key, la vue s'exécute normalement
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def wrapper(request, *args, **kwargs):
+            return _executer(vue, portee_utilisateur(portee, request), request, *args, **kwargs)
+        return wrapper
+    return decorateur
+
+
+def portee_utilisateur(portee, request):
+    """Portée de la clé : endpoint, et utilisateur s'il est authentifié"""
+    if request.user.is_authenticated:
+        return f"{portee}:{request.user.pk}"
+    return portee
+
+
+def _executer(vue, portee, request, *args, **kwargs):
+    cle = request.headers.get(EN_TETE)
+    if not cle:
+        return vue(request, *args, **kwargs)
+    if len(cle) > 100:
+        return Response({
+            'success': False,
+            'error': f'{EN_TETE} trop longue (100 caractères max)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    empreinte = empreinte_requete(request.data)
+    enregistree = lire(portee, cle)
+    if enregistree is not None:
+        return rejouer(enregistree, empreinte)
+
+    if not reserver(portee, cle, empreinte):
+        logger.info(f"{EN_TETE} {portee}:{cle} en cours de traitement, attente")
+        enregistree = attendre(portee, cle)
+        if enregistree is not None:
+            return rejouer(enregistree, empreinte)
+        return Response({
+            'success': False,
+            'error': 'Requête identique en cours de traitement'
+        }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '5'})
+
+    try:
+        response = vue(request, *args, **kwargs)
+    except Exception:
+        liberer(portee, cle)
+        raise
+
+    if response.status_code >= 500:
+        liberer(portee, cle)
+    else:
+        enregistrer(portee, cle, empreinte, response)
+    return response
+
+
+def purger_expirees():
+    """Supprime les clés expirées (tâche nocturne)"""
+    supprimees, _ = RequeteIdempotente.objects.filter(date_expiration__lte=timezone.now()).delete()
+    return supprimees
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from apps.pass_payments import archivage
+
+
+class Command(BaseCommand):
+    help = 'Archive les transactions opérateurs terminées et purge les partitions expirées'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operateur',
+            choices=list(archivage.ARCHIVES),
+            help='Limiter à un opérateur (défaut: tous)'
+        )
+        parser.add_argument(
+            '--jours',
+            type=int,
+            help='Fenêtre chaude en jours (défaut: settings HOT_DAYS)'
+        )
+        parser.add_argument(
+            '--lot',
+            type=int,
+            help='Taille des lots déplacés (défaut: settings CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--retention',
+            type=int,
+            help='Rétention des archives en mois (défaut: settings RETENTION_MONTHS)'
+        )
+        parser.add_argument(
+            '--sans-purge',
+            action='store_true',
+            help='Ne pas supprimer les partitions expirées'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Afficher ce qui serait archivé/purgé sans rien modifier'
+        )
+
+    def handle(self, *args, **options):
+        operateurs = [options['operateur']] if options['operateur'] else list(archivage.ARCHIVES)
+
+        for operateur in operateurs:
+            rapport = archivage.archiver(
+                operateur,
+                jours=options['jours'],
+                taille_lot=options['lot'],
+                simulation=options['simulation']
+            )
+            if options['simulation']:
+                self.stdout.write(
+                    f"{operateur}: {rapport['a_archiver']} transactions avant {rapport['limite']}"
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {operateur}: {rapport['archivees']} transactions archivées "
+                    f"({rapport['dependantes']} lignes dépendantes)"
+                ))
+
+        if options['sans_purge']:
+            return
+
+        supprimees = archivage.purger(options['retention'], simulation=options['simulation'])
+        prefixe = 'Partitions à supprimer' if options['simulation'] else 'Partitions supprimées'
+        self.stdout.write(f"{prefixe}: {', '.join(supprimees) or 'aucune'}")
+
+        if not options['simulation']:
+            orphelins = archivage.purger_payloads_orphelins()
+            self.stdout.write(f"Payloads orphelins supprimés: {orphelins}")
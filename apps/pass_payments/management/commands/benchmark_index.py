@@ -0,0 +1,242 @@
+import random
+import re
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from apps.airtel_integration.models import TransactionAirtel
+from apps.borne_auth.models import NumeroPolice
+from apps.mtn_integration.models import TransactionMTN
+from apps.pass_clients.models import ClientPass, SouscriptionPass
+from apps.pass_payments.models import PaiementPass
+from apps.pass_products.models import ProduitPass
+
+# Index ajoutés pour les requêtes chaudes (comparés avant/après)
+INDEX_OPTIMISES = [
+    'tx_mtn_en_attente_idx',
+    'tx_mtn_fin_tx_id_idx',
+    'tx_airtel_en_attente_idx',
+    'paiement_client_statut_idx',
+    'paiement_sousc_statut_idx',
+    'paiement_client_date_idx',
+    'paiement_en_cours_idx',
+    'police_numero_prefixe_idx',
+    'souscription_client_statut_idx',
+]
+
+TABLES = [
+    'clients_pass', 'souscriptions_pass', 'numeros_police_congo',
+    'paiements_pass', 'transactions_mtn', 'airtel_transactions',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN ANALYZE avant/après des requêtes chaudes sur données générées. '
+        'Les données et la suppression temporaire des index sont annulées en fin de '
+        'commande. A exécuter sur une base de test (verrous exclusifs pendant la mesure).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20000,
+                            help='Nombre de clients à générer (0 = données existantes)')
+        parser.add_argument('--paiements-par-client', type=int, default=5)
+        parser.add_argument('--repetitions', type=int, default=3,
+                            help='Mesures par requête (meilleur temps retenu)')
+        parser.add_argument('--plans', action='store_true',
+                            help='Afficher les plans complets')
+        parser.add_argument('--force', action='store_true',
+                            help='Autoriser l\'exécution avec DEBUG=False')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Benchmark réservé à PostgreSQL')
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG=False : relancer avec --force sur une base de test')
+
+        with transaction.atomic():
+            if options['clients']:
+                self.stdout.write(f"🏗️  Génération de {options['clients']} clients...")
+                self.generer_donnees(options['clients'], options['paiements_par_client'])
+
+            with connection.cursor() as cursor:
+                for table in TABLES:
+                    cursor.execute(f'ANALYZE {table}')
+
+            requetes = self.requetes()
+            if not requetes:
+                raise CommandError('Aucune donnée à mesurer')
+
+            apres = self.mesurer(requetes, options['repetitions'])
+
+            # Mesure "avant" : index supprimés dans un savepoint annulé ensuite
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for nom in INDEX_OPTIMISES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{nom}"')
+                avant = self.mesurer(requetes, options['repetitions'])
+                transaction.set_rollback(True)
+
+            self.afficher(requetes, avant, apres, options['plans'])
+
+            # Ne rien laisser derrière (données générées)
+            transaction.set_rollback(True)
+
+    def generer_donnees(self, nb_clients, paiements_par_client):
+        """Génère un portefeuille réaliste (2 % de transactions en attente)"""
+        lot = uuid.uuid4().hex[:6].upper()
+        maintenant = timezone.now()
+        annee = maintenant.year
+
+        produit, _ = ProduitPass.objects.get_or_create(
+            code_pass=f'BENCH{lot}',
+            defaults={'nom_pass': 'Bench', 'description': 'Benchmark', 'categorie': 'mixte'}
+        )
+
+        clients = ClientPass.objects.bulk_create([
+            ClientPass(nom='Bench', prenom=str(i), telephone=f'+2429{lot}{i:07d}',
+                       adresse='Brazzaville')
+            for i in range(nb_clients)
+        ], batch_size=5000)
+
+        souscriptions = SouscriptionPass.objects.bulk_create([
+            SouscriptionPass(
+                client=client, produit_pass=produit,
+                numero_souscription=f'BENCH-{lot}-{i:07d}',
+                montant_souscription=Decimal('5000'),
+                statut=random.choice(['activee'] * 8 + ['en_cours', 'expiree']),
+            )
+            for i, client in enumerate(clients)
+        ], batch_size=5000)
+
+        NumeroPolice.objects.bulk_create([
+            NumeroPolice(souscription_pass=s, numero_police=f'CG-{annee}-{lot[:3]}-{i:07d}')
+            for i, s in enumerate(souscriptions)
+        ], batch_size=5000)
+
+        paiements = []
+        for i, s in enumerate(souscriptions):
+            for j in range(paiements_par_client):
+                paiements.append(PaiementPass(
+                    souscription_pass=s, client_id=s.client_id,
+                    numero_transaction=f'BENCH-{lot}-{i:07d}-{j:02d}',
+                    montant=Decimal('5000'), montant_net=Decimal('5000'),
+                    operateur=random.choice(['mtn_money', 'airtel_money']),
+                    numero_payeur='+242061234567',
+                    statut=random.choice(['succes'] * 17 + ['echec', 'expire', 'en_cours']),
+                ))
+        paiements = PaiementPass.objects.bulk_create(paiements, batch_size=5000)
+
+        statuts = ['successful'] * 90 + ['failed'] * 6 + ['timeout'] * 2 + ['pending'] * 2
+        TransactionMTN.objects.bulk_create([
+            TransactionMTN(
+                external_id=p.numero_transaction, paiement_pass=p,
+                financial_transaction_id=str(uuid.uuid4()),
+                type_transaction='request_to_pay', montant=p.montant,
+                payer_msisdn='242061234567', statut=random.choice(statuts),
+            )
+            for p in paiements if p.operateur == 'mtn_money'
+        ], batch_size=5000)
+        TransactionAirtel.objects.bulk_create([
+            TransactionAirtel(
+                external_id=p.numero_transaction, paiement_pass=p,
+                airtel_transaction_id=f'AIR{uuid.uuid4().hex[:12]}',
+                type_transaction='debit_request', montant=p.montant,
+                payer_msisdn='055123456', statut=random.choice(statuts),
+            )
+            for p in paiements if p.operateur == 'airtel_money'
+        ], batch_size=5000)
+
+        # Étaler l'historique sur un an (auto_now_add impose la date du jour)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE paiements_pass SET date_paiement = now() - random() * interval '365 days' "
+                "WHERE numero_transaction LIKE %s", [f'BENCH-{lot}-%']
+            )
+            for table in ('transactions_mtn', 'airtel_transactions'):
+                cursor.execute(
+                    f"UPDATE {table} SET date_creation = now() - random() * interval '365 days' "
+                    f"WHERE external_id LIKE %s AND statut NOT IN ('initiated', 'pending')",
+                    [f'BENCH-{lot}-%']
+                )
+
+        self.stdout.write(
+            f"   {len(clients)} clients, {len(paiements)} paiements générés (lot {lot})"
+        )
+
+    def requetes(self):
+        """Requêtes reproduisant les vues et tâches chaudes"""
+        echantillon = PaiementPass.objects.order_by('?').values(
+            'client_id', 'souscription_pass_id'
+        ).first()
+        transaction_mtn = TransactionMTN.objects.exclude(
+            financial_transaction_id=''
+        ).values('external_id', 'financial_transaction_id').first()
+        police = NumeroPolice.objects.values('numero_police').first()
+        if not echantillon or not transaction_mtn or not police:
+            return []
+
+        client_id = echantillon['client_id']
+        souscription_id = echantillon['souscription_pass_id']
+        limite_poller = timezone.now() - timedelta(minutes=10)
+        prefixe = police['numero_police'].rsplit('-', 1)[0] + '-'
+
+        return [
+            ('Poller MTN (en attente < 10 min)', TransactionMTN.objects.filter(
+                statut__in=['initiated', 'pending'], date_creation__gte=limite_poller)),
+            ('Poller Airtel (en attente < 10 min)', TransactionAirtel.objects.filter(
+                statut__in=['initiated', 'pending'], date_creation__gte=limite_poller)),
+            ('Callback MTN (reference_id)', TransactionMTN.objects.filter(
+                financial_transaction_id=transaction_mtn['financial_transaction_id'],
+                external_id=transaction_mtn['external_id'])),
+            ('Dashboard : total payé client', PaiementPass.objects.filter(
+                client_id=client_id, statut='succes'
+            ).values('client_id').annotate(total=Sum('montant'))),
+            ('Dashboard : solde contrat', PaiementPass.objects.filter(
+                souscription_pass_id=souscription_id, statut='succes'
+            ).values('souscription_pass_id').annotate(total=Sum('montant'))),
+            ('Dashboard : 5 derniers paiements', PaiementPass.objects.filter(
+                client_id=client_id).order_by('-date_paiement')[:5]),
+            ('Polices du client', NumeroPolice.objects.filter(
+                souscription_pass__client_id=client_id, statut='attribue')),
+            ('Souscriptions actives client', SouscriptionPass.objects.filter(
+                client_id=client_id, statut='activee'
+            ).values('client_id').annotate(total=Count('id'))),
+            ('Génération numéro de police', NumeroPolice.objects.filter(
+                numero_police__startswith=prefixe).order_by('-numero_police')[:1]),
+            ('Paiements en cours > 30 min', PaiementPass.objects.filter(
+                statut='en_cours', date_paiement__lt=timezone.now() - timedelta(minutes=30)
+            ).values_list('id', flat=True)[:1000]),
+        ]
+
+    def mesurer(self, requetes, repetitions):
+        resultats = {}
+        for nom, queryset in requetes:
+            meilleur, plan = None, ''
+            for _ in range(repetitions):
+                plan = queryset.explain(analyze=True, buffers=True)
+                temps = float(re.search(r'Execution Time: ([\d.]+) ms', plan).group(1))
+                meilleur = temps if meilleur is None else min(meilleur, temps)
+            resultats[nom] = (meilleur, plan)
+        return resultats
+
+    def afficher(self, requetes, avant, apres, plans):
+        self.stdout.write(self.style.SUCCESS('\n📊 EXPLAIN ANALYZE - avant / après index\n'))
+        self.stdout.write(f"{'Requête':<40} {'Avant (ms)':>11} {'Après (ms)':>11} {'Gain':>8}")
+        self.stdout.write('-' * 74)
+        for nom, _ in requetes:
+            t_avant, plan_avant = avant[nom]
+            t_apres, plan_apres = apres[nom]
+            gain = f"x{t_avant / t_apres:.1f}" if t_apres else '-'
+            self.stdout.write(f"{nom:<40} {t_avant:>11.3f} {t_apres:>11.3f} {gain:>8}")
+            if plans:
+                self.stdout.write(f"\n  AVANT:\n{plan_avant}\n  APRÈS:\n{plan_apres}\n")
+            else:
+                self.stdout.write(f"    avant: {plan_avant.splitlines()[0].strip()[:100]}")
+                self.stdout.write(f"    après: {plan_apres.splitlines()[0].strip()[:100]}")
@@ -0,0 +1,66 @@
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.pass_payments import exports
+
+
+def _date_heure(valeur):
+    date_heure = datetime.fromisoformat(valeur)
+    return date_heure if timezone.is_aware(date_heure) else timezone.make_aware(date_heure)
+
+
+class Command(BaseCommand):
+    help = 'Exporte paiements, souscriptions ou transactions opérateurs en CSV/NDJSON gzip (BI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(exports.EXPORTS))
+        parser.add_argument(
+            '--format',
+            dest='format_fichier',
+            choices=list(exports.FORMATS),
+            default='csv'
+        )
+        parser.add_argument(
+            '--depuis',
+            type=_date_heure,
+            help='Lignes modifiées après cette date ISO (défaut: tout)'
+        )
+        parser.add_argument(
+            '--etat',
+            help='Fichier du watermark : lu comme --depuis, réécrit après un export réussi'
+        )
+        parser.add_argument(
+            '--sortie',
+            help='Fichier ou répertoire de sortie (défaut: nom horodaté dans le répertoire courant)'
+        )
+
+    def handle(self, *args, **options):
+        depuis = options['depuis']
+        etat = Path(options['etat']) if options['etat'] else None
+        if depuis is None and etat and etat.exists():
+            try:
+                depuis = _date_heure(etat.read_text().strip())
+            except ValueError:
+                raise CommandError(f"Watermark illisible dans {etat}")
+
+        jusqu_a = exports.borne_export()
+        nom = exports.nom_fichier(options['export'], options['format_fichier'], jusqu_a)
+        sortie = Path(options['sortie'] or nom)
+        if sortie.is_dir():
+            sortie = sortie / nom
+
+        # Fichier temporaire : un export interrompu ne laisse pas de fichier tronqué
+        temporaire = sortie.with_name(sortie.name + '.partiel')
+        with open(temporaire, 'wb') as fichier:
+            for morceau in exports.flux(options['export'], options['format_fichier'], depuis, jusqu_a):
+                fichier.write(morceau)
+        temporaire.replace(sortie)
+
+        if etat:
+            etat.write_text(jusqu_a.isoformat())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {sortie} ({sortie.stat().st_size} octets), watermark {jusqu_a.isoformat()}"
+        ))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Lance un worker Celery dédié à un groupe de files (settings.WORKER_POOLS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('groupe', choices=list(settings.WORKER_POOLS))
+        parser.add_argument(
+            '--concurrence',
+            type=int,
+            help='Nombre de processus (défaut: CONCURRENCY du groupe)'
+        )
+        parser.add_argument('--loglevel', default='INFO')
+        parser.add_argument(
+            '--afficher',
+            action='store_true',
+            help='Afficher la commande celery équivalente sans lancer le worker'
+        )
+
+    def handle(self, *args, **options):
+        groupe = settings.WORKER_POOLS[options['groupe']]
+        argv = [
+            'worker',
+            '--queues', ','.join(groupe['QUEUES']),
+            '--concurrency', str(options['concurrence'] or groupe['CONCURRENCY']),
+            '--hostname', f"{options['groupe']}@%h",
+            # Une tâche longue ne retient pas les messages suivants du processus
+            '--optimization', 'fair',
+            '--loglevel', options['loglevel'],
+        ]
+
+        if options['afficher']:
+            self.stdout.write(f"celery -A nsia_pass_api {' '.join(argv)}")
+            return
+
+        from nsia_pass_api.celery import app
+        app.worker_main(argv)
@@ -0,0 +1,61 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.pass_payments import rapprochement
+
+
+def _jour(valeur):
+    return date.fromisoformat(valeur)
+
+
+class Command(BaseCommand):
+    help = 'Rapproche un relevé de règlement MTN ou Airtel avec nos transactions et corrige les statuts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operateur', choices=list(rapprochement.OPERATEURS))
+        parser.add_argument('releve', help='Fichier CSV du relevé (.csv ou .csv.gz)')
+        parser.add_argument(
+            '--rapport',
+            help='Fichier CSV des anomalies (défaut: <releve>.rapprochement.csv)'
+        )
+        parser.add_argument(
+            '--debut',
+            type=_jour,
+            help='Premier jour AAAA-MM-JJ de la période du relevé (défaut: dates du relevé)'
+        )
+        parser.add_argument(
+            '--fin',
+            type=_jour,
+            help='Dernier jour AAAA-MM-JJ de la période du relevé (défaut: dates du relevé)'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Classer les lignes sans corriger aucun statut'
+        )
+
+    def handle(self, *args, **options):
+        debut = timezone.make_aware(datetime.combine(options['debut'], time.min)) if options['debut'] else None
+        fin = timezone.make_aware(datetime.combine(options['fin'] + timedelta(days=1), time.min)) if options['fin'] else None
+        chemin_rapport = options['rapport'] or f"{options['releve'].removesuffix('.gz')}.rapprochement.csv"
+
+        debut_traitement = timezone.now()
+        try:
+            with rapprochement.ouvrir_releve(options['releve']) as releve, \
+                    open(chemin_rapport, 'w', newline='', encoding='utf-8') as rapport:
+                compteurs = rapprochement.Rapprochement(
+                    options['operateur'], rapport=rapport, simulation=options['simulation']
+                ).executer(releve, debut=debut, fin=fin)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        duree = (timezone.now() - debut_traitement).total_seconds()
+        for categorie, nombre in sorted(compteurs.items()):
+            self.stdout.write(f"{categorie:>18}: {nombre}")
+        action = 'à corriger (simulation)' if options['simulation'] else 'corrigées'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {sum(compteurs.values())} lignes en {duree:.1f}s, {compteurs.get('corrige', 0)} {action} "
+            f"- anomalies: {chemin_rapport}"
+        ))
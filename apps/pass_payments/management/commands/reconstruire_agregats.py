@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.pass_payments import agregats
+from apps.pass_payments.models import PaiementPass
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les agrégats financiers journaliers des paiements sur une période'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--debut',
+            type=date.fromisoformat,
+            help='Premier jour AAAA-MM-JJ (défaut: premier paiement)'
+        )
+        parser.add_argument(
+            '--fin',
+            type=date.fromisoformat,
+            help='Dernier jour AAAA-MM-JJ (défaut: aujourd\'hui)'
+        )
+        parser.add_argument(
+            '--jours',
+            type=int,
+            help='Les N derniers jours (au lieu de --debut)'
+        )
+
+    def handle(self, *args, **options):
+        fin = options['fin'] or timezone.localdate()
+        if options['jours']:
+            debut = fin - timedelta(days=options['jours'] - 1)
+        elif options['debut']:
+            debut = options['debut']
+        else:
+            premier = PaiementPass.objects.aggregate(premier=Min('date_paiement'))['premier']
+            if premier is None:
+                self.stdout.write('Aucun paiement')
+                return
+            debut = timezone.localtime(premier).date()
+
+        if debut > fin:
+            raise CommandError(f"Période invalide: {debut} > {fin}")
+
+        lignes = agregats.reconstruire(debut, fin)
+        self.stdout.write(self.style.SUCCESS(f"✅ Agrégats du {debut} au {fin}: {lignes} lignes"))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from redis import RedisError
+from apps.pass_payments import tracing
+
+
+class Command(BaseCommand):
+    help = 'Affiche ou modifie à chaud le niveau de traçage des appels opérateurs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--niveau',
+            choices=list(tracing.NIVEAUX),
+            help='Nouveau niveau de traçage'
+        )
+        parser.add_argument(
+            '--echantillonnage',
+            type=float,
+            help="Taux d'échantillonnage des appels réussis (0 à 1)"
+        )
+        parser.add_argument(
+            '--duree',
+            type=int,
+            default=60,
+            help='Durée de la surcharge en minutes (défaut: 60)'
+        )
+        parser.add_argument(
+            '--reinitialiser',
+            action='store_true',
+            help='Supprimer la surcharge et revenir aux settings'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.modifier(options)
+        except RedisError as e:
+            raise CommandError(f"Redis indisponible, surcharge non modifiée: {e}")
+
+        config = tracing.get_config()
+        self.stdout.write(f"Niveau: {config['LEVEL']}")
+        self.stdout.write(f"Échantillonnage: {config['SAMPLE_RATE']}")
+        self.stdout.write(f"Taille max payload: {config['MAX_PAYLOAD_CHARS']}")
+
+    def modifier(self, options):
+        if options['reinitialiser']:
+            tracing.reinitialiser_config()
+            self.stdout.write(self.style.SUCCESS('✅ Surcharge de traçage supprimée'))
+
+        elif options['niveau'] or options['echantillonnage'] is not None:
+            try:
+                tracing.set_config(
+                    niveau=options['niveau'],
+                    taux_echantillonnage=options['echantillonnage'],
+                    duree_minutes=options['duree']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                self.style.SUCCESS(f"✅ Surcharge active pendant {options['duree']} minutes")
+            )
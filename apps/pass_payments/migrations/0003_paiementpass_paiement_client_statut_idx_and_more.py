@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index construits sans verrouiller les tables en écriture
+    atomic = False
+
+    dependencies = [
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_payments', '0002_alter_paiementpass_code_confirmation'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(fields=['client', 'statut'], include=('montant', 'montant_net'), name='paiement_client_statut_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(fields=['souscription_pass', 'statut'], include=('montant',), name='paiement_sousc_statut_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(fields=['client', '-date_paiement'], name='paiement_client_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(condition=models.Q(('statut', 'en_cours')), fields=['date_paiement'], name='paiement_en_cours_idx'),
+        ),
+    ]
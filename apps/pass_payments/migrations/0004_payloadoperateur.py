@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_payments', '0003_paiementpass_paiement_client_statut_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadOperateur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('empreinte', models.CharField(max_length=64, unique=True)),
+                ('contenu', models.BinaryField()),
+                ('taille', models.IntegerField()),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Payload opérateur',
+                'verbose_name_plural': 'Payloads opérateurs',
+                'db_table': 'payloads_operateurs',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_payments', '0004_payloadoperateur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxPaiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operateur', models.CharField(max_length=20)),
+                ('reference_operateur', models.CharField(max_length=100)),
+                ('message_payeur', models.CharField(blank=True, max_length=160)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('envoi', 'Envoi en cours'), ('envoye', 'Envoyé'), ('echec', 'Échec')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField()),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('paiement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='pass_payments.paiementpass')),
+            ],
+            options={
+                'verbose_name': 'Outbox paiement',
+                'verbose_name_plural': 'Outbox paiements',
+                'db_table': 'outbox_paiements',
+                'indexes': [models.Index(condition=models.Q(('statut__in', ['en_attente', 'envoi'])), fields=['prochaine_tentative'], name='outbox_paiement_actif_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:02
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_payments', '0005_outboxpaiement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequeteIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('portee', models.CharField(max_length=50)),
+                ('cle', models.CharField(max_length=100)),
+                ('empreinte', models.CharField(max_length=64)),
+                ('statut_http', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('reponse', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('verrou_expire', models.DateTimeField()),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_expiration', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Requête idempotente',
+                'verbose_name_plural': 'Requêtes idempotentes',
+                'db_table': 'requetes_idempotentes',
+                'indexes': [models.Index(fields=['date_expiration'], name='requete_idem_expiration_idx')],
+                'constraints': [models.UniqueConstraint(fields=('portee', 'cle'), name='requete_idempotente_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_payments', '0006_requeteidempotente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EcheanceCotisation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rang', models.PositiveIntegerField()),
+                ('date_echeance', models.DateField()),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('operateur', models.CharField(max_length=20)),
+                ('numero_payeur', models.CharField(max_length=25)),
+                ('statut', models.CharField(choices=[('a_collecter', 'À collecter'), ('en_collecte', 'En collecte'), ('payee', 'Payée'), ('impayee', 'Impayée'), ('annulee', 'Annulée')], default='a_collecter', max_length=20)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+                ('paiement', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='echeance', to='pass_payments.paiementpass')),
+                ('souscription', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='echeances', to='pass_clients.souscriptionpass')),
+            ],
+            options={
+                'verbose_name': 'Echéance de cotisation',
+                'verbose_name_plural': 'Echéances de cotisation',
+                'db_table': 'echeances_cotisations',
+                'ordering': ['date_echeance'],
+                'indexes': [models.Index(condition=models.Q(('statut', 'a_collecter')), fields=['operateur', 'date_echeance'], name='echeance_a_collecter_idx'), models.Index(condition=models.Q(('statut', 'en_collecte')), fields=['paiement'], name='echeance_en_collecte_idx')],
+                'constraints': [models.UniqueConstraint(fields=('souscription', 'rang'), name='echeance_souscription_rang_uniq')],
+            },
+        ),
+    ]
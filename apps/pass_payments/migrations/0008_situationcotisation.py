@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:14
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index de paiements_pass construit sans verrouiller la table en écriture
+    atomic = False
+
+    dependencies = [
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_payments', '0007_echeancecotisation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SituationCotisation',
+            fields=[
+                ('souscription', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='situation', serialize=False, to='pass_clients.souscriptionpass')),
+                ('periodes_dues', models.PositiveIntegerField(default=0)),
+                ('montant_attendu', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('arrieres', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('avance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('periodes_impayees', models.PositiveIntegerField(default=0)),
+                ('jours_retard', models.PositiveIntegerField(default=0)),
+                ('date_prochaine_echeance', models.DateField(blank=True, null=True)),
+                ('date_dernier_paiement', models.DateField(blank=True, null=True)),
+                ('date_calcul', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Situation de cotisation',
+                'verbose_name_plural': 'Situations de cotisation',
+                'db_table': 'situations_cotisations',
+            },
+        ),
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(fields=['date_modification'], name='paiement_date_modif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='situationcotisation',
+            index=models.Index(condition=models.Q(('periodes_impayees__gt', 0)), fields=['-jours_retard'], name='situation_en_retard_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_payments', '0008_situationcotisation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenouvellementSouscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_expiration', models.DateField()),
+                ('nouvelle_expiration', models.DateField()),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('operateur', models.CharField(max_length=20)),
+                ('numero_payeur', models.CharField(max_length=25)),
+                ('statut', models.CharField(choices=[('planifie', 'Planifié'), ('en_cours', 'Paiement en cours'), ('renouvele', 'Renouvelé'), ('echec', 'Échec'), ('annule', 'Annulé')], default='planifie', max_length=20)),
+                ('date_planifiee', models.DateTimeField()),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+                ('paiement', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renouvellement', to='pass_payments.paiementpass')),
+                ('souscription', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='renouvellements', to='pass_clients.souscriptionpass')),
+            ],
+            options={
+                'verbose_name': 'Renouvellement de souscription',
+                'verbose_name_plural': 'Renouvellements de souscription',
+                'db_table': 'renouvellements_souscriptions',
+                'ordering': ['date_planifiee'],
+                'indexes': [models.Index(condition=models.Q(('statut', 'planifie')), fields=['date_planifiee'], name='renouvellement_planifie_idx'), models.Index(condition=models.Q(('statut', 'en_cours')), fields=['paiement'], name='renouvellement_en_cours_idx')],
+                'constraints': [models.UniqueConstraint(fields=('souscription', 'date_expiration'), name='renouvellement_sousc_expiration_uniq')],
+            },
+        ),
+    ]
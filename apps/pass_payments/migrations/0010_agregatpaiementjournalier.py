@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:22
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index de paiements_pass construit sans verrouiller la table en écriture
+    atomic = False
+
+    dependencies = [
+        ('pass_clients', '0004_souscriptionpass_souscription_client_statut_idx'),
+        ('pass_payments', '0009_renouvellementsouscription'),
+        ('pass_products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatPaiementJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('operateur', models.CharField(max_length=20)),
+                ('agence', models.CharField(blank=True, default='', max_length=100)),
+                ('statut', models.CharField(max_length=30)),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('frais_transaction', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('montant_net', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('date_calcul', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Agrégat journalier de paiements',
+                'verbose_name_plural': 'Agrégats journaliers de paiements',
+                'db_table': 'agregats_paiements_journaliers',
+                'ordering': ['jour', 'operateur'],
+            },
+        ),
+        AddIndexConcurrently(
+            model_name='paiementpass',
+            index=models.Index(fields=['date_paiement'], name='paiement_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='agregatpaiementjournalier',
+            name='produit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='agregats_paiements', to='pass_products.produitpass'),
+        ),
+        migrations.AddIndex(
+            model_name='agregatpaiementjournalier',
+            index=models.Index(fields=['statut', 'jour'], name='agregat_paiement_statut_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='agregatpaiementjournalier',
+            constraint=models.UniqueConstraint(fields=('jour', 'operateur', 'produit', 'agence', 'statut'), name='agregat_paiement_jour_uniq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:50
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pass_payments', '0010_agregatpaiementjournalier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payloadoperateur',
+            name='date_utilisation',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+    ]
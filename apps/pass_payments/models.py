@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models.functions import Now
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
+from django.utils import timezone
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from .payloads import compresser, decompresser
 
 class PaiementPass(models.Model):
     """Historique des paiements PASS via Mobile Money"""
@@ -89,6 +94,32 @@ class PaiementPass(models.Model):
         ordering = ['-date_paiement']
         verbose_name = 'Paiement PASS'
         verbose_name_plural = 'Paiements PASS'
+        indexes = [
+            # Totaux client (dashboard, cotisations) : index couvrant
+            models.Index(
+                fields=['client', 'statut'],
+                name='paiement_client_statut_idx',
+                include=['montant', 'montant_net']
+            ),
+            # Solde par contrat
+            models.Index(
+                fields=['souscription_pass', 'statut'],
+                name='paiement_sousc_statut_idx',
+                include=['montant']
+            ),
+            # Derniers paiements d'un client
+            models.Index(fields=['client', '-date_paiement'], name='paiement_client_date_idx'),
+            # Recalcul incrémental des situations de cotisation
+            models.Index(fields=['date_modification'], name='paiement_date_modif_idx'),
+            # Recalcul d'une journée des agrégats financiers
+            models.Index(fields=['date_paiement'], name='paiement_date_idx'),
+            # Paiements en cours uniquement (index partiel)
+            models.Index(
+                fields=['date_paiement'],
+                name='paiement_en_cours_idx',
+                condition=models.Q(statut='en_cours')
+            ),
+        ]
         
     def __str__(self):
         return f"{self.numero_transaction} - {self.montant} XAF ({self.operateur})"
@@ -195,3 +226,393 @@ class SinistrePass(models.Model):
             ).count() + 1
             self.numero_sinistre = f"SIN-{year}-{count:06d}"
         super().save(*args, **kwargs)
+
+
+class PayloadOperateur(models.Model):
+    """Payload JSON d'un appel opérateur, compressé et dédupliqué par empreinte"""
+    
+    empreinte = models.CharField(max_length=64, unique=True)  # SHA-256 du JSON canonique
+    contenu = models.BinaryField()  # JSON compressé (zlib)
+    taille = models.IntegerField()  # Taille JSON non compressée (octets)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    # Dernière réutilisation (à USAGE_REFRESH près) : délai de grâce de la purge des orphelins
+    date_utilisation = models.DateTimeField(db_default=Now())
+
+    # Intervalle de mise à jour de date_utilisation, bien inférieur au délai de grâce
+    USAGE_REFRESH = timedelta(hours=1)
+
+    class Meta:
+        db_table = 'payloads_operateurs'
+        verbose_name = 'Payload opérateur'
+        verbose_name_plural = 'Payloads opérateurs'
+        
+    def __str__(self):
+        return f"{self.empreinte[:12]} ({self.taille} octets)"
+    
+    @property
+    def donnees(self):
+        return decompresser(self.contenu)
+    
+    @classmethod
+    def enregistrer(cls, donnees):
+        """Retourne le payload correspondant (créé si nouveau), None si vide"""
+        if donnees in (None, {}):
+            return None
+        empreinte, contenu, taille = compresser(donnees)
+        payload, cree = cls.objects.get_or_create(
+            empreinte=empreinte,
+            defaults={'contenu': contenu, 'taille': taille}
+        )
+        if not cree and not cls._marquer_utilises([payload]):
+            # Supprimé entre-temps par la purge des orphelins : recréé
+            return cls.enregistrer(donnees)
+        return payload
+    
+    @classmethod
+    def _marquer_utilises(cls, payloads):
+        """
+        Rafraîchit date_utilisation des payloads réutilisés (si plus ancienne
+        que USAGE_REFRESH) ; False si l'un d'eux a été supprimé par la purge.
+        L'UPDATE attend une purge concurrente, qui revérifie alors la date.
+        """
+        maintenant = timezone.now()
+        perimes = [p.id for p in payloads if p.date_utilisation < maintenant - cls.USAGE_REFRESH]
+        if not perimes:
+            return True
+        return cls.objects.filter(id__in=perimes).update(date_utilisation=maintenant) == len(perimes)
+    
+    @classmethod
+    def enregistrer_lot(cls, liste_donnees):
+        """Version groupée d'enregistrer() : deux requêtes quel que soit le nombre"""
+        compresses = [
+            None if donnees in (None, {}) else compresser(donnees) for donnees in liste_donnees
+        ]
+        nouveaux = {
+            c[0]: cls(empreinte=c[0], contenu=c[1], taille=c[2]) for c in compresses if c
+        }
+        if not nouveaux:
+            return [None] * len(compresses)
+        
+        cls.objects.bulk_create(nouveaux.values(), ignore_conflicts=True)
+        existants = cls.objects.only('id', 'empreinte', 'date_utilisation').in_bulk(
+            list(nouveaux), field_name='empreinte'
+        )
+        if len(existants) < len(nouveaux) or not cls._marquer_utilises(existants.values()):
+            return cls.enregistrer_lot(liste_donnees)
+        return [existants[c[0]] if c else None for c in compresses]
+
+
+class OutboxPaiement(models.Model):
+    """
+    Demande de paiement opérateur à envoyer (outbox transactionnelle)
+    
+    Ecrite dans la même transaction que le paiement : la borne reçoit son
+    numéro de transaction sans attendre l'opérateur, l'appel est fait par la
+    tâche envoyer_paiement_operateur avec reprises.
+    """
+    
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('envoi', 'Envoi en cours'),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Échec'),
+    ]
+    
+    paiement = models.OneToOneField(
+        PaiementPass,
+        on_delete=models.CASCADE,
+        related_name='outbox'
+    )
+    operateur = models.CharField(max_length=20)
+    # Clé d'idempotence côté opérateur (X-Reference-Id MTN, id de transaction Airtel)
+    reference_operateur = models.CharField(max_length=100)
+    message_payeur = models.CharField(max_length=160, blank=True)
+    
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    # en_attente : date de la prochaine tentative ; envoi : fin du bail de la tâche
+    prochaine_tentative = models.DateTimeField()
+    derniere_erreur = models.TextField(blank=True)
+    
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outbox_paiements'
+        verbose_name = 'Outbox paiement'
+        verbose_name_plural = 'Outbox paiements'
+        indexes = [
+            # Relance des entrées actives uniquement (index partiel)
+            models.Index(
+                fields=['prochaine_tentative'],
+                name='outbox_paiement_actif_idx',
+                condition=models.Q(statut__in=['en_attente', 'envoi'])
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.paiement_id} - {self.operateur} ({self.statut})"
+
+
+class RequeteIdempotente(models.Model):
+    """
+    Première réponse d'une initiation de paiement, rejouée pour les reprises
+    portant le même en-tête Idempotency-Key (voir idempotence.py)
+    """
+    
+    portee = models.CharField(max_length=50)  # Endpoint protégé et utilisateur (endpoint:user_pk)
+    cle = models.CharField(max_length=100)  # Valeur de l'en-tête Idempotency-Key
+    empreinte = models.CharField(max_length=64)  # SHA-256 du corps de la requête
+    # Réponse enregistrée ; statut_http vide tant que la requête est en cours
+    statut_http = models.PositiveSmallIntegerField(null=True, blank=True)
+    reponse = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    verrou_expire = models.DateTimeField()
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_expiration = models.DateTimeField()
+
+    class Meta:
+        db_table = 'requetes_idempotentes'
+        verbose_name = 'Requête idempotente'
+        verbose_name_plural = 'Requêtes idempotentes'
+        constraints = [
+            models.UniqueConstraint(fields=['portee', 'cle'], name='requete_idempotente_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date_expiration'], name='requete_idem_expiration_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.portee}:{self.cle} ({self.statut_http or 'en cours'})"
+
+
+class EcheanceCotisation(models.Model):
+    """
+    Cotisation périodique due par une souscription activée
+    
+    Générée à l'avance (rang n = n-ième période après l'activation, couverte
+    par la souscription initiale pour n = 0), puis collectée par débit Mobile
+    Money via l'outbox (voir CotisationService).
+    """
+    
+    STATUT_CHOICES = [
+        ('a_collecter', 'À collecter'),
+        ('en_collecte', 'En collecte'),
+        ('payee', 'Payée'),
+        ('impayee', 'Impayée'),
+        ('annulee', 'Annulée'),
+    ]
+    
+    souscription = models.ForeignKey(
+        'pass_clients.SouscriptionPass',
+        on_delete=models.RESTRICT,
+        related_name='echeances'
+    )
+    rang = models.PositiveIntegerField()
+    date_echeance = models.DateField()
+    montant = models.DecimalField(max_digits=10, decimal_places=2)
+    # Compte débité : celui du dernier paiement réussi de la souscription
+    operateur = models.CharField(max_length=20)
+    numero_payeur = models.CharField(max_length=25)
+    
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='a_collecter')
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(null=True, blank=True)
+    # Paiement de la tentative en cours (le dernier en cas d'échecs successifs)
+    paiement = models.OneToOneField(
+        PaiementPass,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='echeance'
+    )
+    
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'echeances_cotisations'
+        ordering = ['date_echeance']
+        verbose_name = 'Echéance de cotisation'
+        verbose_name_plural = 'Echéances de cotisation'
+        constraints = [
+            # Génération rejouable : une échéance par période
+            models.UniqueConstraint(fields=['souscription', 'rang'], name='echeance_souscription_rang_uniq'),
+        ]
+        indexes = [
+            # Sélection des échéances dues par opérateur (index partiel)
+            models.Index(
+                fields=['operateur', 'date_echeance'],
+                name='echeance_a_collecter_idx',
+                condition=models.Q(statut='a_collecter')
+            ),
+            models.Index(
+                fields=['paiement'],
+                name='echeance_en_collecte_idx',
+                condition=models.Q(statut='en_collecte')
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.souscription_id} #{self.rang} - {self.date_echeance} ({self.statut})"
+
+
+class SituationCotisation(models.Model):
+    """
+    Situation de cotisation d'une souscription (table de synthèse)
+    
+    Calculée en masse par situations.recalculer() : nuit complète, puis
+    recalculs incrémentaux dans la journée pour les souscriptions dont un
+    paiement a changé. Lue telle quelle par les écrans et rapports.
+    """
+    
+    souscription = models.OneToOneField(
+        'pass_clients.SouscriptionPass',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='situation'
+    )
+    # Périodes commencées à la date de calcul (la période en cours est due)
+    periodes_dues = models.PositiveIntegerField(default=0)
+    montant_attendu = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    montant_paye = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Montant d'un paiement de rattrapage pour être à jour
+    arrieres = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    avance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    periodes_impayees = models.PositiveIntegerField(default=0)
+    # Jours écoulés depuis le début de la plus ancienne période impayée
+    jours_retard = models.PositiveIntegerField(default=0)
+    date_prochaine_echeance = models.DateField(null=True, blank=True)
+    date_dernier_paiement = models.DateField(null=True, blank=True)
+    date_calcul = models.DateTimeField()
+
+    class Meta:
+        db_table = 'situations_cotisations'
+        verbose_name = 'Situation de cotisation'
+        verbose_name_plural = 'Situations de cotisation'
+        indexes = [
+            # Portefeuille en retard, du plus ancien au plus récent (index partiel)
+            models.Index(
+                fields=['-jours_retard'],
+                name='situation_en_retard_idx',
+                condition=models.Q(periodes_impayees__gt=0)
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.souscription_id} - arriérés {self.arrieres} XAF ({self.periodes_impayees} périodes)"
+
+
+class RenouvellementSouscription(models.Model):
+    """
+    Renouvellement à encaisser avant l'expiration d'une souscription
+    
+    Pré-généré chaque nuit avec une date de traitement étalée sur plusieurs
+    jours et sur la plage horaire (voir RenouvellementService) : les
+    expirations groupées en fin de mois ne créent pas de pic de débits.
+    """
+    
+    STATUT_CHOICES = [
+        ('planifie', 'Planifié'),
+        ('en_cours', 'Paiement en cours'),
+        ('renouvele', 'Renouvelé'),
+        ('echec', 'Échec'),
+        ('annule', 'Annulé'),
+    ]
+    
+    souscription = models.ForeignKey(
+        'pass_clients.SouscriptionPass',
+        on_delete=models.RESTRICT,
+        related_name='renouvellements'
+    )
+    # Echéance renouvelée et nouvelle échéance après paiement
+    date_expiration = models.DateField()
+    nouvelle_expiration = models.DateField()
+    montant = models.DecimalField(max_digits=10, decimal_places=2)
+    operateur = models.CharField(max_length=20)
+    numero_payeur = models.CharField(max_length=25)
+    
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='planifie')
+    date_planifiee = models.DateTimeField()
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    paiement = models.OneToOneField(
+        PaiementPass,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='renouvellement'
+    )
+    
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'renouvellements_souscriptions'
+        ordering = ['date_planifiee']
+        verbose_name = 'Renouvellement de souscription'
+        verbose_name_plural = 'Renouvellements de souscription'
+        constraints = [
+            # Génération rejouable : un renouvellement par échéance
+            models.UniqueConstraint(
+                fields=['souscription', 'date_expiration'],
+                name='renouvellement_sousc_expiration_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['date_planifiee'],
+                name='renouvellement_planifie_idx',
+                condition=models.Q(statut='planifie')
+            ),
+            models.Index(
+                fields=['paiement'],
+                name='renouvellement_en_cours_idx',
+                condition=models.Q(statut='en_cours')
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.souscription_id} - {self.date_expiration} ({self.statut})"
+
+
+class AgregatPaiementJournalier(models.Model):
+    """
+    Totaux des paiements par jour, opérateur, produit, agence et statut
+    
+    Jour de date_paiement (fuseau TIME_ZONE), agence de l'agent de la
+    souscription ('' pour une souscription sans agent). Les journées touchées
+    par un changement de paiement sont recalculées par agregats.py ; les
+    rapports financiers somment ces lignes au lieu de parcourir paiements_pass.
+    """
+    
+    jour = models.DateField()
+    operateur = models.CharField(max_length=20)
+    produit = models.ForeignKey(
+        'pass_products.ProduitPass',
+        on_delete=models.RESTRICT,
+        related_name='agregats_paiements'
+    )
+    agence = models.CharField(max_length=100, blank=True, default='')
+    statut = models.CharField(max_length=30)
+    
+    nombre = models.PositiveIntegerField(default=0)
+    montant = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    frais_transaction = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    montant_net = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    date_calcul = models.DateTimeField()
+
+    class Meta:
+        db_table = 'agregats_paiements_journaliers'
+        ordering = ['jour', 'operateur']
+        verbose_name = 'Agrégat journalier de paiements'
+        verbose_name_plural = 'Agrégats journaliers de paiements'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['jour', 'operateur', 'produit', 'agence', 'statut'],
+                name='agregat_paiement_jour_uniq'
+            ),
+        ]
+        indexes = [
+            # Rapports par période, filtrés par statut
+            models.Index(fields=['statut', 'jour'], name='agregat_paiement_statut_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.jour} {self.operateur} {self.agence or '-'} ({self.statut}): {self.montant} XAF"
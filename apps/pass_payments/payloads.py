@@ -0,0 +1,87 @@
+# apps/pass_payments/payloads.py
+
+"""
+Stockage compact des payloads opérateurs (requête, réponse, callback)
+
+Les transactions MTN/Airtel ne portent plus que des références vers la
+table payloads_operateurs : JSON canonique compressé (zlib) et dédupliqué
+par empreinte SHA-256. Les propriétés request_payload / response_payload /
+callback_payload restent utilisables comme avant et ne chargent le
+payload qu'à la lecture.
+"""
+
+import hashlib
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+# Propriété -> clé étrangère vers PayloadOperateur
+CHAMPS_PAYLOADS = {
+    'request_payload': 'payload_requete',
+    'response_payload': 'payload_reponse',
+    'callback_payload': 'payload_callback',
+}
+
+
+def compresser(donnees):
+    """Retourne (empreinte, contenu compressé, taille JSON) d'un payload"""
+    brut = json.dumps(
+        donnees, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+    return hashlib.sha256(brut).hexdigest(), zlib.compress(brut, 6), len(brut)
+
+
+def decompresser(contenu):
+    return json.loads(zlib.decompress(bytes(contenu)).decode('utf-8'))
+
+
+def reference_payload(help_text=''):
+    """Clé étrangère vers payloads_operateurs, sans index ni contrainte (lignes étroites)"""
+    return models.ForeignKey(
+        'pass_payments.PayloadOperateur',
+        on_delete=models.DO_NOTHING,
+        null=True, blank=True,
+        db_index=False,
+        db_constraint=False,
+        related_name='+',
+        help_text=help_text
+    )
+
+
+def payload_differe(nom, defaut=None):
+    """Propriété de modèle donnant accès au payload sans élargir la ligne"""
+    champ = CHAMPS_PAYLOADS[nom]
+
+    def lire(self):
+        en_attente = self.__dict__.get('_payloads_en_attente', {})
+        if nom in en_attente:
+            return en_attente[nom]
+        payload = getattr(self, champ)
+        if payload is None:
+            return defaut() if callable(defaut) else defaut
+        return payload.donnees
+
+    def ecrire(self, valeur):
+        # Persisté au prochain save() (voir PayloadsOperateurMixin)
+        self.__dict__.setdefault('_payloads_en_attente', {})[nom] = valeur
+
+    return property(lire, ecrire, doc=f"Payload JSON chargé à la demande ({champ})")
+
+
+class PayloadsOperateurMixin:
+    """Enregistre les payloads affectés avant la sauvegarde de la transaction"""
+
+    def save(self, *args, **kwargs):
+        from .models import PayloadOperateur
+
+        en_attente = self.__dict__.pop('_payloads_en_attente', {})
+        for nom, valeur in en_attente.items():
+            setattr(self, CHAMPS_PAYLOADS[nom], PayloadOperateur.enregistrer(valeur))
+
+        # save(update_fields=['response_payload']) reste valide
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = [CHAMPS_PAYLOADS.get(c, c) for c in kwargs['update_fields']]
+        super().save(*args, **kwargs)
+
@@ -0,0 +1,249 @@
+# apps/pass_payments/rapprochement.py
+
+"""
+Rapprochement des relevés de règlement opérateurs (MTN, Airtel)
+
+Le relevé (CSV, éventuellement .gz) est lu en flux par lots de CHUNK_LINES
+lignes. Pour chaque lot, nos transactions sont chargées en une requête par
+référence opérateur (puis une par external_id pour les lignes restantes),
+en tuples, et indexées dans des dictionnaires : jointure par hachage, sans
+requête par ligne ni relevé entier en mémoire.
+
+Catégories :
+- concordant : même montant, statuts cohérents
+- corrige : statut final donné par le relevé, transaction encore en attente
+  ou en échec chez nous (succès), ou en attente (échec) ; correction
+  appliquée par lot (LotMiseAJour : bulk_update, notification des bornes,
+  activation des souscriptions payées)
+- ecart_montant : montants différents, aucune correction automatique
+- conflit : succès chez nous, échec sur le relevé (revue manuelle)
+- doublon : transaction déjà rapprochée par une ligne précédente
+- absent_chez_nous : ligne du relevé sans transaction
+- absent_du_releve : transaction réussie de la période absente du relevé
+- ignore : ligne sans statut final (en attente chez l'opérateur)
+"""
+
+import csv
+import gzip
+import io
+import logging
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.airtel_integration.models import TransactionAirtel
+from apps.mtn_integration.models import TransactionMTN
+
+from .tasks import LotMiseAJour, transactions_a_verifier
+
+logger = logging.getLogger(__name__)
+
+OPERATEURS = {
+    'mtn': (TransactionMTN, 'financial_transaction_id'),
+    'airtel': (TransactionAirtel, 'airtel_transaction_id'),
+}
+
+COLONNES_RAPPORT = [
+    'categorie', 'ligne', 'reference', 'external_id', 'montant_releve', 'montant_transaction',
+    'statut_releve', 'statut_transaction', 'statut_paiement',
+]
+
+# Statuts de nos transactions qu'une ligne du relevé peut corriger
+CORRIGEABLES = {
+    'succes': {'initiated', 'pending', 'failed', 'timeout', 'cancelled'},
+    'echec': {'initiated', 'pending', 'timeout'},
+}
+STATUT_TRANSACTION = {'succes': 'successful', 'echec': 'failed'}
+
+
+def ouvrir_releve(chemin):
+    """Fichier texte du relevé (décompressé à la volée si .gz)"""
+    if str(chemin).endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(chemin), encoding='utf-8-sig', newline='')
+    return open(chemin, encoding='utf-8-sig', newline='')
+
+
+def _montant(valeur, separateur_decimal='.'):
+    """Montant du relevé ; l'autre séparateur (',' ou '.') est celui des milliers"""
+    milliers = ',' if separateur_decimal == '.' else '.'
+    valeur = (valeur or '').replace('\u00a0', '').replace(' ', '').replace(milliers, '')
+    try:
+        return Decimal(valeur.replace(separateur_decimal, '.'))
+    except InvalidOperation:
+        return None
+
+
+def _date(valeur):
+    try:
+        date_heure = datetime.fromisoformat((valeur or '').strip())
+    except ValueError:
+        return None
+    return date_heure if timezone.is_aware(date_heure) else timezone.make_aware(date_heure)
+
+
+class Rapprochement:
+    """Rapprochement d'un relevé ; corrections écrites par LotMiseAJour"""
+
+    def __init__(self, operateur, rapport=None, simulation=False):
+        self.operateur = operateur
+        self.modele, self.champ_reference = OPERATEURS[operateur]
+        self.config = settings.OPERATOR_SETTLEMENT[operateur]
+        self.simulation = simulation
+        self.rapport = csv.writer(rapport) if rapport else None
+        if self.rapport:
+            self.rapport.writerow(COLONNES_RAPPORT)
+        self.compteurs = Counter()
+        # Identifiants rapprochés : doublons et transactions absentes du relevé
+        self.rapprochees = set()
+        self.periode = [None, None]
+        self.lot = LotMiseAJour()
+
+    def _statut_releve(self, valeur):
+        valeur = (valeur or '').strip().upper()
+        if valeur in self.config['SUCCESS_VALUES']:
+            return 'succes'
+        if valeur in self.config['FAILURE_VALUES']:
+            return 'echec'
+        return 'autre'
+
+    def _lire(self, fichier):
+        """Lignes normalisées du relevé (dict) ; colonnes insensibles à la casse"""
+        lecteur = csv.reader(fichier, delimiter=self.config['DELIMITER'])
+        entetes = [entete.strip().lower() for entete in next(lecteur, [])]
+        colonnes = {}
+        for cle, nom in self.config['COLUMNS'].items():
+            if nom.lower() in entetes:
+                colonnes[cle] = entetes.index(nom.lower())
+            elif cle in ('reference', 'montant', 'statut'):
+                raise ValueError(f"Colonne '{nom}' absente du relevé ({', '.join(entetes)})")
+
+        for numero, ligne in enumerate(lecteur, start=2):
+            if not any(ligne):
+                continue
+            valeurs = {cle: ligne[index].strip() if index < len(ligne) else '' for cle, index in colonnes.items()}
+            date_ligne = _date(valeurs.get('date'))
+            if date_ligne:
+                self.periode[0] = min(self.periode[0] or date_ligne, date_ligne)
+                self.periode[1] = max(self.periode[1] or date_ligne, date_ligne)
+            yield {
+                'ligne': numero,
+                'reference': valeurs['reference'],
+                'external_id': valeurs.get('external_id', ''),
+                'montant': _montant(valeurs['montant'], self.config['DECIMAL_SEPARATOR']),
+                'statut': self._statut_releve(valeurs['statut']),
+            }
+
+    def _charger(self, champ, valeurs):
+        """Transactions du lot indexées par `champ` (tuples, sans payloads)"""
+        valeurs = [valeur for valeur in valeurs if valeur]
+        if not valeurs:
+            return {}
+        lignes = self.modele.objects.filter(**{f'{champ}__in': valeurs}).values_list(
+            champ, 'id', 'external_id', 'montant', 'statut', 'paiement_pass__statut'
+        )
+        return {ligne[0]: ligne[1:] for ligne in lignes}
+
+    def _noter(self, categorie, ligne=None, transaction=None):
+        self.compteurs[categorie] += 1
+        if self.rapport is None or categorie == 'concordant':
+            return
+        ligne = ligne or {}
+        _, external_id, montant, statut, statut_paiement = transaction or (None, '', '', '', '')
+        self.rapport.writerow([
+            categorie, ligne.get('ligne', ''), ligne.get('reference', ''), ligne.get('external_id') or external_id,
+            ligne.get('montant', ''), montant, ligne.get('statut', ''), statut, statut_paiement or '',
+        ])
+
+    def _classer(self, ligne, transaction):
+        transaction_id, _, montant, statut, statut_paiement = transaction
+        if transaction_id in self.rapprochees:
+            return 'doublon'
+        self.rapprochees.add(transaction_id)
+
+        if ligne['statut'] == 'autre':
+            return 'ignore'
+        if ligne['montant'] is None or ligne['montant'] != montant:
+            return 'ecart_montant'
+        if ligne['statut'] == 'succes':
+            if statut == 'successful' and statut_paiement in (None, 'succes', 'rembourse'):
+                return 'concordant'
+            return 'corrige' if statut in CORRIGEABLES['succes'] or statut == 'successful' else 'conflit'
+        if statut in ('failed', 'cancelled'):
+            return 'concordant'
+        if statut == 'successful':
+            return 'conflit'
+        return 'corrige' if statut in CORRIGEABLES['echec'] else 'conflit'
+
+    def _corriger(self, corrections):
+        """Statuts finaux du relevé appliqués aux transactions et paiements"""
+        if self.simulation or not corrections:
+            return
+        motif = f"Relevé {self.operateur} du {timezone.localdate():%d/%m/%Y}"
+        for transaction in transactions_a_verifier(self.modele, statuts=None, id__in=list(corrections)):
+            statut, reference = corrections[transaction.id]
+            transaction.statut = STATUT_TRANSACTION[statut]
+            if statut == 'echec':
+                transaction.status_reason = f"Échec confirmé: {motif}"[:100]
+            self.lot.transaction(transaction)
+
+            paiement = transaction.paiement_pass
+            if paiement and paiement.statut != statut and paiement.statut != 'rembourse':
+                paiement.statut = statut
+                if statut == 'succes':
+                    paiement.date_confirmation = timezone.now()
+                    paiement.code_confirmation = reference
+                else:
+                    paiement.motif_echec = f"Échec confirmé: {motif}"
+                self.lot.paiement(paiement)
+        self.lot.appliquer()
+
+    def _traiter_lot(self, lignes):
+        par_reference = self._charger(self.champ_reference, {ligne['reference'] for ligne in lignes})
+        restantes = {ligne['external_id'] for ligne in lignes if ligne['reference'] not in par_reference}
+        par_external_id = self._charger('external_id', restantes)
+
+        corrections = {}
+        for ligne in lignes:
+            transaction = par_reference.get(ligne['reference']) or par_external_id.get(ligne['external_id'])
+            if transaction is None:
+                self._noter('absent_chez_nous', ligne)
+                continue
+            categorie = self._classer(ligne, transaction)
+            if categorie == 'corrige':
+                corrections[transaction[0]] = (ligne['statut'], ligne['reference'])
+            self._noter(categorie, ligne, transaction)
+        self._corriger(corrections)
+
+    def _absentes_du_releve(self, debut, fin):
+        """Transactions réussies de la période sans ligne dans le relevé"""
+        if debut is None or fin is None:
+            logger.warning(f"Rapprochement {self.operateur}: période inconnue, absences non recherchées")
+            return
+        transactions = self.modele.objects.filter(
+            statut='successful', date_creation__gte=debut, date_creation__lte=fin
+        ).values_list('id', 'external_id', 'montant', 'statut', 'paiement_pass__statut', self.champ_reference)
+        for *transaction, reference in transactions.iterator(chunk_size=self.config['CHUNK_LINES']):
+            if transaction[0] not in self.rapprochees:
+                self._noter('absent_du_releve', {'reference': reference}, transaction)
+
+    def executer(self, fichier, debut=None, fin=None):
+        """
+        Rapproche le relevé ; debut/fin : période des absences (défaut : dates du relevé)
+        Retourne les compteurs par catégorie
+        """
+        taille = self.config['CHUNK_LINES']
+        lignes = []
+        for ligne in self._lire(fichier):
+            lignes.append(ligne)
+            if len(lignes) >= taille:
+                self._traiter_lot(lignes)
+                lignes = []
+        if lignes:
+            self._traiter_lot(lignes)
+
+        self._absentes_du_releve(debut or self.periode[0], fin or self.periode[1])
+        logger.info(f"🧾 Rapprochement {self.operateur}{' (simulation)' if self.simulation else ''}: {dict(self.compteurs)}")
+        return dict(self.compteurs)
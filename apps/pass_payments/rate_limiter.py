@@ -0,0 +1,153 @@
+# apps/pass_payments/rate_limiter.py
+
+"""
+Limiteur de débit distribué des appels sortants vers les opérateurs
+
+Un seau à jetons par (opérateur, opération) vit dans Redis et est partagé
+par gunicorn et Celery. Les priorités réservent une part du seau :
+    haute    - parcours client (borne) : peut vider le seau, attend un peu
+    normale  - traitements planifiés (cotisations) : laisse une réserve
+    basse    - balayage de fond (poller) : grosse réserve, n'attend jamais
+"""
+
+import logging
+import time
+
+from django.conf import settings
+
+from nsia_pass_api.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PRIORITE_HAUTE = 'haute'
+PRIORITE_NORMALE = 'normale'
+PRIORITE_BASSE = 'basse'
+
+# KEYS[1] = seau, KEYS[2] = statistiques
+# ARGV = capacité, jetons/seconde, réserve, priorité
+# Retourne {accordé, jetons restants (x1000), attente estimée en ms}
+SCRIPT_SEAU = """
+local capacite = tonumber(ARGV[1])
+local debit = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local maintenant = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local etat = redis.call('HMGET', KEYS[1], 'jetons', 'ts')
+local jetons = tonumber(etat[1]) or capacite
+local ts = tonumber(etat[2]) or maintenant
+jetons = math.min(capacite, jetons + (maintenant - ts) * debit / 1000)
+
+local accorde = 0
+local attente = 0
+if jetons - 1 >= reserve then
+    jetons = jetons - 1
+    accorde = 1
+    redis.call('HINCRBY', KEYS[2], 'accordes_' .. ARGV[4], 1)
+else
+    attente = math.ceil((reserve + 1 - jetons) * 1000 / debit)
+    redis.call('HINCRBY', KEYS[2], 'refuses_' .. ARGV[4], 1)
+end
+
+redis.call('HSET', KEYS[1], 'jetons', jetons, 'ts', maintenant)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacite * 1000 / debit) + 60000)
+redis.call('EXPIRE', KEYS[2], 86400)
+return {accorde, math.floor(jetons * 1000), attente}
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+    if _script is None:
+        _script = get_redis().register_script(SCRIPT_SEAU)
+    return _script
+
+
+def resultat_limite(operateur):
+    """Résultat de service renvoyé quand le limiteur refuse l'appel"""
+    return {
+        'success': False,
+        'error': f'Limite de débit {operateur} atteinte, réessayez plus tard',
+        'limite_debit': True
+    }
+
+
+class LimiteurOperateur:
+    """Seau à jetons d'une opération opérateur"""
+
+    def __init__(self, operateur, operation):
+        self.operateur = operateur
+        self.operation = operation
+        self.config = settings.OPERATOR_RATE_LIMITS
+        limites = self.config['BUCKETS'][operateur][operation]
+        self.capacite = limites['CAPACITY']
+        self.debit = limites['RATE']
+
+    @property
+    def cle(self):
+        return f"rl:{self.operateur}:{self.operation}"
+
+    @property
+    def cle_stats(self):
+        return f"rl:stats:{self.operateur}:{self.operation}"
+
+    def acquerir(self, priorite=PRIORITE_HAUTE):
+        """Consomme un jeton, en attendant au plus le délai permis par la priorité"""
+        if not self.config['ENABLED']:
+            return True
+
+        reserve = self.capacite * self.config['PRIORITY_RESERVE'][priorite]
+        attente_max = self.config['PRIORITY_MAX_WAIT_MS'][priorite]
+        echeance = time.monotonic() + attente_max / 1000
+
+        while True:
+            try:
+                accorde, _, attente = _get_script()(
+                    keys=[self.cle, self.cle_stats],
+                    args=[self.capacite, self.debit, reserve, priorite]
+                )
+            except Exception as e:
+                # Redis indisponible : on laisse passer plutôt que bloquer les paiements
+                logger.warning(f"Limiteur {self.cle} indisponible, appel autorisé: {e}")
+                return True
+
+            if accorde:
+                return True
+            if time.monotonic() + attente / 1000 > echeance:
+                return False
+            time.sleep(attente / 1000)
+
+    def instantane(self):
+        """Etat du seau et compteurs pour l'observabilité"""
+        try:
+            client = get_redis()
+            jetons, ts = client.hmget(self.cle, 'jetons', 'ts')
+            stats = client.hgetall(self.cle_stats)
+        except Exception as e:
+            return {'operateur': self.operateur, 'operation': self.operation, 'erreur': str(e)}
+
+        if jetons is not None:
+            ecoule_ms = time.time() * 1000 - float(ts)
+            jetons = min(self.capacite, float(jetons) + max(ecoule_ms, 0) * self.debit / 1000)
+        else:
+            jetons = self.capacite
+
+        return {
+            'operateur': self.operateur,
+            'operation': self.operation,
+            'capacite': self.capacite,
+            'jetons_par_seconde': self.debit,
+            'jetons_disponibles': round(jetons, 2),
+            'compteurs': {k.decode(): int(v) for k, v in stats.items()},
+        }
+
+
+def etat_limiteurs():
+    """Instantané de tous les seaux configurés"""
+    return [
+        LimiteurOperateur(operateur, operation).instantane()
+        for operateur, operations in settings.OPERATOR_RATE_LIMITS['BUCKETS'].items()
+        for operation in operations
+    ]
@@ -1,10 +1,52 @@
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Exists, F, JSONField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import JSONObject
 from django.utils import timezone
-from apps.pass_payments.models import PaiementPass
+from dateutil.relativedelta import relativedelta
+from apps.pass_payments.models import (
+    EcheanceCotisation, OutboxPaiement, PaiementPass, RenouvellementSouscription
+)
+from apps.pass_clients.models import SouscriptionPass
+from apps.mtn_integration.models import TransactionMTN
+from apps.airtel_integration.models import TransactionAirtel
 from apps.pass_clients.services import SouscriptionPassService
 import uuid
 from apps.mtn_integration.services import MTNMobileMoneyService
 from apps.airtel_integration.services import AirtelMoneyService
+from apps.pass_payments import archivage
+from apps.pass_payments.circuit_breaker import operateur_disponible
+from apps.pass_payments.rate_limiter import PRIORITE_BASSE, PRIORITE_HAUTE
+from nsia_pass_api.cache import STATUTS_PAIEMENTS
+from nsia_pass_api.redis_client import get_redis
+from redis import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+def payload_requete_operateur(montant, telephone, external_id):
+    """Données réellement envoyées à l'opérateur (et non tout request.data)"""
+    return {
+        'amount': montant,
+        'phone_number': telephone,
+        'external_id': external_id
+    }
+
+
+# Débits planifiés par la plateforme (et non demandés en borne)
+TYPES_PLANIFIES = ('cotisation', 'renouvellement')
+
+
+def dernier_paiement_reussi():
+    """Dernier paiement réussi de la souscription (OuterRef) : compte Mobile Money à débiter"""
+    return PaiementPass.objects.filter(
+        souscription_pass=OuterRef('pk'), statut='succes'
+    ).order_by('-date_confirmation', '-date_paiement')
 
 
 class PaiementPassService:
@@ -56,14 +98,13 @@ class PaiementPassService:
         paiement.date_comptabilisation = timezone.now()
         paiement.save()
         
-        # Activer la souscription
-        souscription_activee = SouscriptionPassService.activer_souscription(
-            paiement.souscription_pass.id
-        )
+        # Activer la souscription (tâche activer_souscriptions, après commit)
+        SouscriptionPassService.demander_activation(paiement.souscription_pass_id)
         
         return {
             'paiement': paiement,
-            'souscription': souscription_activee
+            'souscription': paiement.souscription_pass,
+            'activation_planifiee': True
         }
 
 
@@ -88,6 +129,11 @@ class PaymentServiceFactory:
         """Liste des opérateurs supportés"""
         return ['mtn_money', 'airtel_money']
     
+    @staticmethod
+    def is_operator_available(operateur):
+        """Vrai si le disjoncteur de l'opérateur autorise une initiation"""
+        return operateur_disponible(operateur.replace('_money', ''))
+    
     @staticmethod
     def detect_operator_from_phone(phone_number):
         """Détection automatique basée sur le préfixe (optionnel)"""
@@ -106,3 +152,690 @@ class PaymentServiceFactory:
                 return 'airtel_money'
                 
         return None  # Opérateur non détecté
+
+
+class StatutPaiementService:
+    """
+    Statut d'un paiement pour les bornes, servi depuis la base (tenue à jour
+    par les callbacks et le monitoring) derrière un cache court. Tant que le
+    paiement est en attente, une vérification opérateur est demandée en tâche
+    de fond, au plus une fois par transaction et par intervalle.
+    """
+    
+    # Statut local -> statut au format opérateur (compatibilité bornes)
+    STATUTS_OPERATEUR = {
+        'initiated': 'PENDING',
+        'pending': 'PENDING',
+        'successful': 'SUCCESSFUL',
+        'failed': 'FAILED',
+        'timeout': 'FAILED',
+        'cancelled': 'FAILED',
+    }
+    
+    MODELES_TRANSACTION = {
+        'mtn_money': (TransactionMTN, 'financial_transaction_id'),
+        'airtel_money': (TransactionAirtel, 'airtel_transaction_id'),
+    }
+    
+    # Réponse par lot : l'essentiel pour un tableau de bord
+    CHAMPS_COMPACTS = ('status', 'operateur', 'statut_paiement', 'reason', 'mis_a_jour')
+    
+    @staticmethod
+    def lire_etat(numero_transaction):
+        """Etat connu localement, None si inconnu"""
+        return StatutPaiementService.lire_etats([numero_transaction]).get(numero_transaction)
+    
+    @staticmethod
+    def lire_etats(numeros_transaction):
+        """
+        Etats connus localement en une seule requête : paiements filtrés par
+        numéro, transaction opérateur jointe par sous-requête (external_id)
+        Les transactions déjà archivées sont relues dans la table d'archive
+        (une requête par opérateur, seulement si nécessaire)
+        Retourne {numero_transaction: etat} ; les inconnus sont absents
+        """
+        sous_requetes = {
+            f"transaction_{operateur}": Subquery(
+                modele.objects.filter(external_id=OuterRef('numero_transaction')).values(
+                    donnees=JSONObject(
+                        statut='statut',
+                        status_reason='status_reason',
+                        reference=champ_reference,
+                        date_modification='date_modification',
+                    )
+                )[:1],
+                output_field=JSONField()
+            )
+            for operateur, (modele, champ_reference) in StatutPaiementService.MODELES_TRANSACTION.items()
+        }
+        paiements = PaiementPass.objects.filter(
+            numero_transaction__in=set(numeros_transaction),
+            operateur__in=list(StatutPaiementService.MODELES_TRANSACTION)
+        ).annotate(**sous_requetes).values(
+            'numero_transaction', 'operateur', 'statut', 'motif_echec', *sous_requetes
+        )
+        
+        etats = {}
+        archivees = {}
+        for paiement in paiements:
+            transaction_operateur = paiement[f"transaction_{paiement['operateur']}"]
+            if transaction_operateur is None:
+                archivees.setdefault(paiement['operateur'], []).append(paiement)
+                continue
+            etats[paiement['numero_transaction']] = StatutPaiementService._etat(paiement, transaction_operateur)
+        
+        # Transactions sorties de la table chaude (archivage) : lues dans l'archive
+        for operateur, paiements_archives in archivees.items():
+            modele, champ_reference = StatutPaiementService.MODELES_TRANSACTION[operateur]
+            transactions = archivage.transactions_archivees(
+                modele, champ_reference, [paiement['numero_transaction'] for paiement in paiements_archives]
+            )
+            for paiement in paiements_archives:
+                transaction_operateur = transactions.get(paiement['numero_transaction'])
+                if transaction_operateur is not None:
+                    etats[paiement['numero_transaction']] = StatutPaiementService._etat(paiement, transaction_operateur)
+        return etats
+    
+    @staticmethod
+    def _etat(paiement, transaction_operateur):
+        # Le paiement fait foi une fois conclu (callback, balayage)
+        if paiement['statut'] == 'succes':
+            statut = 'SUCCESSFUL'
+        elif paiement['statut'] in ('echec', 'expire'):
+            statut = 'FAILED'
+        else:
+            statut = StatutPaiementService.STATUTS_OPERATEUR.get(transaction_operateur['statut'], 'PENDING')
+        
+        return {
+            'success': True,
+            'status': statut,
+            'numero_transaction': paiement['numero_transaction'],
+            'operateur': paiement['operateur'],
+            'statut_paiement': paiement['statut'],
+            'statut_transaction': transaction_operateur['statut'],
+            'reason': transaction_operateur['status_reason'] or paiement['motif_echec'] or None,
+            'reference_operateur': transaction_operateur['reference'] or None,
+            # Horodatage sérialisé par PostgreSQL, normalisé au format Python
+            'mis_a_jour': datetime.fromisoformat(transaction_operateur['date_modification']).isoformat(),
+        }
+    
+    @staticmethod
+    def statut(numero_transaction):
+        """Statut pour la borne, None si la transaction est inconnue"""
+        etat = STATUTS_PAIEMENTS.get(numero_transaction)
+        source = 'cache'
+        if etat is None:
+            etat = StatutPaiementService.lire_etat(numero_transaction)
+            if etat is None:
+                return None
+            STATUTS_PAIEMENTS.set(numero_transaction, etat)
+            source = 'base'
+        
+        if etat['status'] == 'PENDING':
+            StatutPaiementService.demander_rafraichissement(etat)
+        
+        return {**etat, 'source': source}
+    
+    @staticmethod
+    def statuts(numeros_transaction, rafraichir=False):
+        """
+        Statuts d'un lot de transactions (back-office, contrôleur des bornes)
+        en une requête, au format compact. Avec rafraichir, une vérification
+        opérateur coalescée est demandée pour les paiements en attente dont
+        l'état n'a pas bougé depuis l'intervalle de rafraîchissement.
+        """
+        etats = StatutPaiementService.lire_etats(numeros_transaction)
+        limite = timezone.now() - timedelta(seconds=settings.PAYMENT_STATUS_REFRESH_SECONDS)
+        
+        statuts = {}
+        rafraichissements = 0
+        for numero_transaction, etat in etats.items():
+            statuts[numero_transaction] = {
+                champ: etat[champ] for champ in StatutPaiementService.CHAMPS_COMPACTS
+            }
+            if (
+                rafraichir
+                and etat['status'] == 'PENDING'
+                and datetime.fromisoformat(etat['mis_a_jour']) < limite
+            ):
+                rafraichissements += StatutPaiementService.demander_rafraichissement(etat)
+        
+        return {
+            'statuts': statuts,
+            'inconnus': [numero for numero in numeros_transaction if numero not in etats],
+            'rafraichissements': rafraichissements,
+        }
+    
+    @staticmethod
+    def demander_rafraichissement(etat):
+        """Vérification opérateur en tâche de fond, coalescée par transaction"""
+        if not etat['reference_operateur']:
+            return False
+        
+        cle = f"statut_paiement:rafraichissement:{etat['numero_transaction']}"
+        if not cache.add(cle, 1, settings.PAYMENT_STATUS_REFRESH_SECONDS):
+            return False
+        
+        from apps.pass_payments.tasks import rafraichir_statut_paiement
+        try:
+            rafraichir_statut_paiement.delay(etat['numero_transaction'])
+        except Exception as e:
+            # Broker indisponible : le monitoring périodique prendra le relais
+            logger.warning(f"Rafraîchissement {etat['numero_transaction']} non planifié: {e}")
+        return True
+    
+    @staticmethod
+    def invalider(numero_transaction):
+        STATUTS_PAIEMENTS.delete(numero_transaction)
+    
+    @staticmethod
+    def canal(numero_transaction):
+        """Canal Redis pub/sub suivi par le flux SSE de la borne"""
+        return f"statut_paiement:flux:{numero_transaction}"
+    
+    @staticmethod
+    def notifier(*numeros_transaction):
+        """
+        Invalide le cache et pousse le nouvel état aux bornes abonnées, après
+        commit (une borne ne doit jamais recevoir un état annulé)
+        """
+        if numeros_transaction:
+            transaction.on_commit(lambda: StatutPaiementService._publier(numeros_transaction))
+    
+    @staticmethod
+    def _publier(numeros_transaction):
+        for numero_transaction in numeros_transaction:
+            StatutPaiementService.invalider(numero_transaction)
+        
+        canaux = [StatutPaiementService.canal(numero) for numero in numeros_transaction]
+        publies = 0
+        try:
+            client = get_redis()
+            # Un seul aller-retour ; l'état n'est relu que pour les transactions suivies
+            abonnes = dict(client.pubsub_numsub(*canaux))
+            suivis = [
+                numero for numero, canal in zip(numeros_transaction, canaux)
+                if abonnes.get(canal.encode())
+            ]
+            if not suivis:
+                return 0
+            for numero_transaction, etat in StatutPaiementService.lire_etats(suivis).items():
+                STATUTS_PAIEMENTS.set(numero_transaction, etat)
+                client.publish(StatutPaiementService.canal(numero_transaction), json.dumps(etat))
+                publies += 1
+        except RedisError as e:
+            # Les flux retombent sur leur vérification périodique
+            logger.warning(f"Publication statut impossible: {e}")
+        return publies
+
+
+class InitiationPaiementService:
+    """
+    Initiation asynchrone d'un paiement opérateur (outbox transactionnelle)
+    
+    mettre_en_file() écrit la transaction opérateur 'initiated' et l'entrée
+    d'outbox dans la transaction du paiement ; la tâche
+    envoyer_paiement_operateur fait ensuite l'appel avec reprises. La clé
+    d'idempotence opérateur est fixée dès l'écriture : une reprise ne peut
+    pas débiter deux fois le client.
+    """
+    
+    @staticmethod
+    def mettre_en_file(paiement, message_payeur='', delai=0):
+        """
+        A appeler dans la transaction qui crée le paiement
+        delai : envoi différé (étalement des collectes de cotisations)
+        """
+        telephone = paiement.numero_payeur
+        requete = payload_requete_operateur(int(paiement.montant), telephone, paiement.numero_transaction)
+        
+        if paiement.operateur == 'mtn_money':
+            reference = str(uuid.uuid4())
+            TransactionMTN.objects.create(
+                external_id=paiement.numero_transaction,
+                paiement_pass=paiement,
+                type_transaction='request_to_pay',
+                montant=paiement.montant,
+                payer_msisdn=telephone.replace('+', '').replace(' ', ''),
+                financial_transaction_id=reference,
+                statut='initiated',
+                request_payload=requete
+            )
+        elif paiement.operateur == 'airtel_money':
+            # Airtel identifie la transaction par notre numéro
+            reference = paiement.numero_transaction
+            TransactionAirtel.objects.create(
+                external_id=paiement.numero_transaction,
+                paiement_pass=paiement,
+                type_transaction='debit_request',
+                montant=paiement.montant,
+                payer_msisdn=telephone.removeprefix('242'),
+                statut='initiated',
+                request_payload=requete
+            )
+        else:
+            raise ValueError(f"Opérateur non supporté: {paiement.operateur}")
+        
+        outbox = OutboxPaiement.objects.create(
+            paiement=paiement,
+            operateur=paiement.operateur,
+            reference_operateur=reference,
+            message_payeur=message_payeur[:160],
+            prochaine_tentative=timezone.now() + timedelta(seconds=delai)
+        )
+        transaction.on_commit(
+            lambda: InitiationPaiementService.planifier(outbox.id, delai, paiement.type_paiement)
+        )
+        return outbox
+    
+    @staticmethod
+    def planifier(outbox_id, delai=0, type_paiement=None):
+        from apps.pass_payments.tasks import envoyer_paiement_operateur
+        # Les débits planifiés ne passent pas devant les bornes
+        options = {'queue': 'cotisations'} if type_paiement in TYPES_PLANIFIES else {}
+        try:
+            envoyer_paiement_operateur.apply_async((outbox_id,), countdown=delai, **options)
+        except Exception as e:
+            # Broker indisponible : la relance périodique reprendra l'entrée
+            logger.warning(f"Envoi outbox {outbox_id} non planifié: {e}")
+    
+    @staticmethod
+    def envoyer(outbox):
+        """Appel opérateur d'une entrée d'outbox, au format des services opérateurs"""
+        paiement = outbox.paiement
+        montant = int(paiement.montant)
+        # Débit planifié : jetons laissés en priorité aux paiements en borne
+        priorite = PRIORITE_BASSE if paiement.type_paiement in TYPES_PLANIFIES else PRIORITE_HAUTE
+        
+        if outbox.operateur == 'mtn_money':
+            return MTNMobileMoneyService().request_to_pay(
+                amount=montant,
+                phone_number=paiement.numero_payeur,
+                external_id=paiement.numero_transaction,
+                payer_message=outbox.message_payeur or 'Paiement NSIA PASS',
+                priorite=priorite,
+                reference_id=outbox.reference_operateur
+            )
+        
+        service = AirtelMoneyService()
+        if outbox.tentatives > 1:
+            # Reprise : la demande précédente a pu aboutir sans réponse reçue
+            existante = service.check_payment_status(outbox.reference_operateur, priorite=priorite)
+            if existante.get('success') and not existante.get('introuvable'):
+                return {'success': True, 'data': {}, 'deja_envoye': True}
+        return service.debit_request(
+            amount=montant,
+            phone_number=paiement.numero_payeur,
+            external_id=paiement.numero_transaction,
+            priorite=priorite
+        )
+    
+    @staticmethod
+    def mettre_en_file_debit(element, type_paiement, commentaires, message_payeur, delai):
+        """
+        Paiement d'une échéance ou d'un renouvellement (souscription chargée,
+        montant, operateur, numero_payeur), mis en file dans l'outbox
+        """
+        paiement = PaiementPass.objects.create(
+            souscription_pass_id=element.souscription_id,
+            client_id=element.souscription.client_id,
+            montant=element.montant,
+            frais_transaction=0,
+            operateur=element.operateur,
+            numero_payeur=element.numero_payeur,
+            type_paiement=type_paiement,
+            statut='en_cours',
+            commentaires=commentaires
+        )
+        InitiationPaiementService.mettre_en_file(paiement, message_payeur=message_payeur, delai=delai)
+        return paiement
+    
+    @staticmethod
+    def echec_transitoire(resultat):
+        """
+        Vrai si une nouvelle tentative peut réussir : opérateur indisponible,
+        quota, erreur réseau, HTTP 429 ou 5xx. Jeton absent, configuration ou
+        exception applicative : échec définitif
+        """
+        if resultat.get('operateur_indisponible') or resultat.get('limite_debit') or resultat.get('erreur_reseau'):
+            return True
+        code = resultat.get('status_code')
+        return code is not None and (code == 429 or code >= 500)
+
+
+class CotisationService:
+    """
+    Collecte des cotisations périodiques (souscriptions hebdomadaires à annuelles)
+    
+    1. generer_echeances() écrit à l'avance les échéances de l'horizon,
+       en masse et de façon rejouable (contrainte souscription/rang)
+       Première génération d'une souscription : aucune période passée (déjà
+       collectée en agence), départ à la première échéance à partir
+       d'aujourd'hui et postérieure à la dernière cotisation payée
+    2. collecter() réserve les échéances dues d'un opérateur (SKIP LOCKED),
+       crée les paiements 'cotisation' et les met en file dans l'outbox,
+       envois étalés sur la minute et plafonnés par opérateur
+    3. solder() reporte le résultat des paiements sur les échéances et
+       remet les échecs en collecte jusqu'à épuisement des tentatives
+    
+    Tout l'état est en base : un passage interrompu est repris au suivant.
+    """
+    
+    PERIODES = {
+        'hebdomadaire': relativedelta(weeks=1),
+        'mensuelle': relativedelta(months=1),
+        'trimestrielle': relativedelta(months=3),
+        'annuelle': relativedelta(years=1),
+    }
+    # Durée maximale d'une période : minorant du rang d'une date
+    JOURS_MAX = {'hebdomadaire': 7, 'mensuelle': 31, 'trimestrielle': 92, 'annuelle': 366}
+    
+    @staticmethod
+    def premier_rang(periodicite, debut, depart):
+        """Rang de la première échéance à partir de `depart` (au moins 1)"""
+        periode = CotisationService.PERIODES[periodicite]
+        rang = max(1, (depart - debut).days // CotisationService.JOURS_MAX[periodicite])
+        while debut + periode * rang < depart:
+            rang += 1
+        return rang
+    
+    @staticmethod
+    def generer_echeances(horizon=None):
+        """Echéances jusqu'à l'horizon (défaut : HORIZON_DAYS), retourne le nombre créé"""
+        config = settings.COTISATIONS
+        aujourd_hui = timezone.localdate()
+        horizon = horizon or aujourd_hui + timedelta(days=config['HORIZON_DAYS'])
+        
+        dernier_paiement = dernier_paiement_reussi()
+        derniere_cotisation = PaiementPass.objects.filter(
+            souscription_pass=OuterRef('pk'), statut='succes', type_paiement='cotisation'
+        ).order_by('-date_paiement')
+        souscriptions = SouscriptionPass.objects.filter(
+            statut='activee',
+            periodicite__in=CotisationService.PERIODES,
+            date_activation__isnull=False
+        ).annotate(
+            dernier_rang=Max('echeances__rang'),
+            operateur_debit=Subquery(dernier_paiement.values('operateur')[:1]),
+            numero_debit=Subquery(dernier_paiement.values('numero_payeur')[:1]),
+            derniere_cotisation=Subquery(derniere_cotisation.values('date_paiement')[:1])
+        ).filter(
+            operateur_debit__in=['mtn_money', 'airtel_money']
+        ).values(
+            'id', 'periodicite', 'date_activation', 'date_expiration', 'montant_souscription',
+            'dernier_rang', 'operateur_debit', 'numero_debit', 'derniere_cotisation'
+        )
+        
+        lot, creees = [], 0
+        for souscription in souscriptions.iterator(chunk_size=config['BATCH_SIZE'] * 10):
+            periode = CotisationService.PERIODES[souscription['periodicite']]
+            # Dates calculées depuis l'activation : pas de dérive en fin de mois
+            debut = timezone.localtime(souscription['date_activation']).date()
+            if souscription['dernier_rang'] is not None:
+                rang = souscription['dernier_rang'] + 1
+            else:
+                depart = aujourd_hui
+                if souscription['derniere_cotisation']:
+                    payee_le = timezone.localtime(souscription['derniere_cotisation']).date()
+                    depart = max(depart, payee_le + timedelta(days=1))
+                rang = CotisationService.premier_rang(souscription['periodicite'], debut, depart)
+            # Plafond par passage : un retard de génération n'est pas rattrapé d'un coup
+            rang_max = rang + config['MAX_PERIODS_PER_RUN'] - 1
+            while rang <= rang_max:
+                date_echeance = debut + periode * rang
+                if date_echeance > horizon or (
+                    souscription['date_expiration'] and date_echeance >= souscription['date_expiration']
+                ):
+                    break
+                lot.append(EcheanceCotisation(
+                    souscription_id=souscription['id'],
+                    rang=rang,
+                    date_echeance=date_echeance,
+                    montant=souscription['montant_souscription'],
+                    operateur=souscription['operateur_debit'],
+                    numero_payeur=souscription['numero_debit']
+                ))
+                rang += 1
+            
+            if len(lot) >= config['BATCH_SIZE'] * 10:
+                creees += len(EcheanceCotisation.objects.bulk_create(lot, ignore_conflicts=True))
+                lot = []
+        
+        if lot:
+            creees += len(EcheanceCotisation.objects.bulk_create(lot, ignore_conflicts=True))
+        return creees
+    
+    @staticmethod
+    def collecter(operateur, limite):
+        """
+        Met en file au plus `limite` débits dus pour l'opérateur, par lots
+        courts ; les envois sont étalés sur une minute
+        """
+        config = settings.COTISATIONS
+        maintenant = timezone.now()
+        dues = EcheanceCotisation.objects.filter(
+            Q(prochaine_tentative__isnull=True) | Q(prochaine_tentative__lte=maintenant),
+            statut='a_collecter',
+            operateur=operateur,
+            date_echeance__lte=timezone.localdate(),
+            souscription__statut='activee'
+        ).order_by('date_echeance', 'id')
+        
+        mises_en_file = 0
+        while mises_en_file < limite:
+            taille = min(config['BATCH_SIZE'], limite - mises_en_file)
+            with transaction.atomic():
+                # Plusieurs collecteurs peuvent tourner : chacun prend des lignes différentes
+                echeances = list(
+                    dues.select_for_update(skip_locked=True, of=('self',))
+                    .select_related('souscription')[:taille]
+                )
+                for echeance in echeances:
+                    echeance.paiement = InitiationPaiementService.mettre_en_file_debit(
+                        echeance, 'cotisation',
+                        commentaires=f"Cotisation du {echeance.date_echeance:%d/%m/%Y}",
+                        message_payeur=f"Cotisation NSIA PASS {echeance.souscription.numero_souscription}",
+                        delai=round(60 * mises_en_file / limite, 2)
+                    )
+                    echeance.statut = 'en_collecte'
+                    echeance.tentatives += 1
+                    echeance.date_modification = maintenant
+                    mises_en_file += 1
+                EcheanceCotisation.objects.bulk_update(
+                    echeances, ['paiement', 'statut', 'tentatives', 'date_modification']
+                )
+            if len(echeances) < taille:
+                break
+        
+        return mises_en_file
+    
+    @staticmethod
+    def solder():
+        """Résultat des paiements reporté sur les échéances (UPDATE ensemblistes)"""
+        config = settings.COTISATIONS
+        maintenant = timezone.now()
+        en_collecte = EcheanceCotisation.objects.filter(statut='en_collecte')
+        echouees = en_collecte.filter(paiement__statut__in=['echec', 'expire'])
+        
+        resultat = {
+            'payees': en_collecte.filter(paiement__statut='succes').update(
+                statut='payee', date_modification=maintenant
+            ),
+            'a_reprendre': echouees.filter(tentatives__lt=config['MAX_ATTEMPTS']).update(
+                statut='a_collecter',
+                prochaine_tentative=maintenant + timedelta(hours=config['RETRY_HOURS']),
+                date_modification=maintenant
+            ),
+            'impayees': echouees.update(statut='impayee', date_modification=maintenant),
+            # Souscription résiliée ou expirée entre la génération et la collecte
+            'annulees': EcheanceCotisation.objects.filter(
+                statut='a_collecter',
+                souscription__statut__in=['annulee', 'expiree', 'convertie_en_contrat']
+            ).update(statut='annulee', date_modification=maintenant),
+        }
+        return resultat
+
+
+class RenouvellementService:
+    """
+    Renouvellement des souscriptions à paiement unique arrivant à expiration
+    (les souscriptions périodiques sont couvertes par les cotisations)
+    
+    1. generer() pré-génère chaque nuit les renouvellements des LEAD_DAYS
+       prochains jours ; chaque souscription reçoit une date de traitement
+       stable, répartie sur SPREAD_DAYS jours et sur la plage horaire
+    2. traiter() met en file les paiements 'renouvellement' dus, au plus
+       PAYMENTS_PER_MINUTE par passage
+    3. solder() prolonge les souscriptions payées (réactivées si elles ont
+       expiré entre-temps) et reprogramme les échecs
+    """
+    
+    @staticmethod
+    def date_planifiee(souscription_id, date_expiration, aujourd_hui):
+        """Date de traitement déterministe : même souscription, même créneau"""
+        config = settings.SUBSCRIPTION_RENEWAL
+        jour = max(
+            date_expiration - timedelta(days=config['LEAD_DAYS'] - souscription_id % config['SPREAD_DAYS']),
+            aujourd_hui
+        )
+        plage = (config['WINDOW_END_HOUR'] - config['WINDOW_START_HOUR']) * 3600
+        debut = timezone.make_aware(datetime(jour.year, jour.month, jour.day, config['WINDOW_START_HOUR']))
+        # Dispersion par un multiplicateur premier : des identifiants consécutifs ne se suivent pas
+        return debut + timedelta(seconds=souscription_id * 7919 % plage)
+    
+    @staticmethod
+    def generer():
+        """Renouvellements des souscriptions expirant dans LEAD_DAYS jours, retourne le nombre créé"""
+        config = settings.SUBSCRIPTION_RENEWAL
+        aujourd_hui = timezone.localdate()
+        dernier_paiement = dernier_paiement_reussi()
+        
+        souscriptions = SouscriptionPass.objects.filter(
+            statut='activee',
+            # Souscriptions périodiques : déjà payées par échéances (CotisationService)
+            periodicite='unique',
+            date_expiration__gte=aujourd_hui,
+            date_expiration__lte=aujourd_hui + timedelta(days=config['LEAD_DAYS'])
+        ).exclude(
+            Exists(RenouvellementSouscription.objects.filter(
+                souscription=OuterRef('pk'), date_expiration=OuterRef('date_expiration')
+            ))
+        ).annotate(
+            operateur_debit=Subquery(dernier_paiement.values('operateur')[:1]),
+            numero_debit=Subquery(dernier_paiement.values('numero_payeur')[:1]),
+            duree=F('produit_pass__duree_validite_jours')
+        ).filter(
+            operateur_debit__in=['mtn_money', 'airtel_money']
+        ).values(
+            'id', 'date_expiration', 'montant_souscription', 'operateur_debit', 'numero_debit', 'duree'
+        )
+        
+        lot, creees = [], 0
+        for souscription in souscriptions.iterator(chunk_size=config['BATCH_SIZE'] * 10):
+            lot.append(RenouvellementSouscription(
+                souscription_id=souscription['id'],
+                date_expiration=souscription['date_expiration'],
+                nouvelle_expiration=souscription['date_expiration'] + timedelta(days=souscription['duree']),
+                montant=souscription['montant_souscription'],
+                operateur=souscription['operateur_debit'],
+                numero_payeur=souscription['numero_debit'],
+                date_planifiee=RenouvellementService.date_planifiee(
+                    souscription['id'], souscription['date_expiration'], aujourd_hui
+                )
+            ))
+            if len(lot) >= config['BATCH_SIZE'] * 10:
+                creees += len(RenouvellementSouscription.objects.bulk_create(lot, ignore_conflicts=True))
+                lot = []
+        
+        if lot:
+            creees += len(RenouvellementSouscription.objects.bulk_create(lot, ignore_conflicts=True))
+        return creees
+    
+    @staticmethod
+    def traiter(limite, operateurs):
+        """Met en file au plus `limite` paiements de renouvellement dus"""
+        config = settings.SUBSCRIPTION_RENEWAL
+        maintenant = timezone.now()
+        dus = RenouvellementSouscription.objects.filter(
+            statut='planifie',
+            date_planifiee__lte=maintenant,
+            operateur__in=operateurs,
+            souscription__statut__in=['activee', 'expiree']
+        ).order_by('date_planifiee', 'id')
+        
+        mis_en_file = 0
+        while mis_en_file < limite:
+            taille = min(config['BATCH_SIZE'], limite - mis_en_file)
+            with transaction.atomic():
+                renouvellements = list(
+                    dus.select_for_update(skip_locked=True, of=('self',))
+                    .select_related('souscription')[:taille]
+                )
+                for renouvellement in renouvellements:
+                    renouvellement.paiement = InitiationPaiementService.mettre_en_file_debit(
+                        renouvellement, 'renouvellement',
+                        commentaires=f"Renouvellement échéance {renouvellement.date_expiration:%d/%m/%Y}",
+                        message_payeur=f"Renouvellement NSIA PASS {renouvellement.souscription.numero_souscription}",
+                        delai=round(60 * mis_en_file / limite, 2)
+                    )
+                    renouvellement.statut = 'en_cours'
+                    renouvellement.tentatives += 1
+                    renouvellement.date_modification = maintenant
+                    mis_en_file += 1
+                RenouvellementSouscription.objects.bulk_update(
+                    renouvellements, ['paiement', 'statut', 'tentatives', 'date_modification']
+                )
+            if len(renouvellements) < taille:
+                break
+        
+        return mis_en_file
+    
+    @staticmethod
+    def solder():
+        """Résultat des paiements reporté sur les renouvellements et les souscriptions"""
+        config = settings.SUBSCRIPTION_RENEWAL
+        maintenant = timezone.now()
+        en_cours = RenouvellementSouscription.objects.filter(statut='en_cours')
+        
+        renouveles = 0
+        while True:
+            with transaction.atomic():
+                payes = list(
+                    en_cours.filter(paiement__statut='succes')
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .values_list('id', 'souscription_id', 'souscription__client_id')[:config['BATCH_SIZE']]
+                )
+                if not payes:
+                    break
+                ids = [renouvellement_id for renouvellement_id, _, _ in payes]
+                nouvelle_expiration = RenouvellementSouscription.objects.filter(
+                    id__in=ids, souscription=OuterRef('pk')
+                ).values('nouvelle_expiration')[:1]
+                SouscriptionPass.objects.filter(
+                    id__in=[souscription_id for _, souscription_id, _ in payes],
+                    statut__in=['activee', 'expiree']
+                ).update(
+                    statut='activee',
+                    date_expiration=Subquery(nouvelle_expiration),
+                    date_modification=maintenant
+                )
+                RenouvellementSouscription.objects.filter(id__in=ids).update(
+                    statut='renouvele', date_modification=maintenant
+                )
+                SouscriptionPassService.mettre_a_jour_compteurs_clients({client_id for _, _, client_id in payes})
+                renouveles += len(payes)
+        
+        echoues = en_cours.filter(paiement__statut__in=['echec', 'expire'])
+        return {
+            'renouveles': renouveles,
+            'a_reprendre': echoues.filter(tentatives__lt=config['MAX_ATTEMPTS']).update(
+                statut='planifie',
+                date_planifiee=maintenant + timedelta(hours=config['RETRY_HOURS']),
+                date_modification=maintenant
+            ),
+            'echecs': echoues.update(statut='echec', date_modification=maintenant),
+            'annules': RenouvellementSouscription.objects.filter(
+                statut='planifie',
+                souscription__statut__in=['annulee', 'suspendue', 'convertie_en_contrat']
+            ).update(statut='annule', date_modification=maintenant),
+        }
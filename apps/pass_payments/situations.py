@@ -0,0 +1,271 @@
+# apps/pass_payments/situations.py
+
+"""
+Calendrier des cotisations et arriérés par souscription
+
+Les souscriptions et leurs paiements réussis sont chargés en masse, par
+tranches d'identifiants, puis traités en colonnes NumPy : périodes
+commencées, montant attendu, montant payé, arriérés, ancienneté du retard et
+prochaine échéance, sans boucle Python par souscription. Le résultat est
+écrit dans situations_cotisations par upserts groupés.
+
+La période n (0 = souscription initiale) commence à activation + n périodes
+et est due dès son début. Les périodes mensuelles, trimestrielles et
+annuelles suivent le calendrier (31 janvier + 1 mois = 28/29 février) ;
+aucune période ne commence à partir de la date d'expiration.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max, Q
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from apps.pass_clients.models import SouscriptionPass
+
+from .models import PaiementPass, SituationCotisation
+
+logger = logging.getLogger(__name__)
+
+# Souscriptions dont les cotisations sont suivies
+STATUTS_SUIVIS = ('activee', 'suspendue', 'expiree')
+
+MOIS_PAR_PERIODE = {'mensuelle': 1, 'trimestrielle': 3, 'annuelle': 12}
+JOURS_PAR_PERIODE = {'hebdomadaire': 7}
+# 'unique' : une seule période, sans échéance suivante
+
+CHAMPS_SITUATION = [
+    'periodes_dues', 'montant_attendu', 'montant_paye', 'arrieres', 'avance',
+    'periodes_impayees', 'jours_retard', 'date_prochaine_echeance',
+    'date_dernier_paiement', 'date_calcul',
+]
+
+
+def _jours_dans_mois(mois):
+    return ((mois + 1).astype('datetime64[D]') - mois.astype('datetime64[D]')).astype(np.int64)
+
+
+def _jour_du_mois(dates):
+    """Jour du mois (0 pour le 1er)"""
+    return (dates - dates.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+
+
+def _ajouter_mois(dates, mois):
+    """dates + mois, jour ramené à la fin du mois si nécessaire"""
+    cible = dates.astype('datetime64[M]') + mois
+    jour = np.minimum(_jour_du_mois(dates), _jours_dans_mois(cible) - 1)
+    return cible.astype('datetime64[D]') + jour
+
+
+def debut_periode(activation, pas_mois, pas_jours, rang):
+    """Date de début de la période `rang` de chaque souscription"""
+    debut = activation + (rang * pas_jours).astype('timedelta64[D]')
+    mensuel = pas_mois > 0
+    debut[mensuel] = _ajouter_mois(activation[mensuel], rang[mensuel] * pas_mois[mensuel])
+    return debut
+
+
+def periodes_commencees(activation, pas_mois, pas_jours, date_ref):
+    """Nombre de périodes commencées au plus tard à date_ref (au moins 1)"""
+    periodes = np.ones(len(activation), dtype=np.int64)
+
+    hebdo = pas_jours > 0
+    periodes[hebdo] = (date_ref[hebdo] - activation[hebdo]).astype(np.int64) // pas_jours[hebdo] + 1
+
+    mensuel = pas_mois > 0
+    debut, fin = activation[mensuel], date_ref[mensuel]
+    mois = (fin.astype('datetime64[M]') - debut.astype('datetime64[M]')).astype(np.int64)
+    # Mois en cours pas encore atteint (jour d'activation borné à la fin du mois)
+    jour_atteint = np.minimum(_jour_du_mois(debut), _jours_dans_mois(fin.astype('datetime64[M]')) - 1)
+    mois -= _jour_du_mois(fin) < jour_atteint
+    periodes[mensuel] = mois // pas_mois[mensuel] + 1
+
+    return np.maximum(periodes, 1)
+
+
+def calculer(souscriptions, paiements, aujourd_hui):
+    """
+    Situation de chaque souscription, en colonnes
+
+    souscriptions : colonnes id (trié), periodicite, montant, activation, expiration
+    paiements : colonnes souscription_id, montant, date
+    Montants en centimes (int64), dates en datetime64[D] (NaT si absente)
+    """
+    ids = souscriptions['id']
+    pas_mois = np.array([MOIS_PAR_PERIODE.get(p, 0) for p in souscriptions['periodicite']], dtype=np.int64)
+    pas_jours = np.array([JOURS_PAR_PERIODE.get(p, 0) for p in souscriptions['periodicite']], dtype=np.int64)
+    recurrente = (pas_mois > 0) | (pas_jours > 0)
+    montant = souscriptions['montant']
+    activation = souscriptions['activation']
+    expiration = souscriptions['expiration']
+
+    # Aucune période ne commence à partir de l'expiration
+    aujourd_hui = np.datetime64(aujourd_hui, 'D')
+    date_ref = np.full(len(ids), aujourd_hui)
+    expiree = ~np.isnat(expiration) & (expiration <= aujourd_hui)
+    date_ref[expiree] = np.maximum(expiration[expiree] - 1, activation[expiree])
+    periodes = periodes_commencees(activation, pas_mois, pas_jours, date_ref)
+
+    # Paiements réussis agrégés par souscription (ceux d'une souscription non suivie sont ignorés)
+    index = np.searchsorted(ids, paiements['souscription_id'])
+    suivi = index < len(ids)
+    suivi[suivi] = ids[index[suivi]] == paiements['souscription_id'][suivi]
+    index = index[suivi]
+    paye = np.bincount(index, weights=paiements['montant'][suivi], minlength=len(ids)).astype(np.int64)
+    dernier_paiement = np.full(len(ids), np.datetime64('NaT'), dtype='datetime64[D]')
+    if len(index):
+        jours = paiements['date'][suivi].astype(np.int64)
+        derniers = np.full(len(ids), np.iinfo(np.int64).min)
+        np.maximum.at(derniers, index, jours)
+        avec_paiement = derniers != np.iinfo(np.int64).min
+        dernier_paiement[avec_paiement] = derniers[avec_paiement].astype('datetime64[D]')
+
+    attendu = periodes * montant
+    arrieres = np.maximum(attendu - paye, 0)
+    avance = np.maximum(paye - attendu, 0)
+    periodes_payees = np.divide(paye, montant, out=periodes.astype(np.float64), where=montant > 0)
+    periodes_payees = np.floor(periodes_payees).astype(np.int64)
+    periodes_impayees = np.where(arrieres > 0, np.maximum(periodes - periodes_payees, 1), 0)
+
+    # Retard compté depuis le début de la plus ancienne période impayée
+    premiere_impayee = debut_periode(activation, pas_mois, pas_jours, np.minimum(periodes_payees, periodes - 1))
+    jours_retard = np.where(arrieres > 0, (aujourd_hui - premiere_impayee).astype(np.int64), 0)
+
+    prochaine = debut_periode(activation, pas_mois, pas_jours, periodes)
+    prochaine[~recurrente | (~np.isnat(expiration) & (prochaine >= expiration))] = np.datetime64('NaT')
+
+    return {
+        'souscription_id': ids,
+        'periodes_dues': periodes,
+        'montant_attendu': attendu,
+        'montant_paye': paye,
+        'arrieres': arrieres,
+        'avance': avance,
+        'periodes_impayees': periodes_impayees,
+        'jours_retard': np.maximum(jours_retard, 0),
+        'date_prochaine_echeance': prochaine,
+        'date_dernier_paiement': dernier_paiement,
+    }
+
+
+def _centimes(montants):
+    return np.rint(np.array(montants, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _charger(filtre_souscriptions, filtre_paiements):
+    lignes = list(
+        SouscriptionPass.objects.filter(
+            filtre_souscriptions, statut__in=STATUTS_SUIVIS, date_activation__isnull=False
+        ).order_by('id').values_list(
+            'id', 'periodicite', 'montant_souscription', TruncDate('date_activation'), 'date_expiration'
+        )
+    )
+    ids, periodicites, montants, activations, expirations = zip(*lignes) if lignes else ([],) * 5
+    souscriptions = {
+        'id': np.array(ids, dtype=np.int64),
+        'periodicite': periodicites,
+        'montant': _centimes(montants),
+        'activation': np.array(activations, dtype='datetime64[D]'),
+        'expiration': np.array(expirations, dtype='datetime64[D]'),
+    }
+
+    lignes_paiements = list(
+        PaiementPass.objects.filter(filtre_paiements, statut='succes').values_list(
+            'souscription_pass_id', 'montant', TruncDate(Coalesce('date_confirmation', 'date_paiement'))
+        )
+    ) if ids else []
+    souscription_ids, montants, dates = zip(*lignes_paiements) if lignes_paiements else ([],) * 3
+    paiements = {
+        'souscription_id': np.array(souscription_ids, dtype=np.int64),
+        'montant': _centimes(montants),
+        'date': np.array(dates, dtype='datetime64[D]'),
+    }
+    return souscriptions, paiements
+
+
+def _enregistrer(colonnes, date_calcul):
+    taille_lot = settings.COTISATION_SITUATIONS['WRITE_BATCH']
+    valeurs = {nom: colonne.tolist() for nom, colonne in colonnes.items()}
+    situations = [
+        SituationCotisation(
+            souscription_id=valeurs['souscription_id'][i],
+            periodes_dues=valeurs['periodes_dues'][i],
+            montant_attendu=Decimal(valeurs['montant_attendu'][i]).scaleb(-2),
+            montant_paye=Decimal(valeurs['montant_paye'][i]).scaleb(-2),
+            arrieres=Decimal(valeurs['arrieres'][i]).scaleb(-2),
+            avance=Decimal(valeurs['avance'][i]).scaleb(-2),
+            periodes_impayees=valeurs['periodes_impayees'][i],
+            jours_retard=valeurs['jours_retard'][i],
+            date_prochaine_echeance=valeurs['date_prochaine_echeance'][i],
+            date_dernier_paiement=valeurs['date_dernier_paiement'][i],
+            date_calcul=date_calcul,
+        )
+        for i in range(len(valeurs['souscription_id']))
+    ]
+    SituationCotisation.objects.bulk_create(
+        situations,
+        batch_size=taille_lot,
+        update_conflicts=True,
+        unique_fields=['souscription'],
+        update_fields=CHAMPS_SITUATION
+    )
+    return len(situations)
+
+
+def recalculer(souscription_ids=None):
+    """
+    Recalcule les situations (toutes, ou celles des souscriptions données)
+    par tranches de CHUNK_SIZE souscriptions ; retourne le nombre écrit
+    """
+    taille = settings.COTISATION_SITUATIONS['CHUNK_SIZE']
+    date_calcul = timezone.now()
+    aujourd_hui = timezone.localdate()
+    total = 0
+
+    if souscription_ids is not None:
+        ids = sorted(souscription_ids)
+        for i in range(0, len(ids), taille):
+            tranche = ids[i:i + taille]
+            souscriptions, paiements = _charger(Q(id__in=tranche), Q(souscription_pass_id__in=tranche))
+            total += _enregistrer(calculer(souscriptions, paiements, aujourd_hui), date_calcul)
+        return total
+
+    dernier = 0
+    while True:
+        # Tranche d'identifiants contigus : paiements lus par l'index (souscription, statut)
+        bornes = list(
+            SouscriptionPass.objects.filter(id__gt=dernier).order_by('id').values_list('id', flat=True)[:taille]
+        )
+        if not bornes:
+            break
+        souscriptions, paiements = _charger(
+            Q(id__gte=bornes[0], id__lte=bornes[-1]),
+            Q(souscription_pass_id__gte=bornes[0], souscription_pass_id__lte=bornes[-1])
+        )
+        total += _enregistrer(calculer(souscriptions, paiements, aujourd_hui), date_calcul)
+        dernier = bornes[-1]
+
+    # Souscriptions sorties du suivi (annulées, converties) depuis le calcul précédent
+    SituationCotisation.objects.filter(date_calcul__lt=date_calcul).exclude(
+        souscription__statut__in=STATUTS_SUIVIS
+    ).delete()
+    return total
+
+
+def recalculer_incremental():
+    """Souscriptions dont un paiement a changé depuis le dernier calcul"""
+    dernier_calcul = SituationCotisation.objects.aggregate(dernier=Max('date_calcul'))['dernier']
+    if dernier_calcul is None:
+        return recalculer()
+
+    # Marge : paiements validés pendant le calcul précédent
+    depuis = dernier_calcul - timedelta(seconds=settings.COTISATION_SITUATIONS['INCREMENTAL_MARGIN_SECONDS'])
+    ids = set(
+        PaiementPass.objects.filter(date_modification__gte=depuis)
+        .values_list('souscription_pass_id', flat=True).distinct()
+    )
+    return recalculer(ids) if ids else 0
@@ -1,19 +1,141 @@
 # apps/pass_payments/tasks.py
 
+from collections import defaultdict
+
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.core.cache import cache
+from django.db.models import F, Q
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import PaiementPass
+from .models import OutboxPaiement, PaiementPass, PayloadOperateur
 from apps.mtn_integration.models import TransactionMTN
 from apps.airtel_integration.models import TransactionAirtel
 from apps.mtn_integration.services import MTNMobileMoneyService
 from apps.airtel_integration.services import AirtelMoneyService
 from apps.pass_clients.services import SouscriptionPassService
+from . import agregats, archivage, coherence, idempotence, situations
+from .circuit_breaker import DisjoncteurOperateur, FERME, OUVERT, operateur_disponible
+from .rate_limiter import PRIORITE_BASSE, PRIORITE_HAUTE
+from .services import (
+    CotisationService, InitiationPaiementService, RenouvellementService, StatutPaiementService
+)
 
 logger = get_task_logger(__name__)
 
+STATUTS_EN_ATTENTE = ['initiated', 'pending']
+TAILLE_LOT_BALAYAGE = 100
+
+class LotMiseAJour:
+    """
+    Modifications accumulées pendant un balayage, écrites par bulk_update
+    (une requête par table et par lot au lieu d'un save() par ligne)
+    """
+    
+    CHAMPS_TRANSACTION = ['statut', 'status_reason', 'payload_reponse', 'date_modification']
+    CHAMPS_PAIEMENT = ['statut', 'date_confirmation', 'code_confirmation', 'motif_echec', 'date_modification']
+    
+    def __init__(self):
+        self.transactions = []
+        self.paiements = []
+        self.activations = []
+    
+    def __len__(self):
+        return len(self.transactions)
+    
+    def transaction(self, transaction, reponse=None):
+        transaction.date_modification = timezone.now()
+        self.transactions.append((transaction, reponse))
+    
+    def paiement(self, paiement):
+        paiement.date_modification = timezone.now()
+        self.paiements.append(paiement)
+        if paiement.statut == 'succes' and paiement.type_paiement == 'souscription_initiale':
+            self.activations.append(paiement.souscription_pass_id)
+    
+    def appliquer(self):
+        """Écrit les modifications puis planifie l'activation des souscriptions payées"""
+        if not self.transactions and not self.paiements:
+            return 0
+        
+        avec_reponse = [(t, r) for t, r in self.transactions if r is not None]
+        payloads = PayloadOperateur.enregistrer_lot([r for _, r in avec_reponse])
+        for (t, _), payload in zip(avec_reponse, payloads):
+            t.payload_reponse = payload
+        
+        par_modele = defaultdict(list)
+        for t, _ in self.transactions:
+            par_modele[type(t)].append(t)
+        
+        with db_transaction.atomic():
+            for modele, lignes in par_modele.items():
+                modele.objects.bulk_update(lignes, self.CHAMPS_TRANSACTION)
+            if self.paiements:
+                PaiementPass.objects.bulk_update(self.paiements, self.CHAMPS_PAIEMENT)
+        
+        # Les bornes voient le nouveau statut sans attendre l'expiration du cache
+        StatutPaiementService.notifier(*[t.external_id for t, _ in self.transactions])
+        
+        # Activation (police, statistiques) hors de la boucle de balayage
+        SouscriptionPassService.demander_activation(*self.activations)
+        
+        ecrites = len(self.transactions)
+        self.__init__()
+        return ecrites
+
+
+def transactions_a_verifier(modele, statuts=STATUTS_EN_ATTENTE, **filtres):
+    """
+    Transactions en attente (ou dans `statuts`, None pour tous) en projection
+    étroite : paiement joint (select_related), payloads et colonnes inutiles
+    non chargés
+    """
+    champ_reference = 'financial_transaction_id' if modele is TransactionMTN else 'airtel_transaction_id'
+    if statuts is not None:
+        filtres['statut__in'] = statuts
+    return modele.objects.filter(**filtres).select_related('paiement_pass').only(
+        'id', 'external_id', champ_reference, 'statut', 'status_reason',
+        'date_creation', 'date_modification', 'payload_reponse',
+        'paiement_pass', 'paiement_pass__statut', 'paiement_pass__type_paiement',
+        'paiement_pass__souscription_pass', 'paiement_pass__date_confirmation',
+        'paiement_pass__code_confirmation', 'paiement_pass__motif_echec',
+        'paiement_pass__date_modification',
+    )
+
+
+def _balayer(operateur, transactions, verifier):
+    """Vérifie les transactions d'un opérateur, écritures groupées par lot"""
+    disjoncteur = DisjoncteurOperateur(operateur, 'payment_status')
+    if disjoncteur.etat() == OUVERT:
+        logger.warning(f"⛔ {operateur} indisponible (disjoncteur ouvert) - balayage ignoré")
+        return 0, 0
+    
+    lot = LotMiseAJour()
+    verifiees = 0
+    mises_a_jour = 0
+    for transaction in transactions.iterator(chunk_size=TAILLE_LOT_BALAYAGE):
+        try:
+            if verifier(transaction, lot=lot):
+                mises_a_jour += 1
+            verifiees += 1
+        except Exception as e:
+            logger.error(f"❌ Erreur {operateur} {transaction.external_id}: {e}")
+        
+        if len(lot) >= TAILLE_LOT_BALAYAGE:
+            lot.appliquer()
+        
+        if disjoncteur.etat() != FERME:
+            logger.warning(f"⛔ {operateur} dégradé - fin anticipée du balayage")
+            break
+    
+    lot.appliquer()
+    logger.info(f"📱 {operateur}: {verifiees} transactions vérifiées")
+    return verifiees, mises_a_jour
+
+
 @shared_task(bind=True)
 def monitor_pending_payments(self):
     """
@@ -23,46 +145,20 @@ def monitor_pending_payments(self):
     try:
         logger.info("Début du monitoring des paiements en cours...")
         
-        # Compteurs
-        mtn_checked = 0
-        airtel_checked = 0
-        mtn_updated = 0
-        airtel_updated = 0
+        # Max 10 minutes : au-delà, le balayage des abandonnées prend le relais
+        depuis = timezone.now() - timedelta(minutes=10)
         
-        # Vérifier les transactions MTN en attente
-        pending_mtn = TransactionMTN.objects.filter(
-            statut__in=['initiated', 'pending'],
-            date_creation__gte=timezone.now() - timedelta(minutes=10)  # Max 10 minutes
+        mtn_checked, mtn_updated = _balayer(
+            'mtn',
+            transactions_a_verifier(TransactionMTN, date_creation__gte=depuis),
+            check_mtn_transaction_status
         )
-        
-        logger.info(f"📱 {pending_mtn.count()} transactions MTN à vérifier")
-        
-        for transaction in pending_mtn:
-            try:
-                updated = check_mtn_transaction_status(transaction)
-                if updated:
-                    mtn_updated += 1
-                mtn_checked += 1
-            except Exception as e:
-                logger.error(f"❌ Erreur MTN {transaction.external_id}: {e}")
-        
-        # Vérifier les transactions Airtel en attente
-        pending_airtel = TransactionAirtel.objects.filter(
-            statut__in=['initiated', 'pending'],
-            date_creation__gte=timezone.now() - timedelta(minutes=10)  # Max 10 minutes
+        airtel_checked, airtel_updated = _balayer(
+            'airtel',
+            transactions_a_verifier(TransactionAirtel, date_creation__gte=depuis),
+            check_airtel_transaction_status
         )
         
-        logger.info(f"📱 {pending_airtel.count()} transactions Airtel à vérifier")
-        
-        for transaction in pending_airtel:
-            try:
-                updated = check_airtel_transaction_status(transaction)
-                if updated:
-                    airtel_updated += 1
-                airtel_checked += 1
-            except Exception as e:
-                logger.error(f"❌ Erreur Airtel {transaction.external_id}: {e}")
-        
         # Log du résumé
         logger.info(
             f"Monitoring terminé - "
@@ -82,60 +178,60 @@ def monitor_pending_payments(self):
         logger.error(f"💥 Erreur générale monitoring: {e}")
         return {'success': False, 'error': str(e)}
 
-def check_mtn_transaction_status(transaction):
-    """Vérifie le statut d'une transaction MTN"""
+def check_mtn_transaction_status(transaction, lot=None, priorite=PRIORITE_BASSE, repondues=None):
+    """
+    Vérifie le statut d'une transaction MTN
+    Les écritures sont ajoutées au lot ; sans lot, elles sont appliquées aussitôt
+    repondues : ensemble complété par l'id si MTN a donné un statut (ou ne la connaît pas)
+    """
+    lot_local = lot is None
+    lot = LotMiseAJour() if lot_local else lot
     try:
         if not transaction.financial_transaction_id:
             logger.warning(f"⚠️ MTN {transaction.external_id}: Pas de financial_transaction_id")
             return False
         
         mtn_service = MTNMobileMoneyService()
-        result = mtn_service.check_payment_status(transaction.financial_transaction_id)
+        result = mtn_service.check_payment_status(
+            transaction.financial_transaction_id, priorite=priorite
+        )
         
         if not result.get('success'):
+            if result.get('status_code') == 404 and repondues is not None:
+                # Demande inconnue de MTN : elle ne pourra plus être payée
+                repondues.add(transaction.id)
             logger.warning(f"⚠️ MTN {transaction.external_id}: Impossible de vérifier le statut")
             return False
+        if repondues is not None:
+            repondues.add(transaction.id)
         
         mtn_status = result.get('status')
         previous_status = transaction.statut
+        paiement = transaction.paiement_pass
         
         # Mapper le statut MTN
         if mtn_status == 'SUCCESSFUL':
             transaction.statut = 'successful'
-            if transaction.paiement_pass:
-                paiement = transaction.paiement_pass
+            if paiement:
                 paiement.statut = 'succes'
                 paiement.date_confirmation = timezone.now()
                 paiement.code_confirmation = result.get('financial_transaction_id', '')
-                paiement.save()
-                
-                # ✅ NOUVEAU : Activer la souscription si paiement initial
-                if paiement.type_paiement == 'souscription_initiale':
-                    try:
-                        resultat_activation = SouscriptionPassService.activer_souscription(
-                            paiement.souscription_pass.id
-                        )
-                        logger.info(
-                            f"🎉 Souscription activée - Police: {resultat_activation['numero_police']}"
-                        )
-                    except Exception as e:
-                        logger.error(f"❌ Erreur activation souscription: {e}")
+                lot.paiement(paiement)
                 
         elif mtn_status == 'FAILED':
             transaction.statut = 'failed'
-            transaction.status_reason = result.get('reason', 'Paiement MTN échoué')
-            if transaction.paiement_pass:
-                transaction.paiement_pass.statut = 'echec'
-                transaction.paiement_pass.motif_echec = transaction.status_reason
-                transaction.paiement_pass.save()
+            transaction.status_reason = str(result.get('reason', 'Paiement MTN échoué'))[:100]
+            if paiement:
+                paiement.statut = 'echec'
+                paiement.motif_echec = transaction.status_reason
+                lot.paiement(paiement)
                 
         elif mtn_status == 'PENDING':
             transaction.statut = 'pending'
         
         # Sauvegarder si changement
         if transaction.statut != previous_status:
-            transaction.response_payload = result
-            transaction.save()
+            lot.transaction(transaction, reponse=result)
             logger.info(f"🔄 MTN {transaction.external_id}: {previous_status} → {transaction.statut}")
             return True
             
@@ -144,107 +240,68 @@ def check_mtn_transaction_status(transaction):
     except Exception as e:
         logger.error(f"❌ Erreur vérification MTN {transaction.external_id}: {e}")
         return False
+    
+    finally:
+        if lot_local:
+            lot.appliquer()
 
-# Dans apps/pass_payments/tasks.py - Debug encore plus détaillé
 
-def check_airtel_transaction_status(transaction):
-    """Vérifie le statut d'une transaction Airtel"""
+def check_airtel_transaction_status(transaction, fallback_timeout=True, lot=None, priorite=PRIORITE_BASSE,
+                                    repondues=None):
+    """
+    Vérifie le statut d'une transaction Airtel
+    fallback_timeout=False : pas de validation par timeout si l'API ne répond pas
+    Les écritures sont ajoutées au lot ; sans lot, elles sont appliquées aussitôt
+    repondues : ensemble complété par l'id si Airtel a donné un statut
+    """
+    lot_local = lot is None
+    lot = LotMiseAJour() if lot_local else lot
     try:
         if not transaction.airtel_transaction_id:
             logger.warning(f"⚠️ Airtel {transaction.external_id}: Pas d'airtel_transaction_id")
             return False
         
         airtel_service = AirtelMoneyService()
-        result = airtel_service.check_payment_status(transaction.airtel_transaction_id)
+        result = airtel_service.check_payment_status(
+            transaction.airtel_transaction_id, priorite=priorite
+        )
+        
+        if result.get('operateur_indisponible') or result.get('limite_debit'):
+            # Appel refusé localement (disjoncteur / limiteur) : ne rien conclure
+            return False
         
         if not result.get('success'):
             logger.warning(f"⚠️ Airtel {transaction.external_id}: API indisponible - {result.get('error')}")
-            return check_airtel_by_timeout(transaction)
+            return check_airtel_by_timeout(transaction, lot) if fallback_timeout else False
+        if repondues is not None:
+            repondues.add(transaction.id)
         
         airtel_status = result.get('status')
         previous_status = transaction.statut
+        paiement = transaction.paiement_pass
         
         if airtel_status == 'SUCCESSFUL':
-            logger.info(f"🎯 Mise à jour Airtel {transaction.external_id}: {previous_status} → successful")
-            
-            # ✅ ESSAYER UNE MISE À JOUR MINIMALE D'ABORD
-            try:
-                # Test 1: Juste le statut
-                logger.info("   Test 1: Mise à jour statut uniquement")
-                transaction.statut = 'successful'
-                transaction.save(update_fields=['statut'])
-                logger.info("   ✅ Statut mis à jour avec succès")
-                
-                # Test 2: Ajouter response_payload
-                logger.info("   Test 2: Ajout response_payload")
-                transaction.response_payload = result
-                transaction.save(update_fields=['response_payload'])
-                logger.info("   ✅ Response_payload mis à jour avec succès")
-                
-            except Exception as save_error:
-                logger.error(f"   ❌ Erreur lors de la sauvegarde: {save_error}")
-                
-                # Debug SQL si possible
-                logger.info("   🔍 Debug SQL détaillé:")
-                try:
-                    from django.db import connection
-                    logger.info(f"   Database: {connection.settings_dict}")
-                except:
-                    pass
-                
-                # Essayer sans response_payload
-                try:
-                    logger.info("   Test 3: Mise à jour sans response_payload")
-                    transaction.statut = 'successful'
-                    transaction.response_payload = None  # Enlever le JSON
-                    transaction.save()
-                    logger.info("   ✅ Sauvegarde sans response_payload réussie")
-                except Exception as minimal_error:
-                    logger.error(f"   ❌ Même erreur sans response_payload: {minimal_error}")
-                    
-                    # Essayer avec une transaction Django fraîche
-                    try:
-                        logger.info("   Test 4: Recharger depuis la DB")
-                        fresh_transaction = TransactionAirtel.objects.get(id=transaction.id)
-                        fresh_transaction.statut = 'successful'
-                        fresh_transaction.save()
-                        logger.info("   ✅ Sauvegarde avec objet rechargé réussie")
-                    except Exception as fresh_error:
-                        logger.error(f"   ❌ Erreur avec objet rechargé: {fresh_error}")
-                        return False
+            transaction.statut = 'successful'
+            lot.transaction(transaction, reponse=result)
             
-            # Mise à jour du paiement seulement si transaction mise à jour
-            if transaction.paiement_pass:
-                paiement = transaction.paiement_pass
+            if paiement:
                 paiement.statut = 'succes'
                 paiement.date_confirmation = timezone.now()
                 paiement.code_confirmation = transaction.airtel_transaction_id
-                paiement.save()
-                
-                # Activer la souscription si paiement initial
-                if paiement.type_paiement == 'souscription_initiale':
-                    try:
-                        resultat_activation = SouscriptionPassService.activer_souscription(
-                            paiement.souscription_pass.id
-                        )
-                        logger.info(
-                            f"🎉 Souscription Airtel activée - Police: {resultat_activation['numero_police']}"
-                        )
-                    except Exception as e:
-                        logger.error(f"❌ Erreur activation souscription Airtel: {e}")
+                lot.paiement(paiement)
             
-            logger.info(f"🔄 Airtel {transaction.external_id}: Mise à jour terminée avec succès")
+            logger.info(f"🔄 Airtel {transaction.external_id}: {previous_status} → successful")
             return True
                         
         elif airtel_status == 'FAILED':
             transaction.statut = 'failed'
-            transaction.status_reason = result.get('reason', 'Paiement Airtel échoué')[:190]  # Tronquer
-            transaction.save()
+            transaction.status_reason = result.get('reason', 'Paiement Airtel échoué')[:100]  # Tronquer
+            lot.transaction(transaction)
             
-            if transaction.paiement_pass:
-                transaction.paiement_pass.statut = 'echec'
-                transaction.paiement_pass.motif_echec = transaction.status_reason
-                transaction.paiement_pass.save()
+            if paiement:
+                paiement.statut = 'echec'
+                paiement.motif_echec = transaction.status_reason
+                lot.paiement(paiement)
                 
         elif airtel_status == 'PENDING':
             # Pas de changement nécessaire
@@ -254,10 +311,14 @@ def check_airtel_transaction_status(transaction):
         
     except Exception as e:
         logger.error(f"❌ Erreur vérification Airtel {transaction.external_id}: {e}")
-        return check_airtel_by_timeout(transaction)
+        return check_airtel_by_timeout(transaction, lot) if fallback_timeout else False
+    
+    finally:
+        if lot_local:
+            lot.appliquer()
 
 
-def check_airtel_by_timeout(transaction):
+def check_airtel_by_timeout(transaction, lot):
     """Logique de fallback basée sur le timeout (2 minutes minimum)"""
     time_elapsed = timezone.now() - transaction.date_creation
     previous_status = transaction.statut
@@ -267,27 +328,456 @@ def check_airtel_by_timeout(transaction):
         logger.info(f"⏰ Airtel {transaction.external_id}: Validation par timeout (API indisponible)")
         
         transaction.statut = 'successful'
-        if transaction.paiement_pass:
-            paiement = transaction.paiement_pass
+        lot.transaction(transaction)
+        
+        paiement = transaction.paiement_pass
+        if paiement:
             paiement.statut = 'succes'
             paiement.date_confirmation = timezone.now()
             paiement.code_confirmation = transaction.airtel_transaction_id
-            paiement.save()
-            
-            # Activer la souscription si paiement initial
-            if paiement.type_paiement == 'souscription_initiale':
-                try:
-                    resultat_activation = SouscriptionPassService.activer_souscription(
-                        paiement.souscription_pass.id
-                    )
-                    logger.info(
-                        f"🎉 Souscription Airtel activée (timeout) - Police: {resultat_activation['numero_police']}"
-                    )
-                except Exception as e:
-                    logger.error(f"❌ Erreur activation souscription Airtel: {e}")
+            lot.paiement(paiement)
         
-        transaction.save()
         logger.info(f"🔄 Airtel {transaction.external_id}: {previous_status} → {transaction.statut} (timeout)")
         return True
     
-    return False
\ No newline at end of file
+    return False
+
+@shared_task(bind=True)
+def rafraichir_statut_paiement(self, numero_transaction):
+    """
+    Vérification opérateur à la demande d'une borne (coalescée en amont :
+    au plus une par transaction et par intervalle)
+    """
+    try:
+        operateur = PaiementPass.objects.filter(
+            numero_transaction=numero_transaction
+        ).values_list('operateur', flat=True).first()
+        
+        if operateur == 'mtn_money':
+            transaction = transactions_a_verifier(TransactionMTN, external_id=numero_transaction).first()
+            verifier, options = check_mtn_transaction_status, {}
+        elif operateur == 'airtel_money':
+            transaction = transactions_a_verifier(TransactionAirtel, external_id=numero_transaction).first()
+            verifier, options = check_airtel_transaction_status, {'fallback_timeout': False}
+        else:
+            return {'success': False, 'error': 'Opérateur non reconnu'}
+        
+        # Déjà conclue entre-temps (callback, monitoring)
+        if transaction is None:
+            return {'success': True, 'modifie': False}
+        
+        modifie = verifier(transaction, priorite=PRIORITE_HAUTE, **options)
+        return {'success': True, 'modifie': modifie}
+        
+    except Exception as e:
+        logger.error(f"❌ Rafraîchissement statut {numero_transaction}: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+
+@shared_task(bind=True)
+def envoyer_paiement_operateur(self, outbox_id):
+    """
+    Envoie une demande de paiement mise en file par la vue (outbox)
+    Une seule exécution à la fois par entrée (bail) ; reprises avec backoff
+    exponentiel tant que l'échec est transitoire
+    """
+    config = settings.PAYMENT_OUTBOX
+    maintenant = timezone.now()
+    
+    # Réservation atomique : entrée due, ou bail d'un worker disparu expiré
+    reservee = OutboxPaiement.objects.filter(
+        id=outbox_id,
+        statut__in=['en_attente', 'envoi'],
+        prochaine_tentative__lte=maintenant
+    ).update(
+        statut='envoi',
+        tentatives=F('tentatives') + 1,
+        prochaine_tentative=maintenant + timedelta(seconds=config['LEASE_SECONDS'])
+    )
+    if not reservee:
+        return {'success': True, 'envoye': False}
+    
+    outbox = OutboxPaiement.objects.select_related('paiement').get(id=outbox_id)
+    numero_transaction = outbox.paiement.numero_transaction
+    try:
+        resultat = InitiationPaiementService.envoyer(outbox)
+    except Exception as e:
+        resultat = {'success': False, 'error': str(e)}
+    
+    if resultat.get('success'):
+        _outbox_envoyee(outbox, resultat)
+        logger.info(f"📤 {outbox.operateur} {numero_transaction}: demande envoyée (tentative {outbox.tentatives})")
+        return {'success': True, 'envoye': True}
+    
+    erreur = str(resultat.get('error') or 'Erreur opérateur')
+    if InitiationPaiementService.echec_transitoire(resultat) and outbox.tentatives < config['MAX_ATTEMPTS']:
+        delai = config['BACKOFF_SECONDS'] * 3 ** (outbox.tentatives - 1)
+        OutboxPaiement.objects.filter(id=outbox.id, statut='envoi').update(
+            statut='en_attente',
+            prochaine_tentative=timezone.now() + timedelta(seconds=delai),
+            derniere_erreur=erreur
+        )
+        InitiationPaiementService.planifier(outbox.id, delai, outbox.paiement.type_paiement)
+        logger.warning(f"🔁 {outbox.operateur} {numero_transaction}: {erreur} - reprise dans {delai}s")
+        return {'success': False, 'error': erreur, 'reprise_dans': delai}
+    
+    _outbox_en_echec(outbox, erreur)
+    logger.error(f"❌ {outbox.operateur} {numero_transaction}: envoi abandonné - {erreur}")
+    return {'success': False, 'error': erreur}
+
+
+def _outbox_envoyee(outbox, resultat):
+    """Transaction opérateur 'pending' (sauf si un callback l'a déjà conclue)"""
+    paiement = outbox.paiement
+    
+    with db_transaction.atomic():
+        if outbox.operateur == 'mtn_money':
+            transaction = TransactionMTN.objects.select_for_update().get(
+                external_id=paiement.numero_transaction
+            )
+            champs = ['response_payload', 'date_modification']
+        else:
+            transaction = TransactionAirtel.objects.select_for_update().get(
+                external_id=paiement.numero_transaction
+            )
+            donnees = resultat.get('data') or {}
+            transaction.airtel_transaction_id = (
+                (donnees.get('data') or {}).get('transaction', {}).get('id') or
+                donnees.get('transaction', {}).get('id') or
+                outbox.reference_operateur
+            )
+            paiement.reference_mobile_money = transaction.airtel_transaction_id
+            paiement.save(update_fields=['reference_mobile_money', 'date_modification'])
+            champs = ['airtel_transaction_id', 'response_payload', 'date_modification']
+        
+        if transaction.statut == 'initiated':
+            transaction.statut = 'pending'
+            champs.append('statut')
+        transaction.response_payload = resultat
+        transaction.save(update_fields=champs)
+        
+        OutboxPaiement.objects.filter(id=outbox.id).update(
+            statut='envoye', date_envoi=timezone.now(), derniere_erreur=''
+        )
+    
+    StatutPaiementService.notifier(paiement.numero_transaction)
+
+
+def _outbox_en_echec(outbox, erreur):
+    """Echec définitif : transaction et paiement en échec, la borne est notifiée"""
+    numero_transaction = outbox.paiement.numero_transaction
+    modele = TransactionMTN if outbox.operateur == 'mtn_money' else TransactionAirtel
+    
+    with db_transaction.atomic():
+        OutboxPaiement.objects.filter(id=outbox.id).update(statut='echec', derniere_erreur=erreur)
+        modele.objects.filter(external_id=numero_transaction, statut='initiated').update(
+            statut='failed', status_reason=erreur[:100], date_modification=timezone.now()
+        )
+        PaiementPass.objects.filter(numero_transaction=numero_transaction, statut='en_cours').update(
+            statut='echec', motif_echec=erreur, date_modification=timezone.now()
+        )
+    
+    StatutPaiementService.notifier(numero_transaction)
+
+
+@shared_task(bind=True)
+def relancer_outbox_paiements(self):
+    """
+    Replanifie les entrées d'outbox dont le message s'est perdu
+    (broker indisponible au commit, worker arrêté pendant l'envoi)
+    """
+    config = settings.PAYMENT_OUTBOX
+    limite = timezone.now() - timedelta(seconds=config['RELAUNCH_GRACE_SECONDS'])
+    
+    ids = list(
+        OutboxPaiement.objects.filter(
+            statut__in=['en_attente', 'envoi'],
+            prochaine_tentative__lte=limite
+        ).order_by('prochaine_tentative').values_list('id', 'paiement__type_paiement')[:config['RELAUNCH_BATCH']]
+    )
+    for outbox_id, type_paiement in ids:
+        InitiationPaiementService.planifier(outbox_id, type_paiement=type_paiement)
+    
+    if ids:
+        logger.warning(f"🔁 Outbox paiements: {len(ids)} entrées replanifiées")
+    return {'relancees': len(ids)}
+
+
+@shared_task(bind=True)
+def generer_echeances_cotisations(self):
+    """Génère les échéances de cotisation de l'horizon (rejouable)"""
+    creees = CotisationService.generer_echeances()
+    logger.info(f"🗓️ Cotisations: {creees} échéances générées")
+    return {'creees': creees}
+
+
+@shared_task(bind=True)
+def collecter_cotisations(self):
+    """
+    Passage de collecte : solde les débits terminés puis, dans la plage
+    horaire, met en file le quota de la minute pour chaque opérateur
+    """
+    config = settings.COTISATIONS
+    resultat = CotisationService.solder()
+    
+    heure = timezone.localtime().hour
+    if not config['WINDOW_START_HOUR'] <= heure < config['WINDOW_END_HOUR']:
+        return resultat
+    
+    for operateur, quota in config['DEBITS_PER_MINUTE'].items():
+        if not operateur_disponible(operateur.removesuffix('_money')):
+            # Opérateur en panne : les échéances attendent le passage suivant
+            logger.warning(f"⚡ Cotisations {operateur}: disjoncteur ouvert, collecte suspendue")
+            continue
+        resultat[operateur] = CotisationService.collecter(operateur, quota)
+    
+    if resultat.get('mtn_money') or resultat.get('airtel_money'):
+        logger.info(f"💳 Cotisations mises en file: {resultat}")
+    return resultat
+
+
+@shared_task(bind=True)
+def traiter_renouvellements(self):
+    """
+    Passage de renouvellement : prolonge les souscriptions payées puis, dans
+    la plage horaire, met en file le quota de la minute
+    """
+    config = settings.SUBSCRIPTION_RENEWAL
+    resultat = RenouvellementService.solder()
+    
+    heure = timezone.localtime().hour
+    if not config['WINDOW_START_HOUR'] <= heure < config['WINDOW_END_HOUR']:
+        return resultat
+    
+    # Opérateur en panne : ses renouvellements attendent le passage suivant
+    operateurs = [
+        operateur for operateur in ('mtn_money', 'airtel_money')
+        if operateur_disponible(operateur.removesuffix('_money'))
+    ]
+    resultat['mis_en_file'] = RenouvellementService.traiter(config['PAYMENTS_PER_MINUTE'], operateurs)
+    
+    if resultat['mis_en_file'] or resultat['renouveles']:
+        logger.info(f"🔄 Renouvellements: {resultat}")
+    return resultat
+
+
+@shared_task(bind=True)
+def recalculer_situations_cotisations(self, complet=False):
+    """
+    Attendu, payé et arriérés par souscription (table situations_cotisations)
+    Complet la nuit, incrémental (paiements modifiés) dans la journée
+    """
+    debut = timezone.now()
+    ecrites = situations.recalculer() if complet else situations.recalculer_incremental()
+    duree = (timezone.now() - debut).total_seconds()
+    logger.info(f"📊 Situations cotisations ({'complet' if complet else 'incrémental'}): {ecrites} en {duree:.1f}s")
+    return {'complet': complet, 'situations': ecrites, 'duree_s': round(duree, 1)}
+
+
+@shared_task(bind=True)
+def agreger_paiements(self, reconstruction=False):
+    """
+    Agrégats financiers journaliers (table agregats_paiements_journaliers)
+    Journées des paiements modifiés, ou les NIGHTLY_DAYS derniers jours la nuit
+    """
+    if reconstruction:
+        fin = timezone.localdate()
+        debut = fin - timedelta(days=settings.PAYMENT_ROLLUPS['NIGHTLY_DAYS'] - 1)
+        lignes = agregats.reconstruire(debut, fin)
+        logger.info(f"📊 Agrégats paiements reconstruits du {debut} au {fin}: {lignes} lignes")
+        return {'reconstruction': True, 'lignes': lignes}
+
+    jours, lignes = agregats.recalculer_incremental()
+    if jours:
+        logger.info(f"📊 Agrégats paiements: {jours} journées recalculées, {lignes} lignes")
+    return {'reconstruction': False, 'jours': jours, 'lignes': lignes}
+
+
+@shared_task(bind=True)
+def controler_coherence(self):
+    """
+    Cohérence paiements / transactions opérateurs / souscriptions
+    Anomalies comptées et corrigées par lots (voir coherence.py)
+    """
+    etat = coherence.controler(corriger=settings.CONSISTENCY_CHECK['REPAIR'])
+    logger.info(
+        f"🩺 Cohérence: {etat['anomalies']} anomalies, {etat['corrections']} corrections, "
+        f"{etat['planifications']} activations planifiées en {etat['duree_s']}s"
+    )
+    return etat
+
+
+def _mettre_a_jour_par_lots(queryset, taille_lot, **valeurs):
+    """
+    UPDATE ensembliste découpé en lots d'identifiants
+    Chaque lot est une requête courte : pas de verrou long sur la table
+    """
+    total = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:taille_lot])
+        if not ids:
+            return total
+        # Le filtre d'origine est réappliqué : une ligne modifiée entre-temps est ignorée
+        total += queryset.filter(id__in=ids).update(**valeurs)
+
+
+def _curseur_balayage(operateur):
+    """Dernière transaction vérifiée (date_creation, id), None : reprendre au début"""
+    try:
+        return cache.get(f"balayage:curseur:{operateur}")
+    except Exception as e:
+        logger.warning(f"Curseur de balayage {operateur} illisible: {e}")
+        return None
+
+
+def _enregistrer_curseur_balayage(operateur, curseur):
+    try:
+        if curseur is None:
+            cache.delete(f"balayage:curseur:{operateur}")
+        else:
+            cache.set(f"balayage:curseur:{operateur}", curseur, None)
+    except Exception as e:
+        logger.warning(f"Curseur de balayage {operateur} non enregistré: {e}")
+
+
+@shared_task(bind=True)
+def expirer_transactions_abandonnees(self):
+    """
+    Tâche périodique qui expire les transactions et paiements abandonnés
+    (plus vieux que STALE_AFTER_MINUTES, hors de portée du monitoring)
+    Exécutée toutes les 5 minutes
+    
+    Sans référence opérateur (demande jamais acceptée) ou paiement déjà en
+    échec : expirées directement, sans appel opérateur. Les autres sont
+    vérifiées par FINAL_CHECK_LIMIT, en reprenant après la dernière vérifiée
+    au passage précédent : une transaction restée sans réponse ne bloque pas
+    les suivantes.
+    """
+    try:
+        config = settings.PAYMENT_SWEEPER
+        maintenant = timezone.now()
+        limite = maintenant - timedelta(minutes=config['STALE_AFTER_MINUTES'])
+        rapport = {'success': True}
+        
+        operateurs = [
+            ('mtn', TransactionMTN, 'financial_transaction_id', check_mtn_transaction_status, {}),
+            ('airtel', TransactionAirtel, 'airtel_transaction_id', check_airtel_transaction_status,
+             {'fallback_timeout': False}),
+        ]
+        
+        for operateur, modele, champ_reference, verifier, options in operateurs:
+            abandonnees = modele.objects.filter(
+                statut__in=STATUTS_EN_ATTENTE,
+                date_creation__lt=limite
+            )
+            
+            # Rien à demander à l'opérateur (envoi encore en file dans l'outbox exclu)
+            sans_suite = abandonnees.filter(
+                Q(**{champ_reference: ''}) | Q(**{f'{champ_reference}__isnull': True})
+                | Q(paiement_pass__statut='echec')
+            ).exclude(paiement_pass__outbox__statut__in=['en_attente', 'envoi'])
+            expirees = _mettre_a_jour_par_lots(
+                sans_suite,
+                config['CHUNK_SIZE'],
+                statut='timeout',
+                status_reason='Abandonnée : demande non transmise ou paiement en échec',
+                date_modification=maintenant
+            )
+            
+            # Vérification finale avant expiration, des plus anciennes aux plus récentes,
+            # à partir du curseur ; les suivantes sont reportées au passage suivant
+            disjoncteur = DisjoncteurOperateur(operateur, 'payment_status')
+            verifiees = 0
+            repondues = set()
+            if disjoncteur.etat() == FERME:
+                candidates = transactions_a_verifier(modele, date_creation__lt=limite)
+                curseur = _curseur_balayage(operateur)
+                if curseur is not None:
+                    candidates = candidates.filter(
+                        Q(date_creation__gt=curseur[0]) | Q(date_creation=curseur[0], id__gt=curseur[1])
+                    )
+                candidates = list(candidates.order_by('date_creation', 'id')[:config['FINAL_CHECK_LIMIT']])
+                lot = LotMiseAJour()
+                for transaction in candidates:
+                    try:
+                        verifier(transaction, lot=lot, repondues=repondues, **options)
+                    except Exception as e:
+                        logger.error(f"❌ Vérification finale {operateur} {transaction.external_id}: {e}")
+                    verifiees += 1
+                    curseur = (transaction.date_creation, transaction.id)
+                    if disjoncteur.etat() != FERME:
+                        break
+                lot.appliquer()
+                # Fin de la file atteinte : le passage suivant repart des plus anciennes
+                fin_de_file = len(candidates) < config['FINAL_CHECK_LIMIT'] and verifiees == len(candidates)
+                _enregistrer_curseur_balayage(operateur, None if fin_de_file else curseur)
+            
+            # Opérateur dégradé : impossible de conclure, expiration reportée
+            if disjoncteur.etat() != FERME:
+                logger.warning(f"⛔ {operateur}: disjoncteur {disjoncteur.etat()} - expiration reportée")
+                rapport[operateur] = {'verifiees': verifiees, 'expirees': expirees, 'reportee': True}
+                continue
+            
+            # Seulement celles que l'opérateur a vues encore en attente (ou ne connaît pas)
+            expirees += _mettre_a_jour_par_lots(
+                abandonnees.filter(id__in=repondues),
+                config['CHUNK_SIZE'],
+                statut='timeout',
+                status_reason='Abandonnée : aucune réponse opérateur',
+                date_modification=maintenant
+            )
+            rapport[operateur] = {'verifiees': verifiees, 'expirees': expirees, 'reportee': False}
+        
+        # Paiements en cours sans transaction opérateur encore en attente
+        paiements = PaiementPass.objects.filter(
+            statut='en_cours',
+            date_paiement__lt=limite
+        ).exclude(
+            transactions_mtn__statut__in=STATUTS_EN_ATTENTE
+        ).exclude(
+            transactions_airtel__statut__in=STATUTS_EN_ATTENTE
+        )
+        rapport['paiements_expires'] = _mettre_a_jour_par_lots(
+            paiements,
+            config['CHUNK_SIZE'],
+            statut='expire',
+            motif_echec='Paiement abandonné : aucune confirmation opérateur',
+            date_modification=maintenant
+        )
+        
+        rapport['duree_s'] = round((timezone.now() - maintenant).total_seconds(), 2)
+        logger.info(
+            f"🧹 Balayage terminé - "
+            f"MTN: {rapport['mtn']['expirees']} expirées ({rapport['mtn']['verifiees']} vérifiées) | "
+            f"Airtel: {rapport['airtel']['expirees']} expirées ({rapport['airtel']['verifiees']} vérifiées) | "
+            f"Paiements: {rapport['paiements_expires']} expirés en {rapport['duree_s']}s"
+        )
+        return rapport
+        
+    except Exception as e:
+        logger.error(f"💥 Erreur générale balayage: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task(bind=True)
+def archiver_transactions_operateurs(self):
+    """
+    Tâche nocturne : déplace les transactions terminées hors de la fenêtre
+    chaude vers les archives mensuelles, puis applique la rétention
+    (partitions, payloads orphelins, clés d'idempotence expirées)
+    """
+    try:
+        rapport = {
+            'success': True,
+            'archives': [archivage.archiver(operateur) for operateur in archivage.ARCHIVES],
+            'partitions_supprimees': archivage.purger(),
+            'payloads_orphelins': archivage.purger_payloads_orphelins(),
+            'cles_idempotence_expirees': idempotence.purger_expirees(),
+        }
+        logger.info(f"🗄️ Archivage terminé: {rapport}")
+        return rapport
+        
+    except Exception as e:
+        logger.error(f"💥 Erreur archivage: {e}")
+        return {'success': False, 'error': str(e)}
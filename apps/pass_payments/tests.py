@@ -1,3 +1,591 @@
-from django.test import TestCase
+import gzip
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.mtn_integration.models import TransactionMTN
+from apps.mtn_integration.services import MTNMobileMoneyService
+from apps.pass_clients.models import ClientPass, SouscriptionPass
+from apps.pass_clients.services import SouscriptionPassService
+from apps.pass_payments.tasks import envoyer_paiement_operateur, expirer_transactions_abandonnees
+from apps.pass_payments import archivage, circuit_breaker, coherence, idempotence, rapprochement, situations
+from apps.pass_payments.circuit_breaker import DEMI_OUVERT, FERME, DisjoncteurOperateur
+from apps.pass_payments.models import (
+    EcheanceCotisation, OutboxPaiement, PaiementPass, PayloadOperateur, RenouvellementSouscription
+)
+from apps.pass_payments.idempotence import idempotent
+from apps.pass_payments.services import (
+    CotisationService, InitiationPaiementService, RenouvellementService, StatutPaiementService
+)
+from apps.pass_products.models import ProduitPass
+
+
+def creer_souscription(periodicite='mensuelle', activation_il_y_a=0, montant=1000, operateur='mtn_money'):
+    """Souscription activée avec son paiement initial réussi"""
+    produit, _ = ProduitPass.objects.get_or_create(
+        code_pass='TEST', defaults={'nom_pass': 'Test', 'description': 'Test', 'categorie': 'mixte'}
+    )
+    client = ClientPass.objects.create(
+        nom='Test', prenom='Client', telephone=f'+2420600{ClientPass.objects.count():05d}', adresse='Brazzaville'
+    )
+    souscription = SouscriptionPass.objects.create(
+        client=client, produit_pass=produit, montant_souscription=montant, periodicite=periodicite,
+        numero_souscription=f'TEST-{client.id}'
+    )
+    SouscriptionPass.objects.filter(id=souscription.id).update(
+        statut='activee', date_activation=timezone.now() - timedelta(days=activation_il_y_a)
+    )
+    PaiementPass.objects.create(
+        souscription_pass=souscription, client=client, montant=montant, operateur=operateur,
+        numero_payeur='+242060000000', type_paiement='souscription_initiale', statut='succes',
+        date_confirmation=timezone.now() - timedelta(days=activation_il_y_a)
+    )
+    souscription.refresh_from_db()
+    return souscription
+
+
+class CotisationServiceTests(TestCase):
+
+    def test_premiere_generation_sans_periodes_passees(self):
+        souscription = creer_souscription('hebdomadaire', activation_il_y_a=100)
+
+        CotisationService.generer_echeances()
+
+        dates = list(souscription.echeances.values_list('date_echeance', flat=True))
+        self.assertTrue(dates)
+        self.assertGreaterEqual(min(dates), timezone.localdate())
+
+    def test_premiere_generation_apres_derniere_cotisation_payee(self):
+        souscription = creer_souscription('hebdomadaire', activation_il_y_a=14)
+        PaiementPass.objects.create(
+            souscription_pass=souscription, client=souscription.client, montant=1000, operateur='mtn_money',
+            numero_payeur='+242060000000', type_paiement='cotisation', statut='succes'
+        )
+
+        CotisationService.generer_echeances()
+
+        # Echéance du jour (rang 2) déjà payée en agence
+        self.assertEqual(min(souscription.echeances.values_list('rang', flat=True)), 3)
+
+    @override_settings(COTISATIONS={**settings.COTISATIONS, 'HORIZON_DAYS': 60, 'MAX_PERIODS_PER_RUN': 3})
+    def test_plafond_par_passage(self):
+        souscription = creer_souscription('hebdomadaire')
+
+        self.assertEqual(CotisationService.generer_echeances(), 3)
+        self.assertEqual(CotisationService.generer_echeances(), 3)
+        self.assertEqual(souscription.echeances.count(), 6)
+
+    def test_generation_rejouable(self):
+        creer_souscription('mensuelle', activation_il_y_a=29)
+
+        self.assertEqual(CotisationService.generer_echeances(), 1)
+        self.assertEqual(CotisationService.generer_echeances(), 0)
+
+    def test_collecter_met_les_echeances_dues_en_file(self):
+        souscription = creer_souscription('mensuelle', activation_il_y_a=31)
+        echeance = EcheanceCotisation.objects.create(
+            souscription=souscription, rang=1, date_echeance=timezone.localdate(), montant=1000,
+            operateur='mtn_money', numero_payeur='+242060000000'
+        )
+        EcheanceCotisation.objects.create(
+            souscription=souscription, rang=2, date_echeance=timezone.localdate() + timedelta(days=30),
+            montant=1000, operateur='mtn_money', numero_payeur='+242060000000'
+        )
+
+        self.assertEqual(CotisationService.collecter('airtel_money', 10), 0)
+        self.assertEqual(CotisationService.collecter('mtn_money', 10), 1)
+
+        echeance.refresh_from_db()
+        self.assertEqual(echeance.statut, 'en_collecte')
+        self.assertEqual(echeance.tentatives, 1)
+        self.assertEqual(echeance.paiement.type_paiement, 'cotisation')
+        self.assertTrue(OutboxPaiement.objects.filter(paiement=echeance.paiement).exists())
+        # Echéance déjà en collecte : pas de second débit
+        self.assertEqual(CotisationService.collecter('mtn_money', 10), 0)
+
+    def test_solder(self):
+        souscription = creer_souscription('mensuelle', activation_il_y_a=31)
+        echeances = [
+            EcheanceCotisation.objects.create(
+                souscription=souscription, rang=rang, date_echeance=timezone.localdate(), montant=1000,
+                operateur='mtn_money', numero_payeur='+242060000000'
+            )
+            for rang in (1, 2, 3)
+        ]
+        CotisationService.collecter('mtn_money', 10)
+        payee, a_reprendre, impayee = [
+            EcheanceCotisation.objects.get(id=echeance.id) for echeance in echeances
+        ]
+        PaiementPass.objects.filter(id=payee.paiement_id).update(statut='succes')
+        PaiementPass.objects.filter(id__in=[a_reprendre.paiement_id, impayee.paiement_id]).update(statut='echec')
+        EcheanceCotisation.objects.filter(id=impayee.id).update(tentatives=3)
+
+        resultat = CotisationService.solder()
+
+        self.assertEqual((resultat['payees'], resultat['a_reprendre'], resultat['impayees']), (1, 1, 1))
+        a_reprendre.refresh_from_db()
+        self.assertEqual(a_reprendre.statut, 'a_collecter')
+        self.assertGreater(a_reprendre.prochaine_tentative, timezone.now())
+        # Nouvelle tentative seulement après RETRY_HOURS
+        self.assertEqual(CotisationService.collecter('mtn_money', 10), 0)
+        self.assertEqual(EcheanceCotisation.objects.get(id=impayee.id).statut, 'impayee')
+
+
+class RenouvellementTests(TestCase):
+
+    def test_souscriptions_periodiques_non_renouvelees(self):
+        unique = creer_souscription(periodicite='unique')
+        mensuelle = creer_souscription(periodicite='mensuelle')
+        SouscriptionPass.objects.update(date_expiration=timezone.localdate() + timedelta(days=3))
+
+        self.assertEqual(RenouvellementService.generer(), 1)
+        self.assertEqual(
+            list(RenouvellementSouscription.objects.values_list('souscription_id', flat=True)), [unique.id]
+        )
+        self.assertFalse(RenouvellementSouscription.objects.filter(souscription=mensuelle).exists())
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        souscription = creer_souscription()
+        self.paiement = PaiementPass.objects.create(
+            souscription_pass=souscription, client=souscription.client, montant=1000, operateur='mtn_money',
+            numero_payeur='+242060000000', statut='en_cours'
+        )
+        self.outbox = InitiationPaiementService.mettre_en_file(self.paiement)
+
+    def envoyer(self, resultat):
+        with mock.patch.object(MTNMobileMoneyService, 'request_to_pay', return_value=resultat) as appel, \
+                mock.patch.object(InitiationPaiementService, 'planifier') as planifier:
+            rapport = envoyer_paiement_operateur.apply(args=[self.outbox.id]).get()
+        return rapport, appel, planifier
+
+    def etat(self):
+        return OutboxPaiement.objects.get(id=self.outbox.id)
+
+    def test_reprise_puis_envoi_unique(self):
+        rapport, _, planifier = self.envoyer({'success': False, 'error': 'Service Unavailable', 'status_code': 503})
+        self.assertEqual(rapport['reprise_dans'], settings.PAYMENT_OUTBOX['BACKOFF_SECONDS'])
+        planifier.assert_called_once()
+        self.assertEqual((self.etat().statut, self.etat().tentatives), ('en_attente', 1))
+
+        # Message en double avant l'échéance de la reprise : aucun appel opérateur
+        rapport, appel, _ = self.envoyer({'success': True})
+        self.assertEqual(rapport, {'success': True, 'envoye': False})
+        appel.assert_not_called()
+
+        OutboxPaiement.objects.filter(id=self.outbox.id).update(prochaine_tentative=timezone.now())
+        rapport, appel, _ = self.envoyer({'success': True, 'reference_id': self.outbox.reference_operateur})
+        self.assertTrue(rapport['envoye'])
+        # Même X-Reference-Id à chaque tentative : dédupliqué côté opérateur
+        self.assertEqual(appel.call_args.kwargs['reference_id'], self.outbox.reference_operateur)
+        self.assertEqual(self.etat().statut, 'envoye')
+        self.assertEqual(TransactionMTN.objects.get(paiement_pass=self.paiement).statut, 'pending')
+
+        rapport, appel, _ = self.envoyer({'success': True})
+        self.assertFalse(rapport['envoye'])
+        appel.assert_not_called()
+
+    def test_erreur_reseau_reprise(self):
+        rapport, _, _ = self.envoyer({'success': False, 'error': 'Erreur technique', 'erreur_reseau': True})
+        self.assertIn('reprise_dans', rapport)
+        self.assertEqual(self.etat().statut, 'en_attente')
+
+    def test_echec_definitif(self):
+        rapport, _, planifier = self.envoyer({'success': False, 'error': 'Token Airtel non disponible'})
+        self.assertNotIn('reprise_dans', rapport)
+        planifier.assert_not_called()
+        self.assertEqual(self.etat().statut, 'echec')
+        self.assertEqual(PaiementPass.objects.get(id=self.paiement.id).statut, 'echec')
+        self.assertEqual(TransactionMTN.objects.get(paiement_pass=self.paiement).statut, 'failed')
+
+    def test_abandon_apres_max_tentatives(self):
+        OutboxPaiement.objects.filter(id=self.outbox.id).update(tentatives=settings.PAYMENT_OUTBOX['MAX_ATTEMPTS'] - 1)
+        self.envoyer({'success': False, 'error': 'Service Unavailable', 'status_code': 503})
+        self.assertEqual(self.etat().statut, 'echec')
+
+    def test_echec_transitoire(self):
+        transitoire = InitiationPaiementService.echec_transitoire
+        self.assertTrue(transitoire({'status_code': 429}))
+        self.assertTrue(transitoire({'status_code': 502}))
+        self.assertTrue(transitoire({'erreur_reseau': True}))
+        self.assertTrue(transitoire({'operateur_indisponible': True}))
+        self.assertFalse(transitoire({'status_code': 400}))
+        self.assertFalse(transitoire({'error': 'Token Airtel non disponible'}))
+        self.assertFalse(transitoire({'error': 'Erreur technique', 'erreur_reseau': False}))
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@idempotent('test')
+def vue_idempotente(request):
+    vue_idempotente.appels += 1
+    return Response({'success': True, 'appel': vue_idempotente.appels}, status=201)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IdempotenceTests(TestCase):
+
+    def setUp(self):
+        vue_idempotente.appels = 0
+        # Réponses enregistrées aussi dans le cache, partagé entre les tests
+        cache.clear()
+
+    def poster(self, donnees, cle='cle-1', utilisateur=None):
+        requete = APIRequestFactory().post('/', donnees, format='json', HTTP_IDEMPOTENCY_KEY=cle)
+        if utilisateur is not None:
+            force_authenticate(requete, user=utilisateur)
+        return vue_idempotente(requete)
+
+    def test_reprise_rejoue_la_premiere_reponse(self):
+        premiere = self.poster({'montant': 1000})
+        reprise = self.poster({'montant': 1000})
+
+        self.assertEqual(vue_idempotente.appels, 1)
+        self.assertEqual((reprise.status_code, reprise.data), (201, premiere.data))
+        self.assertEqual(reprise['Idempotent-Replayed'], 'true')
+
+    def test_cle_reutilisee_pour_une_autre_requete(self):
+        self.poster({'montant': 1000})
+        self.assertEqual(self.poster({'montant': 2000}).status_code, 422)
+        self.assertEqual(vue_idempotente.appels, 1)
+
+    def test_cle_propre_a_chaque_utilisateur(self):
+        borne_1 = User.objects.create_user('borne-1')
+        borne_2 = User.objects.create_user('borne-2')
+
+        premiere = self.poster({'montant': 1000}, utilisateur=borne_1)
+        autre_borne = self.poster({'montant': 1000}, utilisateur=borne_2)
+
+        self.assertEqual(vue_idempotente.appels, 2)
+        self.assertNotEqual(autre_borne.data, premiere.data)
+        self.assertNotIn('Idempotent-Replayed', autre_borne)
+        self.assertEqual(self.poster({'montant': 1000}, utilisateur=borne_1).data, premiere.data)
+
+    @override_settings(IDEMPOTENCY={**settings.IDEMPOTENCY, 'WAIT_SECONDS': 0})
+    def test_requete_concurrente_en_cours(self):
+        self.assertTrue(idempotence.reserver('test', 'cle-1', idempotence.empreinte_requete({'montant': 1000})))
+
+        reponse = self.poster({'montant': 1000})
+        self.assertEqual(reponse.status_code, 409)
+        self.assertEqual(reponse['Retry-After'], '5')
+        self.assertEqual(vue_idempotente.appels, 0)
+
+
+class SituationsTests(TestCase):
+
+    def test_calculer(self):
+        souscriptions = {
+            'id': np.array([1, 2, 3, 4]),
+            'periodicite': ('mensuelle', 'hebdomadaire', 'unique', 'mensuelle'),
+            'montant': np.array([100000, 50000, 200000, 100000]),
+            'activation': np.array(['2025-01-31', '2025-03-01', '2025-01-10', '2025-01-01'], dtype='datetime64[D]'),
+            'expiration': np.array(['NaT', 'NaT', 'NaT', '2025-02-01'], dtype='datetime64[D]'),
+        }
+        # Le paiement de la souscription 9 (non suivie) est ignoré
+        paiements = {
+            'souscription_id': np.array([1, 2, 9, 4]),
+            'montant': np.array([100000, 200000, 100000, 100000]),
+            'date': np.array(['2025-02-01', '2025-03-10', '2025-03-01', '2025-01-02'], dtype='datetime64[D]'),
+        }
+
+        resultat = {nom: colonne.tolist() for nom, colonne in situations.calculer(
+            souscriptions, paiements, date(2025, 3, 15)
+        ).items()}
+
+        # Mensuelle du 31/01 : périodes du 31/01 et du 28/02, la seconde impayée
+        self.assertEqual(resultat['periodes_dues'], [2, 3, 1, 1])
+        self.assertEqual(resultat['montant_paye'], [100000, 200000, 0, 100000])
+        self.assertEqual(resultat['arrieres'], [100000, 0, 200000, 0])
+        self.assertEqual(resultat['avance'], [0, 50000, 0, 0])
+        self.assertEqual(resultat['periodes_impayees'], [1, 0, 1, 0])
+        self.assertEqual(resultat['jours_retard'], [15, 0, 64, 0])
+        # Pas d'échéance suivante : paiement unique, ou période après l'expiration
+        self.assertEqual(
+            resultat['date_prochaine_echeance'], [date(2025, 3, 31), date(2025, 3, 22), None, None]
+        )
+        self.assertEqual(resultat['date_dernier_paiement'], [date(2025, 2, 1), date(2025, 3, 10), None, date(2025, 1, 2)])
+
+
+class CoherenceTests(TestCase):
+
+    def test_corrections_notifiees_et_activations_planifiees(self):
+        souscription = creer_souscription()
+        paiement = PaiementPass.objects.create(
+            souscription_pass=souscription, client=souscription.client, montant=1000, operateur='mtn_money',
+            numero_payeur='+242060000000', statut='en_cours'
+        )
+        TransactionMTN.objects.create(
+            external_id=paiement.numero_transaction, financial_transaction_id='REF-COHERENCE',
+            paiement_pass=paiement, type_transaction='request_to_pay', montant=1000, payer_msisdn='242060000000',
+            statut='successful'
+        )
+        PaiementPass.objects.update(date_modification=timezone.now() - timedelta(hours=1))
+        SouscriptionPass.objects.update(date_modification=timezone.now() - timedelta(hours=1))
+
+        with mock.patch.object(StatutPaiementService, 'notifier') as notifier, \
+                mock.patch.object(SouscriptionPassService, 'planifier_activations') as planifier:
+            etat = coherence.controler()
+
+        self.assertEqual(etat['controles']['paiement_non_confirme'], {'detectes': 1, 'corriges': 1})
+        notifier.assert_called_once_with(paiement.numero_transaction)
+        self.assertEqual(PaiementPass.objects.get(id=paiement.id).statut, 'succes')
+        # Souscription activée sans police : activation seulement planifiée
+        planifier.assert_called_once_with([souscription.id])
+        self.assertEqual(etat['controles']['souscription_activee_sans_police'], {'detectes': 1, 'planifies': 1})
+        self.assertEqual((etat['corrections'], etat['planifications']), (1, 1))
+
+
+class RapprochementTests(TestCase):
+
+    def test_montants_selon_le_separateur_decimal(self):
+        self.assertEqual(rapprochement._montant('1,000'), Decimal('1000'))
+        self.assertEqual(rapprochement._montant('1,000.50'), Decimal('1000.50'))
+        self.assertEqual(rapprochement._montant('1\u00a0000,50', ','), Decimal('1000.50'))
+        self.assertEqual(rapprochement._montant('1.000', ','), Decimal('1000'))
+        self.assertIsNone(rapprochement._montant('n/a'))
+
+    def test_releve_avec_separateur_de_milliers(self):
+        souscription = creer_souscription()
+        paiement = souscription.paiements.get()
+        TransactionMTN.objects.create(
+            external_id=paiement.numero_transaction, financial_transaction_id='REF-RELEVE',
+            paiement_pass=paiement, type_transaction='request_to_pay', montant=1000, payer_msisdn='242060000000',
+            statut='successful'
+        )
+        releve = io.StringIO('Financial Transaction Id,Amount,Status\nREF-RELEVE,"1,000",SUCCESSFUL\n')
+
+        compteurs = rapprochement.Rapprochement('mtn', simulation=True).executer(releve)
+
+        self.assertEqual(compteurs, {'concordant': 1})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DisjoncteurTests(TestCase):
+
+    def setUp(self):
+        circuit_breaker.cache.clear()
+
+    def demi_ouvert(self):
+        disjoncteur = DisjoncteurOperateur('mtn', 'payment_status')
+        disjoncteur.ouvrir('test')
+        etat = circuit_breaker.cache.get(disjoncteur._cle('etat'))
+        etat['ouvert_a'] -= disjoncteur.config['OPEN_SECONDS']
+        circuit_breaker.cache.set(disjoncteur._cle('etat'), etat)
+        self.assertEqual(disjoncteur.etat(), DEMI_OUVERT)
+        return disjoncteur
+
+    def test_une_seule_sonde_demi_ouverte(self):
+        self.demi_ouvert()
+        sonde = DisjoncteurOperateur('mtn', 'payment_status')
+
+        self.assertTrue(sonde.autoriser())
+        self.assertFalse(DisjoncteurOperateur('mtn', 'payment_status').autoriser())
+        sonde.liberer()
+        self.assertTrue(DisjoncteurOperateur('mtn', 'payment_status').autoriser())
+
+    def test_sonde_rendue_si_le_limiteur_refuse(self):
+        self.demi_ouvert()
+
+        with mock.patch('apps.mtn_integration.services.LimiteurOperateur.acquerir', return_value=False):
+            resultat = MTNMobileMoneyService().check_payment_status('REF')
+
+        self.assertTrue(resultat['limite_debit'])
+        self.assertTrue(DisjoncteurOperateur('mtn', 'payment_status').autoriser())
+
+    def test_echecs_ouvrent_le_circuit(self):
+        disjoncteur = DisjoncteurOperateur('airtel', 'debit_request')
+        for _ in range(disjoncteur.config['MIN_CALLS']):
+            disjoncteur.enregistrer_reponse(503, 100)
+
+        self.assertFalse(disjoncteur.autoriser())
+
+    def test_cache_indisponible_disjoncteur_ferme(self):
+        panne = mock.Mock(**{
+            f'{operation}.side_effect': ConnectionError('redis')
+            for operation in ('get', 'add', 'incr', 'set', 'delete', 'delete_many')
+        })
+        disjoncteur = DisjoncteurOperateur('mtn', 'request_to_pay')
+
+        with mock.patch.object(circuit_breaker, 'cache', panne), self.assertLogs(circuit_breaker.logger, 'WARNING'):
+            self.assertEqual(disjoncteur.etat(), FERME)
+            self.assertTrue(disjoncteur.autoriser())
+            disjoncteur.enregistrer_reponse(500, 100)
+            disjoncteur.enregistrer_succes()
+            self.assertEqual(disjoncteur.instantane()['etat'], FERME)
+
+
+@override_settings(
+    PAYMENT_SWEEPER={**settings.PAYMENT_SWEEPER, 'FINAL_CHECK_LIMIT': 2},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class BalayageTests(TestCase):
+
+    def setUp(self):
+        # Curseur de vérification et disjoncteurs stockés dans le cache
+        cache.clear()
+
+    def transaction_abandonnee(self, minutes, reference=True, statut='pending', statut_paiement='en_cours'):
+        souscription = creer_souscription()
+        paiement = PaiementPass.objects.create(
+            souscription_pass=souscription, client=souscription.client, montant=1000, operateur='mtn_money',
+            numero_payeur='+242060000000', statut=statut_paiement
+        )
+        transaction = TransactionMTN.objects.create(
+            external_id=paiement.numero_transaction,
+            financial_transaction_id=f'REF-{paiement.id}' if reference else '',
+            paiement_pass=paiement, type_transaction='request_to_pay', montant=1000, payer_msisdn='242060000000',
+            statut=statut
+        )
+        TransactionMTN.objects.filter(id=transaction.id).update(
+            date_creation=timezone.now() - timedelta(minutes=minutes)
+        )
+        return transaction
+
+    def test_seules_les_transactions_verifiees_expirent(self):
+        payee = self.transaction_abandonnee(60)
+        en_attente = self.transaction_abandonnee(50)
+        non_verifiee = self.transaction_abandonnee(40)
+        reponses = {
+            payee.financial_transaction_id: {'success': True, 'status': 'SUCCESSFUL'},
+            en_attente.financial_transaction_id: {'success': True, 'status': 'PENDING'},
+        }
+
+        with mock.patch.object(
+            MTNMobileMoneyService, 'check_payment_status',
+            side_effect=lambda reference, priorite=None: reponses[reference]
+        ):
+            rapport = expirer_transactions_abandonnees.apply().get()
+
+        self.assertEqual(rapport['mtn'], {'verifiees': 2, 'expirees': 1, 'reportee': False})
+        statuts = dict(TransactionMTN.objects.values_list('id', 'statut'))
+        self.assertEqual(statuts[payee.id], 'successful')
+        self.assertEqual(statuts[en_attente.id], 'timeout')
+        # Reportée au passage suivant
+        self.assertEqual(statuts[non_verifiee.id], 'pending')
+        self.assertEqual(PaiementPass.objects.get(id=payee.paiement_pass_id).statut, 'succes')
+
+    def balayer(self, reponses):
+        with mock.patch.object(
+            MTNMobileMoneyService, 'check_payment_status',
+            side_effect=lambda reference, priorite=None: reponses.get(reference, {'success': False})
+        ) as verification:
+            rapport = expirer_transactions_abandonnees.apply().get()
+        return rapport, [appel.args[0] for appel in verification.call_args_list]
+
+    def test_demandes_non_transmises_expirees_sans_appel(self):
+        # Appel synchrone en échec : transaction 'initiated' sans référence, paiement en échec
+        for minutes in range(60, 115):
+            self.transaction_abandonnee(minutes, reference=False, statut='initiated', statut_paiement='echec')
+        en_attente = self.transaction_abandonnee(30)
+
+        rapport, verifiees = self.balayer({en_attente.financial_transaction_id: {'success': True, 'status': 'PENDING'}})
+
+        self.assertEqual(verifiees, [en_attente.financial_transaction_id])
+        self.assertEqual(rapport['mtn']['expirees'], 56)
+        self.assertFalse(TransactionMTN.objects.filter(statut__in=['initiated', 'pending']).exists())
+
+    def test_transaction_sans_reponse_ne_bloque_pas_les_suivantes(self):
+        references = [self.transaction_abandonnee(minutes).financial_transaction_id for minutes in (60, 50, 40)]
+
+        # MTN ne répond pour aucune : chaque passage reprend après la dernière vérifiée
+        self.assertEqual(self.balayer({})[1], references[:2])
+        self.assertEqual(self.balayer({})[1], references[2:])
+        self.assertEqual(self.balayer({})[1], references[:2])
+
+
+class ArchivageTests(TestCase):
+
+    def test_statut_lu_dans_l_archive(self):
+        souscription = creer_souscription()
+        paiement = souscription.paiements.get()
+        TransactionMTN.objects.create(
+            external_id=paiement.numero_transaction, financial_transaction_id='REF-ARCHIVE',
+            paiement_pass=paiement, type_transaction='request_to_pay', montant=1000, payer_msisdn='242060000000',
+            statut='successful'
+        )
+        TransactionMTN.objects.update(date_creation=timezone.now() - timedelta(days=200))
+
+        self.assertEqual(archivage.archiver('mtn')['archivees'], 1)
+        self.assertFalse(TransactionMTN.objects.exists())
+
+        etat = StatutPaiementService.lire_etat(paiement.numero_transaction)
+        self.assertEqual(etat['status'], 'SUCCESSFUL')
+        self.assertEqual(etat['reference_operateur'], 'REF-ARCHIVE')
+        self.assertEqual(
+            StatutPaiementService.statuts([paiement.numero_transaction, 'INCONNU'])['inconnus'], ['INCONNU']
+        )
+
+    def test_purge_epargne_les_payloads_reutilises(self):
+        reutilise = PayloadOperateur.enregistrer({'status': 'SUCCESSFUL'})
+        orphelin = PayloadOperateur.enregistrer({'status': 'FAILED'})
+        PayloadOperateur.objects.update(
+            date_creation=timezone.now() - timedelta(days=2), date_utilisation=timezone.now() - timedelta(days=2)
+        )
+
+        # Déduplication : le payload ancien est réutilisé par une nouvelle transaction
+        self.assertEqual(PayloadOperateur.enregistrer({'status': 'SUCCESSFUL'}).id, reutilise.id)
+
+        self.assertEqual(archivage.purger_payloads_orphelins(), 1)
+        self.assertFalse(PayloadOperateur.objects.filter(id=orphelin.id).exists())
+        self.assertTrue(PayloadOperateur.objects.filter(id=reutilise.id).exists())
+        # Supprimé par la purge : recréé à la réutilisation suivante
+        self.assertIsNotNone(PayloadOperateur.enregistrer_lot([{'status': 'FAILED'}])[0].id)
+
+
+
+@override_settings(EXPORTS={
+    **settings.EXPORTS, 'CHUNK_SIZE': 50, 'BLOCK_BYTES': 2048, 'COMPRESSION_LEVEL': 0, 'WATERMARK_MARGIN_SECONDS': 0
+})
+class ExportTests(TransactionTestCase):
+    # Les morceaux sont lus par une autre connexion (thread de l'export)
+
+    def setUp(self):
+        souscription = creer_souscription()
+        PaiementPass.objects.bulk_create([
+            PaiementPass(
+                souscription_pass=souscription, client=souscription.client, montant=1000, operateur='mtn_money',
+                numero_payeur='+242060000000', numero_transaction=f'NSIA-EXP{i:05d}', statut='succes', montant_net=1000
+            )
+            for i in range(500)
+        ])
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.entetes = {'Authorization': f'Bearer {RefreshToken.for_user(admin).access_token}'}
+
+    async def test_export_asgi_lu_par_morceaux(self):
+        response = await self.async_client.get(
+            reverse('pass_payments:exporter_donnees', args=['paiements']), {'type': 'ndjson'}, headers=self.entetes
+        )
+
+        self.assertEqual(response.status_code, 200)
+        # Itérateur asynchrone : pas de construction du fichier en mémoire par Django
+        self.assertTrue(response.is_async)
+        morceaux = [morceau async for morceau in response.streaming_content]
+        self.assertGreater(len(morceaux), 5)
+        lignes = gzip.decompress(b''.join(morceaux)).decode().splitlines()
+        self.assertEqual(len(lignes), 501)
+        self.assertIn('X-Export-Watermark', response)
+
+    def test_export_refuse_hors_admin(self):
+        utilisateur = User.objects.create_user('agent')
+        response = self.client.get(
+            reverse('pass_payments:exporter_donnees', args=['paiements']),
+            headers={'Authorization': f'Bearer {RefreshToken.for_user(utilisateur).access_token}'}
+        )
+        self.assertEqual(response.status_code, 403)
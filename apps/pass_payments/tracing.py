@@ -0,0 +1,190 @@
+# apps/pass_payments/tracing.py
+
+"""
+Traçage structuré des appels aux API des opérateurs Mobile Money
+
+Niveaux (settings.OPERATOR_TRACING['LEVEL'], modifiable à chaud) :
+    off      - aucun traçage
+    erreurs  - uniquement les appels en erreur (HTTP >= 400 ou exception)
+    resume   - + un échantillon des appels réussis (sans payloads)
+    complet  - + payloads masqués et tronqués pour l'échantillon
+
+La surcharge à chaud est stockée directement dans Redis (et non dans le
+cache Django, qui peut être local au processus) : elle s'applique à tous
+les workers web et Celery.
+
+Les payloads ne sont sérialisés qu'une fois la décision de tracer prise :
+un appel non échantillonné ne coûte qu'une comparaison d'entiers.
+"""
+
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from redis import RedisError
+
+from nsia_pass_api.redis_client import get_redis
+
+logger = logging.getLogger('nsia_pass.operateurs')
+
+NIVEAUX = {
+    'off': 0,
+    'erreurs': 1,
+    'resume': 2,
+    'complet': 3,
+}
+
+CLE_CONFIG_RUNTIME = 'nsia_pass:operator_tracing_config'
+
+# Copie locale de la configuration effective, rafraîchie périodiquement
+_config_locale = {'valeur': None, 'expire_a': 0.0}
+
+
+def get_config():
+    """Configuration effective : settings + surcharge runtime stockée dans Redis"""
+    maintenant = time.monotonic()
+    if _config_locale['valeur'] is not None and maintenant < _config_locale['expire_a']:
+        return _config_locale['valeur']
+
+    config = dict(settings.OPERATOR_TRACING)
+    try:
+        surcharge = _lire_surcharge()
+    except RedisError as e:
+        logger.warning(f"Lecture configuration traçage impossible: {e}")
+        surcharge = None
+    if surcharge:
+        config.update(surcharge)
+
+    config['_niveau'] = NIVEAUX.get(str(config.get('LEVEL', 'off')).lower(), 0)
+
+    _config_locale['valeur'] = config
+    _config_locale['expire_a'] = maintenant + config.get('CONFIG_REFRESH_SECONDS', 10)
+    return config
+
+
+def _lire_surcharge():
+    brut = get_redis().get(CLE_CONFIG_RUNTIME)
+    return json.loads(brut) if brut else None
+
+
+def set_config(niveau=None, taux_echantillonnage=None, duree_minutes=60):
+    """Surcharge la configuration pour tous les processus (expire automatiquement)"""
+    if niveau is not None and niveau not in NIVEAUX:
+        raise ValueError(f"Niveau de traçage inconnu: {niveau}. Disponibles: {list(NIVEAUX)}")
+    if taux_echantillonnage is not None and not 0 <= taux_echantillonnage <= 1:
+        raise ValueError("Le taux d'échantillonnage doit être compris entre 0 et 1")
+
+    surcharge = _lire_surcharge() or {}
+    if niveau is not None:
+        surcharge['LEVEL'] = niveau
+    if taux_echantillonnage is not None:
+        surcharge['SAMPLE_RATE'] = taux_echantillonnage
+
+    get_redis().set(CLE_CONFIG_RUNTIME, json.dumps(surcharge), ex=duree_minutes * 60)
+    _config_locale['valeur'] = None
+    return surcharge
+
+
+def reinitialiser_config():
+    """Supprime la surcharge runtime (retour aux settings)"""
+    get_redis().delete(CLE_CONFIG_RUNTIME)
+    _config_locale['valeur'] = None
+
+
+def masquer(donnees, config, profondeur=0):
+    """Masque récursivement les secrets et les numéros de téléphone"""
+    if profondeur > 6:
+        return '…'
+    if isinstance(donnees, dict):
+        resultat = {}
+        for cle, valeur in donnees.items():
+            cle_min = str(cle).lower()
+            if cle_min in config['_cles_sensibles']:
+                resultat[cle] = '***'
+            elif cle_min in config['_cles_msisdn'] and valeur:
+                resultat[cle] = f"***{str(valeur)[-3:]}"
+            else:
+                resultat[cle] = masquer(valeur, config, profondeur + 1)
+        return resultat
+    if isinstance(donnees, (list, tuple)):
+        return [masquer(element, config, profondeur + 1) for element in donnees[:20]]
+    return donnees
+
+
+def _serialiser(donnees, config):
+    """Sérialise, masque et tronque un payload (dict, texte ou réponse requests)"""
+    if donnees is None:
+        return None
+
+    # Réponse HTTP : tenter le JSON, sinon le texte brut
+    if hasattr(donnees, 'status_code') and hasattr(donnees, 'text'):
+        try:
+            donnees = donnees.json() if donnees.text.strip() else None
+        except ValueError:
+            donnees = donnees.text
+
+    if isinstance(donnees, (dict, list, tuple)):
+        texte = json.dumps(masquer(donnees, config), default=str, ensure_ascii=False)
+    else:
+        texte = str(donnees)
+
+    taille_max = config.get('MAX_PAYLOAD_CHARS', 2048)
+    if len(texte) > taille_max:
+        texte = f"{texte[:taille_max]}…[{len(texte) - taille_max} caractères tronqués]"
+    return texte
+
+
+def _preparer(config):
+    """Pré-calcule les ensembles de clés à masquer (une fois par rafraîchissement)"""
+    if '_cles_sensibles' not in config:
+        config['_cles_sensibles'] = {c.lower() for c in config.get('REDACTED_KEYS', [])}
+        config['_cles_msisdn'] = {c.lower() for c in config.get('MSISDN_KEYS', [])}
+    return config
+
+
+def tracer_appel_operateur(operateur, operation, *, methode, url, statut_http=None,
+                           duree_ms=None, headers=None, requete=None, reponse=None,
+                           erreur=None):
+    """
+    Trace un appel opérateur selon le niveau et l'échantillonnage courants
+
+    Les arguments sont passés tels quels (dict, objet Response...) : rien
+    n'est sérialisé si l'appel n'est pas retenu.
+    """
+    config = get_config()
+    niveau = config['_niveau']
+    if niveau == 0:
+        return
+
+    en_erreur = erreur is not None or (statut_http is not None and statut_http >= 400)
+    if not en_erreur:
+        if niveau < NIVEAUX['resume']:
+            return
+        if random.random() >= config.get('SAMPLE_RATE', 0):
+            return
+
+    config = _preparer(config)
+
+    evenement = {
+        'operateur': operateur,
+        'operation': operation,
+        'methode': methode,
+        'url': url,
+        'statut_http': statut_http,
+        'duree_ms': duree_ms,
+    }
+    if erreur is not None:
+        evenement['erreur'] = str(erreur)
+
+    # Payloads : toujours pour les erreurs, sur échantillon en mode complet
+    if en_erreur or niveau >= NIVEAUX['complet']:
+        evenement['headers'] = masquer(dict(headers), config) if headers else None
+        evenement['requete'] = _serialiser(requete, config)
+        evenement['reponse'] = _serialiser(reponse, config)
+
+    logger.log(
+        logging.WARNING if en_erreur else logging.INFO,
+        json.dumps(evenement, default=str, ensure_ascii=False)
+    )
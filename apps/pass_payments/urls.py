@@ -8,10 +8,17 @@ urlpatterns = [
     #  NOUVEAUX ENDPOINTS FLEXIBLES
     path('initier/', views.initier_paiement_flexible, name='initier_paiement_flexible'),
     path('operateurs/', views.operateurs_supportes, name='operateurs_supportes'),
+    path('operateurs/etat/', views.etat_operateurs, name='etat_operateurs'),
+    path('planificateur/etat/', views.etat_planificateur_taches, name='etat_planificateur'),
+    path('coherence/etat/', views.etat_coherence_paiements, name='etat_coherence'),
+    path('rapports/financier/', views.rapport_financier, name='rapport_financier'),
+    path('exports/<str:export>/', views.exporter_donnees, name='exporter_donnees'),
     path('detecter-operateur/', views.detecter_operateur, name='detecter_operateur'),
     
     # Statut et historique (compatible avec tous les opérateurs)
+    path('statuts/', views.statuts_paiements_lot, name='statuts_paiements_lot'),
     path('statut/<str:numero_transaction>/', views.verifier_statut_paiement_borne, name='statut_paiement'),
+    path('statut/<str:numero_transaction>/flux/', views.flux_statut_paiement_borne, name='flux_statut_paiement'),
     path('historique/<str:police>/', views.historique_paiements_client, name='historique_paiements'),
     
     #  ANCIENS ENDPOINTS (rétrocompatibilité)
@@ -1,29 +1,39 @@
 from django.shortcuts import render
+from django.conf import settings
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.db import transaction
 
-from apps.airtel_integration.models import TransactionAirtel
-from apps.airtel_integration.services import AirtelMoneyService
 from apps.pass_clients.services import SouscriptionPassService
-from apps.pass_payments.services import PaymentServiceFactory
+from apps.pass_payments.services import (
+    InitiationPaiementService, PaymentServiceFactory, StatutPaiementService, payload_requete_operateur
+)
+from apps.pass_payments.flux import evenements_statut, statut_async
+from apps.pass_payments.idempotence import idempotent
+from apps.pass_payments.circuit_breaker import etat_disjoncteurs
+from apps.pass_payments.rate_limiter import etat_limiteurs
+from nsia_pass_api.beat import etat_planificateur
+from . import agregats, coherence, exports
 from .models import PaiementPass
 from apps.pass_clients.models import ClientPass, SouscriptionPass
 from apps.pass_products.models import ProduitPass, BeneficiairePass
 from apps.borne_auth.models import NumeroPolice
-from apps.mtn_integration.services import MTNMobileMoneyService
 from apps.mtn_integration.models import TransactionMTN
 import uuid
-from datetime import datetime
+from datetime import date, datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 import json
 import logging
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from datetime import datetime
 
 from rest_framework.permissions import IsAuthenticated
@@ -34,10 +44,23 @@ from apps.borne_auth.models import Agent
 # Logger
 logger = logging.getLogger(__name__)
 
+
+def reponse_operateur_indisponible(operateur):
+    """Réponse dégradée quand le disjoncteur de l'opérateur est ouvert"""
+    return Response({
+        'success': False,
+        'error': 'Opérateur indisponible',
+        'details': f'Le service {operateur} est momentanément indisponible. '
+                   f'Veuillez réessayer dans quelques minutes ou choisir un autre opérateur.',
+        'operateur_indisponible': True
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 # ===== NOUVEAUX ENDPOINTS FLEXIBLES =====
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('initier_paiement')
 def initier_paiement_flexible(request):
     """
     🚀 NOUVEAU : Initie un paiement avec choix d'opérateur
@@ -73,6 +96,10 @@ def initier_paiement_flexible(request):
                 'error': f'Opérateur non supporté. Disponibles: {PaymentServiceFactory.get_supported_operators()}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Fast-fail si l'opérateur est en panne (disjoncteur ouvert)
+        if not PaymentServiceFactory.is_operator_available(operateur):
+            return reponse_operateur_indisponible(operateur)
+        
         # Récupérer la souscription
         try:
             numero_police_obj = NumeroPolice.objects.get(numero_police=police)
@@ -110,7 +137,9 @@ def initier_paiement_flexible(request):
                 montant=montant,
                 payer_msisdn=numero_payeur,
                 statut='initiated',
-                request_payload=request.data
+                request_payload=payload_requete_operateur(
+                    montant, numero_payeur, paiement.numero_transaction
+                )
             )
             
             result = payment_service.request_to_pay(
@@ -145,6 +174,9 @@ def initier_paiement_flexible(request):
                 paiement.motif_echec = result.get('error', 'Erreur MTN')
                 paiement.save()
                 
+                if result.get('operateur_indisponible'):
+                    return reponse_operateur_indisponible(operateur)
+                
                 return Response({
                     'success': False,
                     'error': f'Échec paiement {operateur}',
@@ -172,6 +204,19 @@ def initier_paiement_flexible(request):
                         'instructions': 'Confirmez le paiement sur votre téléphone Airtel'
                     }
                 })
+            else:
+                paiement.statut = 'echec'
+                paiement.motif_echec = result.get('error', 'Erreur Airtel')
+                paiement.save()
+                
+                if result.get('operateur_indisponible'):
+                    return reponse_operateur_indisponible(operateur)
+                
+                return Response({
+                    'success': False,
+                    'error': f'Échec paiement {operateur}',
+                    'details': result.get('error')
+                }, status=status.HTTP_400_BAD_REQUEST)
                 
     except Exception as e:
         logger.error(f"Erreur paiement flexible: {e}")
@@ -196,14 +241,14 @@ def operateurs_supportes(request):
             'nom': 'MTN Mobile Money',
             'prefixes': ['061', '062', '063', '064', '065'],
             'logo': '/static/images/mtn_logo.png',
-            'disponible': True
+            'disponible': PaymentServiceFactory.is_operator_available('mtn_money')
         },
         {
             'code': 'airtel_money',
             'nom': 'Airtel Money',
             'prefixes': ['055', '056', '057', '058', '059'],
             'logo': '/static/images/airtel_logo.png',
-            'disponible': True  # Changer à True quand prêt
+            'disponible': PaymentServiceFactory.is_operator_available('airtel_money')
         }
     ]
     
@@ -216,6 +261,143 @@ def operateurs_supportes(request):
         }
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def etat_operateurs(request):
+    """
+    Etat des disjoncteurs et des limiteurs de débit par opérateur
+    
+    GET /api/v1/paiements/operateurs/etat/
+    """
+    return Response({
+        'success': True,
+        'data': {
+            'disjoncteurs': etat_disjoncteurs(),
+            'limiteurs': etat_limiteurs()
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def etat_planificateur_taches(request):
+    """
+    Leader beat courant et retard d'envoi des tâches périodiques
+    
+    GET /api/v1/paiements/planificateur/etat/
+    """
+    return Response({
+        'success': True,
+        'data': etat_planificateur()
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def etat_coherence_paiements(request):
+    """
+    Anomalies détectées et corrigées par le dernier contrôle de cohérence
+    
+    GET /api/v1/paiements/coherence/etat/
+    """
+    return Response({
+        'success': True,
+        'data': coherence.etat_coherence()
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rapport_financier(request):
+    """
+    Totaux montant, frais et net d'une période, lus sur les agrégats journaliers
+    
+    GET /api/v1/paiements/rapports/financier/?date_debut=2026-01-01&date_fin=2026-01-31
+        &regroupement=jour,operateur&statut=succes&operateur=&produit=&agence=
+    statut=tous pour ne pas filtrer ; données à jour à quelques minutes près
+    """
+    try:
+        fin = date.fromisoformat(request.GET['date_fin']) if request.GET.get('date_fin') else timezone.localdate()
+        debut = date.fromisoformat(request.GET['date_debut']) if request.GET.get('date_debut') else fin.replace(day=1)
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'Dates invalides (format AAAA-MM-JJ)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if debut > fin:
+        return Response({
+            'success': False,
+            'error': 'date_debut postérieure à date_fin'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    regroupement = [nom for nom in request.GET.get('regroupement', 'jour').split(',') if nom]
+    inconnus = [nom for nom in regroupement if nom not in agregats.REGROUPEMENTS]
+    if inconnus:
+        return Response({
+            'success': False,
+            'error': f"Regroupement inconnu: {', '.join(inconnus)}",
+            'regroupements': list(agregats.REGROUPEMENTS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    statut = request.GET.get('statut', 'succes')
+    resultat = agregats.rapport(
+        debut, fin,
+        regroupement=regroupement,
+        statut=None if statut == 'tous' else statut,
+        operateur=request.GET.get('operateur'),
+        produit=request.GET.get('produit'),
+        agence=request.GET.get('agence')
+    )
+    return Response({
+        'success': True,
+        'data': {
+            'date_debut': debut,
+            'date_fin': fin,
+            'regroupement': regroupement,
+            'statut': statut,
+            **resultat
+        }
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exporter_donnees(request, export):
+    """
+    Export BI en flux, compressé gzip
+    
+    GET /api/v1/paiements/exports/<paiements|souscriptions|transactions_mtn|transactions_airtel>/
+        ?type=csv|ndjson&depuis=2026-10-01T00:00:00Z
+    L'en-tête X-Export-Watermark donne le `depuis` de l'export suivant
+    """
+    format_fichier = request.GET.get('type', 'csv')
+    if export not in exports.EXPORTS or format_fichier not in exports.FORMATS:
+        return Response({
+            'success': False,
+            'error': 'Export ou type inconnu',
+            'exports': list(exports.EXPORTS),
+            'types': list(exports.FORMATS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    depuis = request.GET.get('depuis')
+    if depuis:
+        depuis = parse_datetime(depuis.replace(' ', '+'))
+        if depuis is None:
+            return Response({
+                'success': False,
+                'error': 'depuis invalide (date ISO 8601)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(depuis):
+            depuis = timezone.make_aware(depuis)
+
+    jusqu_a = exports.borne_export()
+    # ASGI : itérateur asynchrone, sinon le fichier serait construit en mémoire
+    flux_export = exports.flux_async if isinstance(request._request, ASGIRequest) else exports.flux
+    response = StreamingHttpResponse(
+        flux_export(export, format_fichier, depuis or None, jusqu_a),
+        content_type='application/gzip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exports.nom_fichier(export, format_fichier, jusqu_a)}"'
+    response['X-Export-Watermark'] = jusqu_a.isoformat()
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def detecter_operateur(request):
@@ -282,38 +464,66 @@ def verifier_statut_paiement_borne(request, numero_transaction):
     """
     Vérifie le statut d'un paiement depuis la borne (compatible tous opérateurs)
     
+    Réponse servie depuis la base et un cache court : pas d'appel opérateur
+    synchrone. Une vérification opérateur est planifiée en arrière-plan tant
+    que le paiement est en attente (au plus une par intervalle).
+    
     GET /api/v1/paiements/statut/{numero_transaction}/
     """
     try:
-        paiement = get_object_or_404(PaiementPass, numero_transaction=numero_transaction)
+        result = StatutPaiementService.statut(numero_transaction)
         
-        # Logique selon l'opérateur
-        if paiement.operateur == 'mtn_money':
-            transaction_mtn = get_object_or_404(TransactionMTN, external_id=numero_transaction)
-            
-            # Vérifier le statut auprès de MTN
-            mtn_service = MTNMobileMoneyService()
-            result = mtn_service.check_payment_status(transaction_mtn.financial_transaction_id)
-            
+        if result is None:
             return Response({
-                'data': result
-            })
+                'success': False,
+                'error': 'Transaction non trouvée'
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        elif paiement.operateur == 'airtel_money':
-            transaction_airtel = get_object_or_404(TransactionAirtel, external_id=numero_transaction)
-
+        return Response({
+            'data': result
+        })
+            
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': 'Erreur technique',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            airtel_service = AirtelMoneyService()
-            result = airtel_service.check_payment_status(transaction_airtel.airtel_transaction_id)
-            return Response({
-                'data': result
-            })
-        
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def statuts_paiements_lot(request):
+    """
+    Statuts d'un lot de paiements en une seule requête base
+    (back-office, contrôleur des bornes)
+    
+    POST /api/v1/paiements/statuts/
+    {"numeros_transaction": ["NSIA-...", ...], "rafraichir": false}
+    """
+    numeros = request.data.get('numeros_transaction')
+    if not isinstance(numeros, list) or not numeros or not all(isinstance(n, str) for n in numeros):
         return Response({
             'success': False,
-            'error': 'Opérateur non reconnu'
+            'error': 'numeros_transaction doit être une liste non vide de numéros'
         }, status=status.HTTP_400_BAD_REQUEST)
-            
+    
+    numeros = list(dict.fromkeys(numeros))
+    if len(numeros) > settings.PAYMENT_STATUS_BATCH_MAX:
+        return Response({
+            'success': False,
+            'error': f'Maximum {settings.PAYMENT_STATUS_BATCH_MAX} transactions par requête'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        resultat = StatutPaiementService.statuts(
+            numeros,
+            rafraichir=bool(request.data.get('rafraichir', False))
+        )
+        return Response({
+            'success': True,
+            'data': resultat
+        })
+        
     except Exception as e:
         return Response({
             'success': False,
@@ -321,8 +531,34 @@ def verifier_statut_paiement_borne(request, numero_transaction):
             'details': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@require_http_methods(["GET"])
+async def flux_statut_paiement_borne(request, numero_transaction):
+    """
+    Flux SSE du statut d'un paiement (remplace le polling de /statut/)
+    
+    La borne s'abonne après l'initiation et reçoit la transition dès sa
+    résolution. A servir sous ASGI (nsia_pass_api/asgi.py).
+    
+    GET /api/v1/paiements/statut/{numero_transaction}/flux/
+    """
+    if await statut_async(numero_transaction) is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Transaction non trouvée'
+        }, status=404)
+    
+    response = StreamingHttpResponse(
+        evenements_statut(numero_transaction),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un reverse proxy (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent('nouvelle_souscription')
 def nouvelle_souscription_avec_paiement(request):
     """
     Crée une nouvelle souscription PASS avec paiement flexible + agent connecté
@@ -341,6 +577,9 @@ def nouvelle_souscription_avec_paiement(request):
         "beneficiaires": [...],
         "montant": 5000
     }
+    
+    Réponse immédiate (202) : la demande opérateur est envoyée en tâche de
+    fond (outbox). La borne suit la confirmation via data.suivi.
     """
     try:
         with transaction.atomic():
@@ -402,6 +641,10 @@ def nouvelle_souscription_avec_paiement(request):
                 else:
                     operateur = 'mtn_money'  # Défaut
             
+            # Fast-fail avant toute écriture si l'opérateur est en panne
+            if not PaymentServiceFactory.is_operator_available(operateur):
+                return reponse_operateur_indisponible(operateur)
+            
             # 5. ✅ UTILISER LE SERVICE pour créer la souscription avec agent
             donnees_souscription = {
                 'code_pass': produit_pass.code_pass,
@@ -443,128 +686,44 @@ def nouvelle_souscription_avec_paiement(request):
             
             paiement.refresh_from_db()
             
-            # 7. Initier le paiement selon l'opérateur
-            payment_service = PaymentServiceFactory.get_service(operateur)
-            
-            if operateur == 'mtn_money':
-                result = payment_service.request_to_pay(
-                    amount=montant,
-                    phone_number=telephone,
-                    external_id=paiement.numero_transaction,
-                    payer_message=f"Souscription NSIA PASS {produit_pass.nom_pass}"
-                )
-                
-                if result['success']:
-                    # Créer transaction MTN
-                    TransactionMTN.objects.create(
-                        external_id=paiement.numero_transaction,
-                        paiement_pass=paiement,
-                        type_transaction='request_to_pay',
-                        montant=montant,
-                        payer_msisdn=telephone.replace('+', '').replace(' ', ''),
-                        financial_transaction_id=result['reference_id'],
-                        statut='pending',
-                        request_payload=request.data,
-                        response_payload=result
-                    )
-                    
-                    return Response({
-                        'success': True,
-                        'message': f'Souscription créée. Confirmez le paiement MTN sur votre téléphone.',
-                        'data': {
-                            'souscription_id': souscription.id,
-                            'numero_souscription': souscription.numero_souscription,
-                            'numero_transaction': paiement.numero_transaction,
-                            'reference_mtn': result['reference_id'],
-                            'montant': montant,
-                            'operateur': operateur,
-                            'produit': produit_pass.nom_pass,
-                            'client_cree': resultat_souscription['client_created'],
-                            'beneficiaires_count': len(resultat_souscription['beneficiaires']),
-                            # ✅ NOUVEAU : Infos agent
-                            'agent': {
-                                'id': agent_connecte.id,
-                                'nom_complet': agent_connecte.nom_complet,
-                                'matricule': agent_connecte.matricule,
-                                'agence': agent_connecte.agence
-                            } if agent_connecte else None,
-                            'instructions': 'Vérifiez votre téléphone MTN Mobile Money et confirmez le paiement'
-                        }
-                    })
-                else:
-                    # Échec du paiement - annuler la souscription
-                    souscription.delete()
-                    return Response({
-                        'success': False,
-                        'error': f'Impossible d\'initier le paiement MTN pour cette souscription',
-                        'details': result.get('error', 'Erreur technique MTN')
-                    }, status=status.HTTP_400_BAD_REQUEST)
+            # 7. Demande opérateur mise en file, envoyée après commit par Celery
+            outbox = InitiationPaiementService.mettre_en_file(
+                paiement,
+                message_payeur=f"Souscription NSIA PASS {produit_pass.nom_pass}"
+            )
             
-            elif operateur == 'airtel_money':
-                result = payment_service.debit_request(
-                    amount=montant,
-                    phone_number=telephone,
-                    external_id=paiement.numero_transaction
-                )
-                
-                if result.get('success'):
-                    airtel_data = result.get('data', {})
-                    
-                    # Récupérer la référence Airtel
-                    reference_airtel = (
-                        airtel_data.get('data', {}).get('transaction', {}).get('id') or
-                        airtel_data.get('transaction', {}).get('id') or
-                        f"AIRTEL-{paiement.numero_transaction}"
-                    )
-                    
-                    # Créer transaction Airtel
-                    TransactionAirtel.objects.create(
-                        external_id=paiement.numero_transaction,
-                        paiement_pass=paiement,
-                        type_transaction='debit_request',
-                        montant=montant,
-                        payer_msisdn=telephone.removeprefix('242'),
-                        airtel_transaction_id=reference_airtel,
-                        statut='pending',
-                        request_payload=request.data,
-                        response_payload=result
-                    )
-                    
-                    # Sauvegarder la référence
-                    paiement.reference_mobile_money = reference_airtel
-                    paiement.save()
-                    
-                    return Response({
-                        'success': True,
-                        'message': 'Souscription créée. Confirmez le paiement Airtel sur votre téléphone.',
-                        'data': {
-                            'souscription_id': souscription.id,
-                            'numero_souscription': souscription.numero_souscription,
-                            'numero_transaction': paiement.numero_transaction,
-                            'reference_airtel': reference_airtel,
-                            'montant': montant,
-                            'operateur': operateur,
-                            'produit': produit_pass.nom_pass,
-                            'client_cree': resultat_souscription['client_created'],
-                            'beneficiaires_count': len(resultat_souscription['beneficiaires']),
-                            # ✅ NOUVEAU : Infos agent
-                            'agent': {
-                                'id': agent_connecte.id,
-                                'nom_complet': agent_connecte.nom_complet,
-                                'matricule': agent_connecte.matricule,
-                                'agence': agent_connecte.agence
-                            } if agent_connecte else None,
-                            'instructions': 'Vérifiez votre téléphone Airtel Money et confirmez le paiement'
-                        }
-                    })
-                else:
-                    # Échec du paiement - annuler la souscription
-                    souscription.delete()
-                    return Response({
-                        'success': False,
-                        'error': f'Impossible d\'initier le paiement Airtel pour cette souscription',
-                        'details': result.get('error', 'Erreur technique Airtel')
-                    }, status=status.HTTP_400_BAD_REQUEST)
+            nom_operateur = 'MTN Mobile Money' if operateur == 'mtn_money' else 'Airtel Money'
+            numero_transaction = paiement.numero_transaction
+            return Response({
+                'success': True,
+                'message': f'Souscription créée. Confirmez le paiement {nom_operateur} sur votre téléphone.',
+                'data': {
+                    'souscription_id': souscription.id,
+                    'numero_souscription': souscription.numero_souscription,
+                    'numero_transaction': numero_transaction,
+                    'reference_operateur': outbox.reference_operateur,
+                    'reference_mtn': outbox.reference_operateur if operateur == 'mtn_money' else None,
+                    'montant': montant,
+                    'operateur': operateur,
+                    'statut': 'en_cours',
+                    'produit': produit_pass.nom_pass,
+                    'client_cree': resultat_souscription['client_created'],
+                    'beneficiaires_count': len(resultat_souscription['beneficiaires']),
+                    # ✅ NOUVEAU : Infos agent
+                    'agent': {
+                        'id': agent_connecte.id,
+                        'nom_complet': agent_connecte.nom_complet,
+                        'matricule': agent_connecte.matricule,
+                        'agence': agent_connecte.agence
+                    } if agent_connecte else None,
+                    # Suivi de la confirmation (flux SSE de préférence)
+                    'suivi': {
+                        'statut': reverse('pass_payments:statut_paiement', args=[numero_transaction]),
+                        'flux': reverse('pass_payments:flux_statut_paiement', args=[numero_transaction]),
+                    },
+                    'instructions': f'Vérifiez votre téléphone {nom_operateur} et confirmez le paiement'
+                }
+            }, status=status.HTTP_202_ACCEPTED)
                 
     except ValueError as ve:
         # Erreurs de validation du service
@@ -665,11 +824,9 @@ def mtn_callback(request):
                 paiement.statut = 'succes'
                 paiement.date_confirmation = datetime.now()
                 
-                # Activer la souscription si nécessaire
+                # Activer la souscription si nécessaire (police, dates, statistiques)
                 if paiement.type_paiement == 'souscription_initiale':
-                    paiement.souscription_pass.statut = 'activee'
-                    paiement.souscription_pass.paiement_initial_recu = True
-                    paiement.souscription_pass.save()
+                    SouscriptionPassService.demander_activation(paiement.souscription_pass_id)
                     
             elif status == 'FAILED':
                 paiement.statut = 'echec'
@@ -681,6 +838,7 @@ def mtn_callback(request):
             transaction_mtn.statut = status.lower()
             transaction_mtn.callback_payload = callback_data
             transaction_mtn.save()
+            StatutPaiementService.notifier(external_id)
             
             # Log du callback
             logger.info(f"Callback MTN traité: {external_id} - {status}")
@@ -3,6 +3,10 @@ ASGI config for nsia_pass_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Point d'entrée de production (gunicorn + uvicorn_worker.UvicornWorker, voir
+render.yaml) : les flux SSE de statut des bornes restent ouverts sans
+bloquer de worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +16,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nsia_pass_api.settings')
+# Connexions persistantes non refermées de façon fiable par requête sous
+# ASGI (recommandation Django) : une connexion par requête par défaut
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,202 @@
+# nsia_pass_api/beat.py
+
+"""
+Planificateur Celery beat à leader unique
+
+Plusieurs instances beat peuvent tourner pour la disponibilité : une seule
+détient le verrou Redis (SET NX PX, renouvelé à chaque tick) et envoie les
+tâches périodiques. L'état du planning (dernier passage de chaque entrée)
+vit dans Redis et non dans le fichier local celerybeat-schedule : une
+instance qui prend le relais reprend là où le leader précédent s'est arrêté,
+sans relancer immédiatement chaque entrée.
+
+Le passage est écrit dans Redis avant l'envoi, sous condition de détenir
+toujours le verrou (script Lua) : un leader qui a perdu le verrou n'envoie
+plus rien, et un passage interrompu par un arrêt est sauté, jamais doublé.
+
+Lancement : celery -A nsia_pass_api beat (CELERY_BEAT_SCHEDULER)
+"""
+
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+
+from celery.beat import Scheduler
+from django.conf import settings
+from django.utils import timezone
+from redis import RedisError
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CLE_VERROU = 'beat:leader'
+CLE_ETAT = 'beat:dernier_passage'
+CLE_BASCULEMENTS = 'beat:basculements'
+PREFIXE_METRIQUES = 'beat:metriques:'
+
+# 2 : verrou acquis, 1 : renouvelé, 0 : détenu par une autre instance
+SCRIPT_VERROU = """
+local detenteur = redis.call('GET', KEYS[1])
+if detenteur == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not detenteur then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('INCR', KEYS[2])
+    return 2
+end
+return 0
+"""
+
+SCRIPT_LIBERATION = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Passage enregistré seulement si l'instance est toujours leader
+SCRIPT_PASSAGE = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+redis.call('HSET', KEYS[3], 'dernier_envoi', ARGV[3], 'retard_s', ARGV[4], 'instance', ARGV[1])
+redis.call('HINCRBY', KEYS[3], 'envois', 1)
+local maximum = tonumber(redis.call('HGET', KEYS[3], 'retard_max_s') or '0')
+if tonumber(ARGV[4]) > maximum then
+    redis.call('HSET', KEYS[3], 'retard_max_s', ARGV[4])
+end
+return 1
+"""
+
+
+class PlanificateurRedis(Scheduler):
+    """Scheduler beat : élection par verrou Redis, état du planning dans Redis"""
+
+    def __init__(self, *args, **kwargs):
+        config = settings.BEAT_LEADER
+        self.instance = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.ttl_ms = config['LOCK_TTL_SECONDS'] * 1000
+        self.renouvellement = config['RENEW_SECONDS']
+        self.leader = False
+        super().__init__(*args, **kwargs)
+
+    def setup_schedule(self):
+        super().setup_schedule()
+        self._charger_etat()
+
+    def _charger_etat(self):
+        """Reprend les derniers passages enregistrés par le leader précédent"""
+        try:
+            passages = get_redis().hgetall(CLE_ETAT)
+        except RedisError as e:
+            logger.warning(f"État beat illisible dans Redis: {e}")
+            return
+        for nom, entree in self.schedule.items():
+            dernier = passages.get(nom.encode())
+            if dernier:
+                entree.last_run_at = datetime.fromisoformat(dernier.decode())
+        # Le tas est reconstruit avec les nouvelles échéances
+        self._heap = None
+
+    def _verrou(self):
+        try:
+            return get_redis().eval(
+                SCRIPT_VERROU, 2, CLE_VERROU, CLE_BASCULEMENTS, self.instance, self.ttl_ms
+            )
+        except RedisError as e:
+            logger.warning(f"Verrou beat indisponible: {e}")
+            return 0
+
+    def tick(self, *args, **kwargs):
+        resultat = self._verrou()
+        if resultat == 2:
+            logger.info(f"👑 Beat {self.instance} devient leader")
+            self._charger_etat()
+        elif not resultat and self.leader:
+            logger.warning(f"⚠️ Beat {self.instance} a perdu le verrou de leader")
+        self.leader = bool(resultat)
+
+        if not self.leader:
+            # Instance de secours : nouvelle tentative avant expiration du verrou
+            return self.renouvellement
+        return min(super().tick(*args, **kwargs), self.renouvellement)
+
+    def reserve(self, entry):
+        # Retard de l'envoi par rapport à l'échéance prévue
+        retard = max(0.0, -entry.schedule.remaining_estimate(entry.last_run_at).total_seconds())
+        nouvelle = super().reserve(entry)
+        try:
+            enregistre = get_redis().eval(
+                SCRIPT_PASSAGE, 3,
+                CLE_VERROU, CLE_ETAT, PREFIXE_METRIQUES + entry.name,
+                self.instance, entry.name, nouvelle.last_run_at.isoformat(), round(retard, 3)
+            )
+        except RedisError as e:
+            logger.warning(f"Passage beat {entry.name} non enregistré: {e}")
+            enregistre = 0
+        if not enregistre:
+            # Verrou perdu depuis le début du tick : l'envoi revient au nouveau leader
+            self.leader = False
+            self._heap = None
+        return nouvelle
+
+    def apply_entry(self, entry, producer=None):
+        if not self.leader:
+            logger.warning(f"Envoi {entry.name} annulé : instance beat non leader")
+            return
+        super().apply_entry(entry, producer=producer)
+
+    def close(self):
+        try:
+            get_redis().eval(SCRIPT_LIBERATION, 1, CLE_VERROU, self.instance)
+        except RedisError:
+            pass
+        super().close()
+
+    @property
+    def info(self):
+        return f'    . leader: {self.instance} (verrou Redis {CLE_VERROU})'
+
+
+def etat_planificateur():
+    """Leader courant et retard d'envoi de chaque tâche périodique"""
+    redis = get_redis()
+    maintenant = timezone.now()
+    try:
+        leader = redis.get(CLE_VERROU)
+        ttl_ms = redis.pttl(CLE_VERROU)
+        basculements = redis.get(CLE_BASCULEMENTS)
+        pipeline = redis.pipeline(transaction=False)
+        for nom in settings.CELERY_BEAT_SCHEDULE:
+            pipeline.hgetall(PREFIXE_METRIQUES + nom)
+        metriques = pipeline.execute()
+    except RedisError as e:
+        return {'disponible': False, 'error': str(e)}
+
+    taches = {}
+    for nom, valeurs in zip(settings.CELERY_BEAT_SCHEDULE, metriques):
+        valeurs = {k.decode(): v.decode() for k, v in valeurs.items()}
+        dernier_envoi = valeurs.get('dernier_envoi')
+        taches[nom] = {
+            'dernier_envoi': dernier_envoi,
+            'depuis_s': round((maintenant - datetime.fromisoformat(dernier_envoi)).total_seconds(), 1)
+            if dernier_envoi else None,
+            'retard_s': float(valeurs.get('retard_s', 0)),
+            'retard_max_s': float(valeurs.get('retard_max_s', 0)),
+            'envois': int(valeurs.get('envois', 0)),
+            'instance': valeurs.get('instance'),
+        }
+
+    return {
+        'disponible': True,
+        'leader': leader.decode() if leader else None,
+        'verrou_expire_ms': max(ttl_ms, 0),
+        'basculements': int(basculements or 0),
+        'taches': taches,
+    }
@@ -0,0 +1,155 @@
+# nsia_pass_api/cache.py
+
+"""
+Cache à deux niveaux : LRU local au processus devant le cache partagé Redis
+
+Les clés sont versionnées par espace de noms :
+    <espace>:<schema>:g<generation>:<cle>
+- schema     : à incrémenter dans le code quand le format des valeurs change
+- generation : compteur partagé, incrémenté par invalider_tout() ; chaque
+               processus le relit au plus toutes les ttl_local secondes
+
+Cache partagé indisponible : les erreurs sont journalisées et le cache se
+comporte comme vide (seul le niveau local sert) ; l'appelant recalcule la
+valeur, par exemple un nouveau jeton opérateur, au lieu d'échouer.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_ABSENT = object()
+# Génération utilisée tant que le cache partagé est injoignable
+GENERATION_HORS_LIGNE = 0
+
+
+class CacheLocal:
+    """LRU borné avec expiration, partagé par tous les espaces d'un processus"""
+
+    def __init__(self, taille_max):
+        self.taille_max = taille_max
+        self._donnees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            entree = self._donnees.get(cle)
+            if entree is None:
+                return _ABSENT
+            valeur, expire_a = entree
+            if expire_a <= time.monotonic():
+                del self._donnees[cle]
+                return _ABSENT
+            self._donnees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur, ttl):
+        with self._verrou:
+            self._donnees[cle] = (valeur, time.monotonic() + ttl)
+            self._donnees.move_to_end(cle)
+            while len(self._donnees) > self.taille_max:
+                self._donnees.popitem(last=False)
+
+    def delete(self, cle):
+        with self._verrou:
+            self._donnees.pop(cle, None)
+
+    def supprimer_prefixe(self, prefixe):
+        with self._verrou:
+            for cle in [c for c in self._donnees if c.startswith(prefixe)]:
+                del self._donnees[cle]
+
+
+_cache_local = CacheLocal(settings.TWO_TIER_CACHE['LOCAL_MAX_ENTRIES'])
+
+
+class CacheDeuxNiveaux:
+    """Espace de noms du cache à deux niveaux"""
+
+    def __init__(self, espace, ttl, ttl_local=5, schema=1):
+        self.espace = espace
+        self.ttl = ttl
+        self.ttl_local = min(ttl_local, ttl)
+        self.schema = schema
+
+    @property
+    def _cle_generation(self):
+        return f"{self.espace}:generation"
+
+    def _partage(self, operation, *args, defaut=None):
+        """Opération sur le cache partagé ; en cas d'erreur, journalisée, retourne defaut"""
+        try:
+            return getattr(cache, operation)(*args)
+        except Exception as e:
+            logger.warning(f"Cache partagé indisponible ({self.espace} {operation}): {e}")
+            return defaut
+
+    def _generation(self):
+        cle_locale = f"{self.espace}:__generation__"
+        generation = _cache_local.get(cle_locale)
+        if generation is _ABSENT:
+            self._partage('add', self._cle_generation, 1, None)
+            generation = self._partage('get', self._cle_generation, 1, defaut=GENERATION_HORS_LIGNE)
+            _cache_local.set(cle_locale, generation, self.ttl_local)
+        return generation
+
+    def cle(self, cle):
+        """Clé complète versionnée"""
+        return f"{self.espace}:{self.schema}:g{self._generation()}:{cle}"
+
+    def get(self, cle, defaut=None):
+        cle_complete = self.cle(cle)
+        valeur = _cache_local.get(cle_complete)
+        if valeur is not _ABSENT:
+            return valeur
+
+        valeur = self._partage('get', cle_complete, _ABSENT, defaut=_ABSENT)
+        if valeur is _ABSENT:
+            return defaut
+        _cache_local.set(cle_complete, valeur, self.ttl_local)
+        return valeur
+
+    def set(self, cle, valeur, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        cle_complete = self.cle(cle)
+        self._partage('set', cle_complete, valeur, ttl)
+        _cache_local.set(cle_complete, valeur, min(self.ttl_local, ttl))
+
+    def get_or_set(self, cle, producteur, ttl=None):
+        """Retourne la valeur en cache ou la calcule (None n'est pas mis en cache)"""
+        valeur = self.get(cle, _ABSENT)
+        if valeur is _ABSENT:
+            valeur = producteur()
+            if valeur is not None:
+                self.set(cle, valeur, ttl)
+        return valeur
+
+    def delete(self, cle):
+        """Invalide une clé (les autres processus la perdent sous ttl_local)"""
+        cle_complete = self.cle(cle)
+        self._partage('delete', cle_complete)
+        _cache_local.delete(cle_complete)
+
+    def invalider_tout(self):
+        """Invalide tout l'espace de noms en changeant de génération"""
+        self._partage('add', self._cle_generation, 1, None)
+        try:
+            cache.incr(self._cle_generation)
+        except ValueError:
+            self._partage('set', self._cle_generation, 2, None)
+        except Exception as e:
+            logger.warning(f"Cache partagé indisponible ({self.espace} incr): {e}")
+        _cache_local.supprimer_prefixe(f"{self.espace}:")
+
+
+# Espaces de noms partagés
+# Jeton révoqué (401) : les autres processus le rejouent au plus ttl_local secondes
+JETONS_OPERATEURS = CacheDeuxNiveaux('jetons_operateurs', ttl=3000, ttl_local=5)
+INSTANTANES = CacheDeuxNiveaux('instantanes', ttl=60, ttl_local=10)
+STATUTS_PAIEMENTS = CacheDeuxNiveaux('statuts_paiements', ttl=3, ttl_local=1)
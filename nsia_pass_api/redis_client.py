@@ -0,0 +1,41 @@
+# nsia_pass_api/redis_client.py
+
+"""Connexion Redis partagée (même instance que le broker Celery)"""
+
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_clients_async = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """Client Redis du processus (pool de connexions réinitialisé après fork)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=1,
+            socket_connect_timeout=1,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def get_redis_async():
+    """Client Redis asyncio (flux SSE sous ASGI), un par boucle d'événements"""
+    boucle = asyncio.get_running_loop()
+    client = _clients_async.get(boucle)
+    if client is None:
+        # Pas de socket_timeout : un abonnement pub/sub reste longtemps silencieux
+        client = redis.asyncio.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            health_check_interval=30,
+        )
+        _clients_async[boucle] = client
+    return client
@@ -3,6 +3,7 @@ from pathlib import Path
 from decouple import config
 from datetime import timedelta
 from celery.schedules import crontab
+from kombu import Queue
 
 # Build paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -79,9 +80,19 @@ DATABASES = {
     }
 }
 
+# Connexions persistantes pour Celery et WSGI ; 0 sous ASGI (défaut posé par asgi.py)
 DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=600, cast=int)
 DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
+# Réplica en lecture seule, utilisée explicitement (exports BI) : aucun routeur
+if config('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': config('DB_REPLICA_HOST'),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
 """DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -93,6 +104,32 @@ DATABASES['default']['CONN_HEALTH_CHECKS'] = True
     }
 }"""
 
+# ===============================================
+# Cache partagé (Redis) + niveau local en mémoire
+# ===============================================
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+if config('CACHE_BACKEND', default='redis') == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_CACHE_URL', default=REDIS_URL),
+            'KEY_PREFIX': 'nsia_pass',
+            'TIMEOUT': 300,
+        }
+    }
+
+# Niveau local du cache à deux niveaux (nsia_pass_api/cache.py)
+TWO_TIER_CACHE = {
+    'LOCAL_MAX_ENTRIES': config('LOCAL_CACHE_MAX_ENTRIES', default=1024, cast=int),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -194,9 +231,280 @@ AIRTEL_MONEY = {
     'TIMEOUT': 60,
 }
 
+# ===============================================
+# Traçage des appels opérateurs (MTN / Airtel)
+# ===============================================
+# Niveaux : off | erreurs | resume | complet (surcharge à chaud dans Redis :
+# python manage.py tracage_operateurs --niveau complet --echantillonnage 0.1)
+OPERATOR_TRACING = {
+    'LEVEL': config('OPERATOR_TRACE_LEVEL', default='erreurs'),
+    'SAMPLE_RATE': config('OPERATOR_TRACE_SAMPLE_RATE', default=0.01, cast=float),
+    'MAX_PAYLOAD_CHARS': config('OPERATOR_TRACE_MAX_PAYLOAD', default=2048, cast=int),
+    'CONFIG_REFRESH_SECONDS': 10,
+    'REDACTED_KEYS': [
+        'authorization', 'ocp-apim-subscription-key', 'client_secret',
+        'access_token', 'api_key', 'x-signature',
+    ],
+    'MSISDN_KEYS': ['msisdn', 'partyid', 'payer_msisdn'],
+}
+
+# ===============================================
+# Disjoncteurs opérateurs (état partagé via le cache)
+# ===============================================
+OPERATOR_CIRCUIT_BREAKER = {
+    'WINDOW_SECONDS': 60,          # Fenêtre de comptage des échecs
+    'MIN_CALLS': 5,                # Nombre minimal d'échecs avant ouverture
+    'FAILURE_RATIO': 0.5,          # Taux d'échec déclenchant l'ouverture
+    'SLOW_CALL_MS': config('OPERATOR_SLOW_CALL_MS', default=15000, cast=int),
+    'OPEN_SECONDS': config('OPERATOR_BREAKER_OPEN_SECONDS', default=30, cast=int),
+    'HALF_OPEN_SUCCESSES': 2,      # Sondes réussies pour refermer
+    'PROBE_TIMEOUT_SECONDS': 65,   # Durée max d'une sonde (> timeout HTTP)
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'nsia_pass.operateurs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# ===============================================
+# Limiteur de débit des appels opérateurs (Redis)
+# ===============================================
+OPERATOR_RATE_LIMITS = {
+    'ENABLED': config('OPERATOR_RATE_LIMITING', default=True, cast=bool),
+    # Part du seau réservée aux priorités supérieures
+    'PRIORITY_RESERVE': {'haute': 0.0, 'normale': 0.25, 'basse': 0.5},
+    # Attente maximale d'un jeton selon la priorité
+    'PRIORITY_MAX_WAIT_MS': {'haute': 2000, 'normale': 500, 'basse': 0},
+    'BUCKETS': {
+        'mtn': {
+            'token': {'CAPACITY': 5, 'RATE': 1.0},
+            'request_to_pay': {'CAPACITY': 20, 'RATE': 10.0},
+            'payment_status': {'CAPACITY': 20, 'RATE': 10.0},
+        },
+        'airtel': {
+            'token': {'CAPACITY': 5, 'RATE': 1.0},
+            'debit_request': {'CAPACITY': 20, 'RATE': 10.0},
+            'payment_status': {'CAPACITY': 20, 'RATE': 10.0},
+        },
+    },
+}
+
+# ===============================================
+# Balayage des transactions abandonnées
+# ===============================================
+PAYMENT_SWEEPER = {
+    'STALE_AFTER_MINUTES': 15,     # Au-delà, une transaction en attente est abandonnée
+    'CHUNK_SIZE': 1000,            # Lignes par UPDATE (verrous courts)
+    'FINAL_CHECK_LIMIT': 50,       # Vérifications opérateur par passage (reprise au curseur suivant)
+}
+
+# ===============================================
+# Statut des paiements pour les bornes
+# ===============================================
+# Au plus une vérification opérateur à la demande par transaction et par intervalle
+PAYMENT_STATUS_REFRESH_SECONDS = config('PAYMENT_STATUS_REFRESH_SECONDS', default=15, cast=int)
+
+# Nombre maximal de transactions par requête de statut groupée
+PAYMENT_STATUS_BATCH_MAX = config('PAYMENT_STATUS_BATCH_MAX', default=500, cast=int)
+
+# Flux SSE (servi par nsia_pass_api/asgi.py) : durée max d'un abonnement et
+# intervalle des commentaires keep-alive / vérifications de secours
+PAYMENT_STATUS_STREAM = {
+    'MAX_SECONDS': config('PAYMENT_STATUS_STREAM_MAX_SECONDS', default=300, cast=int),
+    'KEEPALIVE_SECONDS': config('PAYMENT_STATUS_STREAM_KEEPALIVE_SECONDS', default=10, cast=int),
+}
+
+# ===============================================
+# Outbox des demandes de paiement opérateur
+# ===============================================
+# Backoff exponentiel : BACKOFF_SECONDS x 3^(tentative - 1)
+PAYMENT_OUTBOX = {
+    'MAX_ATTEMPTS': config('PAYMENT_OUTBOX_MAX_ATTEMPTS', default=5, cast=int),
+    'BACKOFF_SECONDS': config('PAYMENT_OUTBOX_BACKOFF_SECONDS', default=5, cast=int),
+    # Durée au-delà de laquelle un envoi sans réponse est repris par un autre worker
+    'LEASE_SECONDS': config('PAYMENT_OUTBOX_LEASE_SECONDS', default=120, cast=int),
+    'RELAUNCH_GRACE_SECONDS': 30,
+    'RELAUNCH_BATCH': 500,
+}
+
+# ===============================================
+# Activation des souscriptions payées (tâche dédiée)
+# ===============================================
+SUBSCRIPTION_ACTIVATION = {
+    'BATCH_SIZE': 50,
+    # Une souscription déjà en file n'est pas replanifiée pendant ce délai
+    'DEDUP_SECONDS': 300,
+    'MAX_RETRIES': 5,
+    'RETRY_BACKOFF_SECONDS': 10,
+    # Souscriptions replanifiées au plus par passage du rattrapage
+    'CATCHUP_LIMIT': 500,
+}
+
+# ===============================================
+# Collecte des cotisations périodiques
+# ===============================================
+COTISATIONS = {
+    # Echéances générées à l'avance (génération quotidienne)
+    'HORIZON_DAYS': 7,
+    # Echéances générées au plus par souscription et par passage
+    'MAX_PERIODS_PER_RUN': 3,
+    # Plage horaire des débits (heure locale, fin exclue)
+    'WINDOW_START_HOUR': config('COTISATIONS_WINDOW_START_HOUR', default=7, cast=int),
+    'WINDOW_END_HOUR': config('COTISATIONS_WINDOW_END_HOUR', default=20, cast=int),
+    # Débits mis en file par minute : moitié du débit opérateur, le reste aux bornes
+    'DEBITS_PER_MINUTE': {
+        'mtn_money': config('COTISATIONS_MTN_PER_MINUTE', default=300, cast=int),
+        'airtel_money': config('COTISATIONS_AIRTEL_PER_MINUTE', default=300, cast=int),
+    },
+    # Echéances par transaction de mise en file
+    'BATCH_SIZE': 100,
+    # Tentatives de débit par échéance, espacées de RETRY_HOURS
+    'MAX_ATTEMPTS': 3,
+    'RETRY_HOURS': 24,
+}
+
+# ===============================================
+# Expiration et renouvellement des souscriptions
+# ===============================================
+SUBSCRIPTION_RENEWAL = {
+    # Souscriptions expirées par UPDATE (verrous courts)
+    'EXPIRY_CHUNK_SIZE': 1000,
+    # Renouvellements traités entre LEAD_DAYS et LEAD_DAYS - SPREAD_DAYS + 1
+    # jours avant l'expiration : les fins de mois chargées sont lissées
+    'LEAD_DAYS': 10,
+    'SPREAD_DAYS': 5,
+    'WINDOW_START_HOUR': config('RENOUVELLEMENTS_WINDOW_START_HOUR', default=8, cast=int),
+    'WINDOW_END_HOUR': config('RENOUVELLEMENTS_WINDOW_END_HOUR', default=19, cast=int),
+    'PAYMENTS_PER_MINUTE': config('RENOUVELLEMENTS_PER_MINUTE', default=100, cast=int),
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_HOURS': 24,
+}
+
+# Situations de cotisation (attendu, payé, arriérés) : calcul NumPy en masse
+COTISATION_SITUATIONS = {
+    # Souscriptions chargées et calculées par tranche
+    'CHUNK_SIZE': 50000,
+    # Lignes par INSERT ... ON CONFLICT
+    'WRITE_BATCH': 2000,
+    # Recouvrement du recalcul incrémental avec le précédent
+    'INCREMENTAL_MARGIN_SECONDS': 120,
+}
+
+# Agrégats financiers journaliers (jour, opérateur, produit, agence, statut)
+PAYMENT_ROLLUPS = {
+    # Paiements modifiés relus à chaque passage (tâche toutes les 5 minutes)
+    'LOOKBACK_MINUTES': 20,
+    # Journées reconstruites chaque nuit (rattrapage d'un passage manqué)
+    'NIGHTLY_DAYS': 7,
+    # Journées par GROUP BY lors d'une reconstruction
+    'CHUNK_DAYS': 31,
+    'WRITE_BATCH': 2000,
+}
+
+# Rapprochement des relevés de règlement opérateurs (manage.py rapprocher_releve)
+# COLUMNS : en-têtes du relevé (casse ignorée) ; reference, montant et statut obligatoires
+# DECIMAL_SEPARATOR : séparateur décimal des montants, l'autre ('.' ou ',') est celui des milliers
+OPERATOR_SETTLEMENT = {
+    'mtn': {
+        'COLUMNS': {
+            'reference': 'Financial Transaction Id',
+            'external_id': 'External Transaction Id',
+            'montant': 'Amount',
+            'statut': 'Status',
+            'date': 'Date',
+        },
+        'SUCCESS_VALUES': ['SUCCESSFUL', 'SUCCESS'],
+        'FAILURE_VALUES': ['FAILED', 'REJECTED', 'EXPIRED'],
+        'DELIMITER': ',',
+        'DECIMAL_SEPARATOR': '.',
+        'CHUNK_LINES': 20000,
+    },
+    'airtel': {
+        'COLUMNS': {
+            'reference': 'Transaction ID',
+            'external_id': 'Reference',
+            'montant': 'Amount',
+            'statut': 'Status',
+            'date': 'Transaction Date',
+        },
+        'SUCCESS_VALUES': ['TS', 'SUCCESS', 'SUCCESSFUL'],
+        'FAILURE_VALUES': ['TF', 'FAILED'],
+        'DELIMITER': ',',
+        'DECIMAL_SEPARATOR': '.',
+        'CHUNK_LINES': 20000,
+    },
+}
+
+# Exports BI en flux (CSV/NDJSON gzip), voir apps/pass_payments/exports.py
+EXPORTS = {
+    'DATABASE': 'replica' if 'replica' in DATABASES else 'default',
+    # Lignes par FETCH du curseur serveur
+    'CHUNK_SIZE': 5000,
+    # Texte accumulé avant chaque compression
+    'BLOCK_BYTES': 256 * 1024,
+    'COMPRESSION_LEVEL': 6,
+    # Transactions ouvertes au début de l'export : reprises par le suivant
+    'WATERMARK_MARGIN_SECONDS': 60,
+}
+
+# Contrôle de cohérence paiements / transactions / souscriptions (coherence.py)
+CONSISTENCY_CHECK = {
+    # False : anomalies seulement comptées
+    'REPAIR': config('CONSISTENCY_CHECK_REPAIR', default=True, cast=bool),
+    # Lignes modifiées plus récemment ignorées (mise à jour en cours)
+    'GRACE_MINUTES': 15,
+    'BATCH_SIZE': 500,
+}
+
+# Grand livre des commissions agents (apps/borne_auth/commissions.py)
+AGENT_COMMISSIONS = {
+    # Paiements relus à chaque passage : rattrape un passage manqué
+    'LOOKBACK_HOURS': 48,
+    # Mouvements agrégés par transaction
+    'BATCH_SIZE': 2000,
+    # Solde minimal réglé par l'export (python manage.py regler_commissions)
+    'SETTLEMENT_MINIMUM': config('COMMISSIONS_SETTLEMENT_MINIMUM', default=1000, cast=int),
+}
+
+# ===============================================
+# Idempotency-Key des endpoints d'initiation de paiement
+# ===============================================
+IDEMPOTENCY = {
+    # Fenêtre pendant laquelle une reprise rejoue la première réponse
+    'TTL_HOURS': config('IDEMPOTENCY_TTL_HOURS', default=24, cast=int),
+    # Au-delà, une requête restée sans réponse (worker arrêté) peut être reprise
+    'LOCK_SECONDS': 90,
+    # Attente maximale d'une reprise concurrente avant un 409
+    'WAIT_SECONDS': 10,
+    'CACHE_SECONDS': 3600,
+}
+
+# ===============================================
+# Archivage des tables opérateurs (partitions mensuelles)
+# ===============================================
+OPERATOR_ARCHIVE = {
+    'HOT_DAYS': config('OPERATOR_ARCHIVE_HOT_DAYS', default=90, cast=int),
+    # Durée de conservation légale des archives
+    'RETENTION_MONTHS': config('OPERATOR_ARCHIVE_RETENTION_MONTHS', default=60, cast=int),
+    'CHUNK_SIZE': 5000,
+}
+
 # Broker et Backend Redis
-CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 
 # Sérialisation
 CELERY_ACCEPT_CONTENT = ['json']
@@ -211,16 +519,178 @@ CELERY_BEAT_SCHEDULE = {
     'monitor-pending-payments': {
         'task': 'apps.pass_payments.tasks.monitor_pending_payments',
         'schedule': 30.0,  # Toutes les 30 secondes
-        # Enlever la ligne 'options': {'queue': 'payment_monitoring'}
+        # Un passage en retard est remplacé par le suivant, pas empilé
+        'options': {'expires': 25},
+    },
+    'expirer-transactions-abandonnees': {
+        'task': 'apps.pass_payments.tasks.expirer_transactions_abandonnees',
+        'schedule': 300.0,  # Toutes les 5 minutes
+    },
+    'relancer-outbox-paiements': {
+        'task': 'apps.pass_payments.tasks.relancer_outbox_paiements',
+        'schedule': 60.0,  # Toutes les minutes
+        'options': {'expires': 55},
+    },
+    'generer-echeances-cotisations': {
+        'task': 'apps.pass_payments.tasks.generer_echeances_cotisations',
+        'schedule': crontab(hour=1, minute=0),  # Chaque nuit
+    },
+    'collecter-cotisations': {
+        'task': 'apps.pass_payments.tasks.collecter_cotisations',
+        'schedule': 60.0,  # Toutes les minutes (quota DEBITS_PER_MINUTE)
+        'options': {'expires': 55},
     },
+    'recalculer-situations-cotisations': {
+        'task': 'apps.pass_payments.tasks.recalculer_situations_cotisations',
+        'schedule': crontab(hour=3, minute=0),  # Recalcul complet chaque nuit
+        'kwargs': {'complet': True},
+    },
+    'recalculer-situations-cotisations-incremental': {
+        'task': 'apps.pass_payments.tasks.recalculer_situations_cotisations',
+        'schedule': 900.0,  # Toutes les 15 minutes (paiements modifiés)
+        'options': {'expires': 850},
+    },
+    'cycle-vie-souscriptions': {
+        'task': 'apps.pass_clients.tasks.cycle_vie_souscriptions',
+        'schedule': crontab(hour=0, minute=30),  # Chaque nuit, après le changement de date
+    },
+    'traiter-renouvellements': {
+        'task': 'apps.pass_payments.tasks.traiter_renouvellements',
+        'schedule': 60.0,  # Toutes les minutes (quota PAYMENTS_PER_MINUTE)
+        'options': {'expires': 55},
+    },
+    'rattraper-activations': {
+        'task': 'apps.pass_clients.tasks.rattraper_activations',
+        'schedule': 300.0,  # Toutes les 5 minutes
+        'options': {'expires': 290},
+    },
+    'agreger-paiements': {
+        'task': 'apps.pass_payments.tasks.agreger_paiements',
+        'schedule': 300.0,  # Toutes les 5 minutes (journées modifiées)
+        'options': {'expires': 290},
+    },
+    'reconstruire-agregats-paiements': {
+        'task': 'apps.pass_payments.tasks.agreger_paiements',
+        'schedule': crontab(hour=3, minute=30),  # Derniers NIGHTLY_DAYS jours, chaque nuit
+        'kwargs': {'reconstruction': True},
+    },
+    'controler-coherence': {
+        'task': 'apps.pass_payments.tasks.controler_coherence',
+        'schedule': 900.0,  # Toutes les 15 minutes
+        'options': {'expires': 850},
+    },
+    'comptabiliser-commissions': {
+        'task': 'apps.borne_auth.tasks.comptabiliser_commissions',
+        'schedule': 300.0,  # Toutes les 5 minutes
+        'options': {'expires': 290},
+    },
+    'archiver-transactions-operateurs': {
+        'task': 'apps.pass_payments.tasks.archiver_transactions_operateurs',
+        'schedule': crontab(hour=2, minute=30),  # Chaque nuit
+    },
+}
+
+# Beat à leader unique : plusieurs instances possibles, une seule envoie
+# (verrou et derniers passages dans Redis, voir nsia_pass_api/beat.py)
+CELERY_BEAT_SCHEDULER = 'nsia_pass_api.beat:PlanificateurRedis'
+BEAT_LEADER = {
+    # Délai maximal de reprise par une instance de secours
+    'LOCK_TTL_SECONDS': config('BEAT_LOCK_TTL_SECONDS', default=15, cast=int),
+    'RENEW_SECONDS': config('BEAT_RENEW_SECONDS', default=5, cast=int),
+}
+
+# ===============================================
+# Files Celery : routage, priorités et limites de temps
+# ===============================================
+# Une file par type de charge : le travail sensible à la latence
+# (initiation, callbacks, statut demandé par une borne) ne passe jamais
+# derrière le monitoring, les activations groupées ou les rapports.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = [
+    Queue('paiements_initiation'),
+    Queue('paiements_callbacks'),
+    Queue('paiements_statut'),
+    Queue('activations'),
+    Queue('cotisations'),
+    Queue('rapports'),
+    Queue('default'),
+]
+
+# Priorités au sein d'une file (Redis : 0 = la plus haute)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+
+CELERY_TASK_ROUTES = {
+    'apps.pass_payments.tasks.envoyer_paiement_operateur': {'queue': 'paiements_initiation', 'priority': 0},
+    'apps.pass_payments.tasks.relancer_outbox_paiements': {'queue': 'paiements_initiation', 'priority': 3},
+    'apps.mtn_integration.tasks.*': {'queue': 'paiements_callbacks', 'priority': 0},
+    'apps.airtel_integration.tasks.*': {'queue': 'paiements_callbacks', 'priority': 0},
+    # Vérification demandée par une borne avant le balayage périodique
+    'apps.pass_payments.tasks.rafraichir_statut_paiement': {'queue': 'paiements_statut', 'priority': 0},
+    'apps.pass_payments.tasks.monitor_pending_payments': {'queue': 'paiements_statut', 'priority': 5},
+    'apps.pass_payments.tasks.expirer_transactions_abandonnees': {'queue': 'paiements_statut', 'priority': 8},
+    'apps.pass_clients.tasks.*': {'queue': 'activations'},
+    'apps.pass_payments.tasks.generer_echeances_cotisations': {'queue': 'cotisations'},
+    'apps.pass_payments.tasks.collecter_cotisations': {'queue': 'cotisations', 'priority': 0},
+    'apps.pass_payments.tasks.traiter_renouvellements': {'queue': 'cotisations', 'priority': 0},
+    'apps.pass_payments.tasks.archiver_transactions_operateurs': {'queue': 'rapports'},
+    'apps.pass_payments.tasks.recalculer_situations_cotisations': {'queue': 'rapports'},
+    'apps.pass_payments.tasks.agreger_paiements': {'queue': 'rapports'},
+    'apps.pass_payments.tasks.controler_coherence': {'queue': 'rapports'},
+    'apps.borne_auth.tasks.comptabiliser_commissions': {'queue': 'rapports'},
+}
+
+# Limites par défaut, puis par tâche (soft : SoftTimeLimitExceeded, hard : worker tué)
+CELERY_TASK_SOFT_TIME_LIMIT = 300
+CELERY_TASK_TIME_LIMIT = 360
+CELERY_TASK_ANNOTATIONS = {
+    # > timeout HTTP opérateur (60 s) et < bail de l'outbox (120 s)
+    'apps.pass_payments.tasks.envoyer_paiement_operateur': {'soft_time_limit': 80, 'time_limit': 100},
+    'apps.pass_payments.tasks.relancer_outbox_paiements': {'soft_time_limit': 30, 'time_limit': 45},
+    'apps.pass_payments.tasks.rafraichir_statut_paiement': {'soft_time_limit': 70, 'time_limit': 90},
+    'apps.pass_payments.tasks.monitor_pending_payments': {'soft_time_limit': 120, 'time_limit': 150},
+    'apps.pass_payments.tasks.expirer_transactions_abandonnees': {'soft_time_limit': 240, 'time_limit': 290},
+    'apps.pass_payments.tasks.archiver_transactions_operateurs': {'soft_time_limit': 3300, 'time_limit': 3500},
+    'apps.pass_payments.tasks.generer_echeances_cotisations': {'soft_time_limit': 1800, 'time_limit': 1900},
+    'apps.pass_payments.tasks.collecter_cotisations': {'soft_time_limit': 50, 'time_limit': 58},
+    'apps.pass_payments.tasks.recalculer_situations_cotisations': {'soft_time_limit': 3300, 'time_limit': 3500},
+    'apps.pass_payments.tasks.traiter_renouvellements': {'soft_time_limit': 50, 'time_limit': 58},
+    'apps.pass_clients.tasks.cycle_vie_souscriptions': {'soft_time_limit': 1800, 'time_limit': 1900},
+    'apps.pass_clients.tasks.activer_souscriptions': {'soft_time_limit': 120, 'time_limit': 150},
+    'apps.pass_clients.tasks.rattraper_activations': {'soft_time_limit': 30, 'time_limit': 45},
+    'apps.pass_payments.tasks.agreger_paiements': {'soft_time_limit': 1800, 'time_limit': 1900},
+    'apps.pass_payments.tasks.controler_coherence': {'soft_time_limit': 600, 'time_limit': 660},
+    'apps.borne_auth.tasks.comptabiliser_commissions': {'soft_time_limit': 240, 'time_limit': 290},
 }
 
-# Et COMMENTER ces lignes pour simplifier :
-# CELERY_TASK_ROUTES = {
-#     'apps.pass_payments.tasks.*': {'queue': 'payment_monitoring'},
-#     'apps.mtn_integration.tasks.*': {'queue': 'mtn_operations'},
-#     'apps.airtel_integration.tasks.*': {'queue': 'airtel_operations'},
-# }
+# Workers par groupe de files (python manage.py lancer_worker <groupe>)
+WORKER_POOLS = {
+    'temps_reel': {
+        'QUEUES': ['paiements_initiation', 'paiements_callbacks'],
+        'CONCURRENCY': config('WORKER_TEMPS_REEL_CONCURRENCY', default=8, cast=int),
+    },
+    'statut': {
+        'QUEUES': ['paiements_statut'],
+        'CONCURRENCY': config('WORKER_STATUT_CONCURRENCY', default=4, cast=int),
+    },
+    'activations': {
+        'QUEUES': ['activations'],
+        'CONCURRENCY': config('WORKER_ACTIVATIONS_CONCURRENCY', default=2, cast=int),
+    },
+    # Débits de cotisations (envois outbox routés vers 'cotisations')
+    'cotisations': {
+        'QUEUES': ['cotisations'],
+        'CONCURRENCY': config('WORKER_COTISATIONS_CONCURRENCY', default=4, cast=int),
+    },
+    'rapports': {
+        'QUEUES': ['rapports', 'default'],
+        'CONCURRENCY': config('WORKER_RAPPORTS_CONCURRENCY', default=1, cast=int),
+    },
+}
 
 
 # Autres configurations Celery